@@ -0,0 +1,56 @@
+"""
+Compares the pitch-shift engine with the previous AudioSegment-based implementation.
+
+Usage:
+    python benchmarks/bench_pitch_shift.py [--seconds 2.0] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pitch_shift
+
+
+def legacy_change_pitch(audio_segment, semitones):
+    """The AudioSegment-based pitch shift PlayControl used before the pitch_shift module."""
+    new_frame_rate = int(audio_segment.frame_rate * (2 ** (semitones / 12.0)))
+    shifted_audio = audio_segment._spawn(audio_segment.raw_data, overrides={'frame_rate': new_frame_rate})
+    return shifted_audio.set_frame_rate(audio_segment.frame_rate)
+
+
+def best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0, help="Length of the benchmarked slice.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the best one is reported.")
+    args = parser.parse_args()
+
+    frame_rate = 44100
+    rng = np.random.default_rng(0)
+    frames = (rng.standard_normal((int(args.seconds * frame_rate), 2)) * 3000).astype(np.int16)
+    segment = AudioSegment(frames.tobytes(), frame_rate=frame_rate, sample_width=2, channels=2)
+
+    print("{:>9} {:>12} {:>12} {:>12}".format("semitones", "legacy ms", "resample ms", "preserve ms"))
+    for semitones in (-24, -12, -5, 3, 7, 12, 24):
+        legacy = best_time(lambda: legacy_change_pitch(segment, semitones), args.repeat)
+        fast = best_time(lambda: pitch_shift.shift(frames, semitones, pitch_shift.RESAMPLE), args.repeat)
+        preserve = best_time(lambda: pitch_shift.shift(frames, semitones, pitch_shift.PRESERVE_DURATION), args.repeat)
+        print("{:>9} {:>12.2f} {:>12.2f} {:>12.2f}".format(semitones, legacy * 1000, fast * 1000, preserve * 1000))
+
+
+if __name__ == '__main__':
+    main()
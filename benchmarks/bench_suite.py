@@ -0,0 +1,291 @@
+"""
+Measures loading, slicing, adjusting, rendering and playing slices on generated fixtures.
+
+Every operation is timed over several runs, then run once more while its peak resident memory
+and its peak Python/NumPy allocations are recorded. Results are written as JSON and compared
+with a baseline; a slower or hungrier operation than the baseline allows is a regression.
+A missing baseline, or one with none of the operations run, fails the comparison too, so the
+gate cannot pass by measuring nothing. Updating the baseline keeps the entries of fixtures
+not run, so quick and full runs share one baseline file.
+
+Usage:
+    python benchmarks/bench_suite.py [--quick] [--output results.json] [--baseline baseline.json]
+                                     [--update-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# pygame's dummy driver is a null output device: the mixer runs, nothing is played
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import which
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pcm
+from audio_sample import AudioSample
+from onset_detection import EQUAL, ONSET
+from play_control import PlayControl
+
+FIXTURE_SECONDS = (10, 60, 300)
+QUICK_FIXTURE_SECONDS = (5, 20)
+FIXTURE_CHANNELS = (1, 2)
+FRAME_RATE = 44100
+NUM_SLICES = 16
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class RssSampler:
+    """
+    Samples the resident set size in a background thread to find the peak during an operation.
+
+    Falls back to the process-wide peak from getrusage where /proc is not available.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.start = self.peak = self.current()
+        self._running = False
+        self._thread = None
+
+    def current(self):
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self.page_size
+        except OSError:
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def __enter__(self):
+        self.start = self.peak = self.current()
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._running = False
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+    def _sample(self):
+        while self._running:
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+
+def make_fixtures(folder, seconds_list, channels_list):
+    """
+    Write WAV fixtures (and MP3 fixtures when ffmpeg is available) of drum-like test audio.
+
+    Returns:
+        list: The (name, path) of every fixture.
+    """
+    rng = np.random.default_rng(0)
+    fixtures = []
+    can_encode_mp3 = which('ffmpeg') is not None or which('avconv') is not None
+    for seconds in seconds_list:
+        for channels in channels_list:
+            frames = seconds * FRAME_RATE
+            # Decaying noise bursts on every beat at 120 bpm, so onset detection has work to do
+            envelope = np.exp(-np.arange(frames) % (FRAME_RATE // 2) / (FRAME_RATE * 0.05)).astype(np.float32)
+            audio = rng.standard_normal((frames, channels)).astype(np.float32) * envelope[:, None] * 0.3
+            name = '{}s_{}ch'.format(seconds, channels)
+            path = os.path.join(folder, name + '.wav')
+            if not os.path.exists(path):
+                pcm.write_wav(path, audio, FRAME_RATE)
+            fixtures.append((name + '.wav', path))
+            if can_encode_mp3:
+                mp3_path = os.path.join(folder, name + '.mp3')
+                if not os.path.exists(mp3_path):
+                    AudioSegment.from_wav(path).export(mp3_path, format='mp3')
+                fixtures.append((name + '.mp3', mp3_path))
+    return fixtures
+
+
+def measure(run, setup=None, repeat=5):
+    """
+    Time an operation, then run it once more to record its memory use.
+
+    Parameters:
+        run (callable): The operation, called with the result of setup.
+        setup (callable): Prepares the state for one run; not measured.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        dict: The median and best wall time, the peak RSS increase and the peak traced allocations.
+    """
+    setup = setup or (lambda: None)
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        began = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - began)
+
+    state = setup()
+    with RssSampler() as rss:
+        run(state)
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        _, alloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': float(np.median(timings)) * 1000.0,
+        'wall_ms_min': min(timings) * 1000.0,
+        'peak_rss_mb': (rss.peak - rss.start) / 1e6,
+        'alloc_peak_mb': alloc_peak / 1e6,
+    }
+
+
+def benchmark_fixture(path, play_control, repeat):
+    """
+    Benchmark every operation on one fixture.
+
+    Returns:
+        dict: The measurements of each operation.
+    """
+    results = {}
+    results['load'] = measure(lambda _: AudioSample(path), repeat=repeat)
+
+    sample = AudioSample(path)
+
+    def fresh_sample():
+        # Start from no slices and no zero crossing index, as right after loading
+        sample.slices.clear()
+        sample._zero_crossings = None
+        return sample
+
+    results['create_slices_equal'] = measure(lambda s: s.create_slices(NUM_SLICES, EQUAL), fresh_sample, repeat)
+    results['create_slices_onset'] = measure(lambda s: s.create_slices(NUM_SLICES, ONSET), fresh_sample, repeat)
+
+    fresh_sample().create_slices(NUM_SLICES, EQUAL)
+    steps = iter(range(10 ** 9))
+    # Alternate the direction so the slice does not drift out of range
+    results['adjust_slice'] = measure(
+        lambda s: s.adjust_slice(1, start_adjust=5 if next(steps) % 2 else -5, pitch_shift=0), lambda: sample, repeat)
+
+    slice_info = sample.slices[1]
+    bounds = slice_info['start_frame'], slice_info['end_frame']
+    results['render'] = measure(lambda s: play_control.render_slice(s, bounds[0], bounds[1], 0), lambda: sample, repeat)
+    results['render_pitched'] = measure(lambda s: play_control.render_slice(s, bounds[0], bounds[1], 7), lambda: sample, repeat)
+
+    def cold_cache():
+        play_control.slice_cache.clear()
+        return sample
+
+    results['play_cold'] = measure(lambda s: play_control.play(s, 1), cold_cache, repeat)
+    play_control.play(sample, 1)
+    results['play_warm'] = measure(lambda s: play_control.play(s, 1), lambda: sample, repeat)
+    play_control.mixer.stop_all()
+    return results
+
+
+# The compared metrics and the smallest growth of each that counts; RSS moves with the allocator
+COMPARED_METRICS = {'wall_ms': 2.0, 'peak_rss_mb': 8.0, 'alloc_peak_mb': 0.5}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        tuple: A description of every regression, and the number of operations compared.
+    """
+    regressions = []
+    compared = 0
+    for name, measurements in results['results'].items():
+        expected = baseline.get('results', {}).get(name)
+        if expected is None:
+            continue
+        compared += 1
+        for metric, floor in COMPARED_METRICS.items():
+            # Ignore differences too small to measure reliably
+            limit = max(expected[metric] * (1.0 + tolerance), expected[metric] + floor)
+            if measurements[metric] > limit:
+                regressions.append("{} {}: {:.2f} > {:.2f} (baseline {:.2f})".format(
+                    name, metric, measurements[metric], limit, expected[metric]))
+    return regressions, compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Only use short fixtures.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per operation, the median is compared.")
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'slicer-bench-fixtures'),
+                        help="Folder the generated fixtures are kept in between runs.")
+    parser.add_argument('--output', default='bench_results.json', help="Where the results are written.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="The results to compare against.")
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown or growth, e.g. 0.25 for 25%%.")
+    args = parser.parse_args()
+
+    os.makedirs(args.fixtures, exist_ok=True)
+    seconds_list = QUICK_FIXTURE_SECONDS if args.quick else FIXTURE_SECONDS
+    fixtures = make_fixtures(args.fixtures, seconds_list, FIXTURE_CHANNELS)
+    play_control = PlayControl()
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': {},
+    }
+    print("{:<28} {:>10} {:>10} {:>10}".format("operation", "wall ms", "rss MB", "alloc MB"))
+    for fixture_name, path in fixtures:
+        for operation, measurements in benchmark_fixture(path, play_control, args.repeat).items():
+            name = '{}/{}'.format(fixture_name, operation)
+            results['results'][name] = measurements
+            print("{:<28} {:>10.2f} {:>10.1f} {:>10.1f}".format(
+                name, measurements['wall_ms'], measurements['peak_rss_mb'], measurements['alloc_peak_mb']))
+    play_control.mixer.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results written to {}".format(args.output))
+
+    if args.update_baseline:
+        baseline = {'meta': results['meta'], 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline['results'] = json.load(f).get('results', {})
+        baseline['results'].update(results['results'])
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Baseline updated: {}".format(args.baseline))
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at {}; run with --update-baseline to store one.".format(args.baseline))
+        return 2
+    with open(args.baseline) as f:
+        regressions, compared = compare(results, json.load(f), args.tolerance)
+    if not compared:
+        print("None of the operations run are in {}; run with --update-baseline to add them.".format(args.baseline))
+        return 2
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    print("{} regressions in {} operations against {}".format(len(regressions), compared, args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
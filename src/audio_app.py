@@ -1,11 +1,41 @@
 import os
-import shutil
-
-from PyQt5.QtWidgets import QMessageBox, QTableWidget, QTableWidgetItem, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog
-from PyQt5.QtCore import Qt
-from audio_sample import AudioSample
+from PyQt5.QtWidgets import QMessageBox, QTableView, QHeaderView, QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog, QProgressBar, QComboBox, QCheckBox, QSpinBox
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from audio_loader import AudioLoader, ProjectLoader
+from decode_cache import DecodeCache
 from play_control import PlayControl
-from PyQt5.QtGui import QIntValidator, QPixmap
+from pattern_bouncer import PatternBouncer
+from project_file import ProjectFile
+from project_saver import ProjectSaver
+from slice_exporter import SliceExporter
+from tracing import tracer
+from slice_table_model import BANK_KEYS, SliceTableModel
+from waveform_view import PeakBuilder, WaveformView
+import mixer_engine
+import onset_detection
+import pitch_shift
+import sequencer
+import slice_export
+from PyQt5.QtGui import QIntValidator, QPixmap, QFontDatabase
+
+PROJECT_FILTER = "Slicer Projects (*.slproj)"
+# The loudness slices are brought to while normalization is on
+NORMALIZE_LUFS = -14.0
+# Found next to the sources, so the app starts from any working directory
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'img', 'logo.png')
+# Export choices: (dialog filter, file format, whether all slices go to one file)
+EXPORT_CHOICES = (
+    ("One WAV File with Cue Points (*.wav)", slice_export.WAV, True),
+    ("Folder of WAV Files (*)", slice_export.WAV, False),
+    ("Folder of FLAC Files (*)", slice_export.FLAC, False),
+)
+
+# The pattern and tempo the sequencer starts with
+DEFAULT_PATTERN = "1 . 2 . 3 . 2 . 1 . 2 . 3 . 4 ."
+DEFAULT_BPM = 120
+
+# The largest number of initial slices, spread over banks of keys
+MAX_SLICES = 999
 
 class AudioApp(QWidget):
     """
@@ -14,44 +44,114 @@ class AudioApp(QWidget):
     Attributes:
         audio_sample (AudioSample): The currently loaded audio sample.
         play_control (PlayControl): The playback controller for audio.
-        key_to_slice_map (dict): Mapping of keyboard keys to slice indices.
+        key_to_slice_map (dict): Mapping of keyboard keys to slice indices within a bank.
+        bank (int): The bank of slices the keys currently play.
+        loader (AudioLoader): The background loader of the file or project being loaded, if any.
+        decode_cache (DecodeCache): The on-disk cache of decoded audio shared by all loads.
+        peak_builder (PeakBuilder): The background builder of the waveform peaks, if any.
+        project (ProjectFile): The project the audio sample was last saved to or opened from, if any.
+        sequencer (Sequencer): The live player of slice patterns.
+        exporter (QThread): The background export of the slices, bounce of the pattern or save of the
+            project in progress, if any.
     """
+
+    # Carries errors of the sequencer thread over to the GUI thread
+    sequencer_failed = pyqtSignal(str)
     
     def __init__(self):
         """Initializes the main application window."""
         super().__init__()
         self.audio_sample = None
         self.play_control = PlayControl()
+        self.sequencer = sequencer.Sequencer(self.play_control, on_error=self.sequencer_failed.emit)
+        self.sequencer_failed.connect(self.on_sequencer_failed)
+        self.loader = None
+        self.exporter = None
+        self.decode_cache = DecodeCache()
+        self.peak_builder = None
+        self.project = None
         self.hbox = None
         self.max_available_slices = "..."
+        self.bank = 0
         self.initUI()
-        self.key_to_slice_map = {key: i for i, key in enumerate("asdfghjkl")}
+        self.key_to_slice_map = {key: i for i, key in enumerate(BANK_KEYS)}
         
     def initUI(self):
         """
         Sets up the user interface for the audio sample slicer and editor.
         """
         
-        self.resize(720, 490)
+        self.resize(720, 640)
 
         layout = QVBoxLayout()
 
         # Input field for specifying the number of initial slices
         self.num_slices_input = QLineEdit(self)
-        self.num_slices_input.setPlaceholderText("Number of Slices (1-9)")
+        self.num_slices_input.setPlaceholderText(f"Number of Slices (1-{MAX_SLICES})")
         self.num_slices_input.setValidator(QIntValidator())  # Only allow integer input
-        self.num_slices_input.setFixedWidth(self.num_slices_input.fontMetrics().boundingRect("Number of Slices (1-9)").width() + 10)
+        self.num_slices_input.setFixedWidth(self.num_slices_input.fontMetrics().boundingRect(f"Number of Slices (1-{MAX_SLICES})").width() + 10)
+
+        # Choice of how the initial slices are cut
+        self.slicing_mode_input = QComboBox(self)
+        self.slicing_mode_input.addItem("Equal Slices", onset_detection.EQUAL)
+        self.slicing_mode_input.addItem("Slice at Onsets", onset_detection.ONSET)
+        self.slicing_mode_input.addItem("Slice at Beats", onset_detection.BEAT)
+        self.slicing_mode_input.setFocusPolicy(Qt.NoFocus)
 
         # Button for uploading an audio file
         upload_button = QPushButton("Load Audio File (*.mp3, *.wav)", self)
         upload_button.setFixedWidth(250)
         upload_button.clicked.connect(self.upload_file)
 
+        # Buttons for opening and saving projects
+        open_project_button = QPushButton("Open Project", self)
+        open_project_button.clicked.connect(self.open_project)
+        self.save_project_button = QPushButton("Save Project", self)
+        self.save_project_button.clicked.connect(self.save_project)
+        self.save_project_button.setEnabled(False)
+        self.export_button = QPushButton("Export Slices", self)
+        self.export_button.clicked.connect(self.export_slices)
+        self.export_button.setEnabled(False)
+        self.store_audio_input = QCheckBox("Store Slice Audio", self)
+        self.store_audio_input.setChecked(True)
+        self.store_audio_input.setFocusPolicy(Qt.NoFocus)
+
+        # Tracing of the playback path, with live per-stage latencies and a trace export
+        self.trace_input = QCheckBox("Show Latencies", self)
+        self.trace_input.setChecked(tracer.enabled)
+        self.trace_input.setFocusPolicy(Qt.NoFocus)
+        self.trace_input.toggled.connect(self.toggle_tracing)
+        export_trace_button = QPushButton("Export Trace", self)
+        export_trace_button.clicked.connect(self.export_trace)
+        self.trace_overlay = QLabel(self)
+        self.trace_overlay.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.trace_overlay.setVisible(tracer.enabled)
+        self.trace_timer = QTimer(self)
+        self.trace_timer.setInterval(500)
+        self.trace_timer.timeout.connect(self.update_trace_overlay)
+        if tracer.enabled:
+            self.trace_timer.start()
+
+        # Progress bar and cancel button shown while a file loads in the background
+        self.load_progress = QProgressBar(self)
+        self.load_progress.setRange(0, 100)
+        self.load_progress.hide()
+        self.cancel_load_button = QPushButton("Cancel", self)
+        self.cancel_load_button.clicked.connect(self.cancel_loading)
+        self.cancel_load_button.hide()
+        # And while the slices are exported in the background
+        self.export_progress = QProgressBar(self)
+        self.export_progress.setRange(0, 100)
+        self.export_progress.hide()
+        self.cancel_export_button = QPushButton("Cancel Export", self)
+        self.cancel_export_button.clicked.connect(self.cancel_export)
+        self.cancel_export_button.hide()
+
         # Create a widget for the logo
         logo_widget = QWidget(self)
         logo_layout = QVBoxLayout(logo_widget)
         logo_image = QLabel(logo_widget)
-        logo_pixmap = QPixmap("img/logo.png")
+        logo_pixmap = QPixmap(LOGO_PATH)
         logo_image.setPixmap(logo_pixmap)
         logo_layout.addWidget(logo_image, alignment=Qt.AlignRight)
 
@@ -60,12 +160,30 @@ class AudioApp(QWidget):
         # top_layout.addStretch(1)
         top_layout.addWidget(logo_widget, alignment=Qt.AlignLeft)
         top_layout.addWidget(self.num_slices_input, alignment=Qt.AlignRight)
+        top_layout.addWidget(self.slicing_mode_input)
         top_layout.addWidget(upload_button)
 
         
         # Add the horizontal layout to the main layout
         layout.addLayout(top_layout)
 
+        project_layout = QHBoxLayout()
+        project_layout.addWidget(self.trace_input)
+        project_layout.addWidget(export_trace_button)
+        project_layout.addStretch(1)
+        project_layout.addWidget(self.store_audio_input)
+        project_layout.addWidget(open_project_button)
+        project_layout.addWidget(self.save_project_button)
+        project_layout.addWidget(self.export_button)
+        layout.addLayout(project_layout)
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.load_progress)
+        progress_layout.addWidget(self.cancel_load_button)
+        progress_layout.addWidget(self.export_progress)
+        progress_layout.addWidget(self.cancel_export_button)
+        layout.addLayout(progress_layout)
+
         # Layout for slice adjustments
         self.slice_index_input = QLineEdit(self)
         placeholder_text = f"1 - {self.max_available_slices}"
@@ -78,13 +196,47 @@ class AudioApp(QWidget):
         self.pitch_shift_input.setPlaceholderText("delta")
         self.adjust_button = QPushButton('Adjust Slice', self)
         self.adjust_button.clicked.connect(self.adjust_slice)
+        self.pitch_mode_input = QComboBox(self)
+        self.pitch_mode_input.addItem("Resample", pitch_shift.RESAMPLE)
+        self.pitch_mode_input.addItem("Keep Length", pitch_shift.PRESERVE_DURATION)
+        self.pitch_mode_input.setFocusPolicy(Qt.NoFocus)
+        self.pitch_mode_input.currentIndexChanged.connect(self.change_pitch_mode)
+        self.voice_mode_input = QComboBox(self)
+        self.voice_mode_input.addItem("Choke", mixer_engine.CHOKE)
+        self.voice_mode_input.addItem("Retrigger", mixer_engine.RETRIGGER)
+        self.voice_mode_input.setFocusPolicy(Qt.NoFocus)
+        self.voice_mode_input.currentIndexChanged.connect(self.change_voice_mode)
+        self.normalize_input = QCheckBox("Normalize", self)
+        self.normalize_input.setToolTip(f"Bring every slice to {NORMALIZE_LUFS:g} LUFS without clipping")
+        self.normalize_input.setFocusPolicy(Qt.NoFocus)
+        self.normalize_input.toggled.connect(self.toggle_normalization)
         self.slice_index_input.setFocusPolicy(Qt.ClickFocus)
 
+        # Step sequencer: a pattern of slice numbers played at a tempo
+        self.pattern_input = QLineEdit(DEFAULT_PATTERN, self)
+        self.pattern_input.setToolTip("Slice numbers per step, . for a rest, + to play slices together")
+        self.pattern_input.setFocusPolicy(Qt.ClickFocus)
+        self.pattern_input.editingFinished.connect(self.change_pattern)
+        self.bpm_input = QSpinBox(self)
+        self.bpm_input.setRange(20, 300)
+        self.bpm_input.setValue(DEFAULT_BPM)
+        self.bpm_input.setSuffix(" BPM")
+        self.bpm_input.setFocusPolicy(Qt.ClickFocus)
+        self.bpm_input.valueChanged.connect(self.sequencer.set_tempo)
+        self.play_pattern_button = QPushButton('Play Pattern', self)
+        self.play_pattern_button.clicked.connect(self.toggle_pattern)
+        self.bounce_button = QPushButton('Bounce', self)
+        self.bounce_button.clicked.connect(self.bounce_pattern)
+
         # Disable inputs and button until an audio file is loaded
         self.disable_all_inputs()
 
         # Create a horizontal layout for the inputs
         hbox = QHBoxLayout()
+        # Shows which bank of slices the keys play; [ and ] switch banks
+        self.bank_label = QLabel(self)
+        self.update_bank_label()
+        hbox.addWidget(self.bank_label)
         hbox.addWidget(QLabel('Slice No:'))
         hbox.addWidget(self.slice_index_input)
         hbox.addWidget(QLabel('Start Adjust (ms):'))
@@ -93,53 +245,75 @@ class AudioApp(QWidget):
         hbox.addWidget(self.end_adjust_input)
         hbox.addWidget(QLabel('Pitch Shift:'))
         hbox.addWidget(self.pitch_shift_input)
+        hbox.addWidget(self.pitch_mode_input)
+        hbox.addWidget(self.voice_mode_input)
+        hbox.addWidget(self.normalize_input)
         hbox.addWidget(self.adjust_button)
 
+        # Step sequencer: a pattern of slice numbers played at a tempo
+        sequencer_layout = QHBoxLayout()
+        sequencer_layout.addWidget(QLabel('Pattern:'))
+        sequencer_layout.addWidget(self.pattern_input, 1)
+        sequencer_layout.addWidget(self.bpm_input)
+        sequencer_layout.addWidget(self.play_pattern_button)
+        sequencer_layout.addWidget(self.bounce_button)
+
+        # Waveform overview with the slice regions
+        self.waveform = WaveformView(self)
+        layout.addWidget(self.waveform)
+        layout.addWidget(self.trace_overlay)
+
         # Table to display the audio slices
         self.slices_table = self.setup_slices_table()
         layout.addWidget(self.slices_table)
 
         layout.addLayout(hbox)
+        layout.addLayout(sequencer_layout)
         self.setLayout(layout)
         self.setWindowTitle('Audio Sample Slicer & Slice Editor')
         self.show()
+        # Open the audio device once the window is up, instead of delaying it
+        QTimer.singleShot(0, self.play_control.mixer.start_async)
 
     def setup_slices_table(self):
         """
         Creates and configures the table for displaying audio slice information.
 
         Returns:
-            QTableWidget: The configured table widget.
+            QTableView: The configured table view.
         """
-        table = QTableWidget(self)
-        table.setColumnCount(4)  # Columns for Playback Key, Start, End, Pitch Shift
-        table.setHorizontalHeaderLabels(['Playback Key', 'Start (ms)', 'End (ms)', 'Pitch Shift'])
-        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.slices_model = SliceTableModel(self)
+        table = QTableView(self)
+        table.setModel(self.slices_model)
+        # Fixed row heights keep the table from measuring every row of long slice lists
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.setEditTriggers(QTableView.NoEditTriggers)
         table.setFocusPolicy(Qt.NoFocus)
-        table.setSelectionMode(QTableWidget.NoSelection)
+        table.setSelectionMode(QTableView.NoSelection)
         return table
 
-    def update_slices_table(self):
+    def update_bank_label(self):
         """
-        Updates the table with the current slice information from the audio sample.
+        Shows the bank of slices the keys currently play.
         """
-        self.slices_table.setRowCount(len(self.audio_sample.slices))
-        for i, slice_info in enumerate(self.audio_sample.slices):
-            # Create table items with slice details
-            playback_key_item = QTableWidgetItem("asdfghjkl"[i] if i < len("asdfghjkl") else "N/A")
-            start_item = QTableWidgetItem(str(slice_info['start']))
-            end_item = QTableWidgetItem(str(slice_info['end']))
-            pitch_shift_item = QTableWidgetItem(str(slice_info['pitch_shift']))
+        banks = 1
+        if self.audio_sample:
+            banks = max(-(-len(self.audio_sample.slices) // len(BANK_KEYS)), 1)
+        self.bank_label.setText(f"Bank {self.bank + 1}/{banks} ([ ])")
 
-            # Disable editing for the table items
-            for item in (playback_key_item, start_item, end_item, pitch_shift_item):
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-            
-            # Add the items to their respective cells in the table
-            self.slices_table.setItem(i, 0, playback_key_item)
-            self.slices_table.setItem(i, 1, start_item)
-            self.slices_table.setItem(i, 2, end_item)
-            self.slices_table.setItem(i, 3, pitch_shift_item)
+    def change_bank(self, step):
+        """
+        Switches the keys to the previous or next bank of slices.
+
+        Parameters:
+            step (int): -1 for the previous bank, 1 for the next one.
+        """
+        if not self.audio_sample:
+            return
+        banks = max(-(-len(self.audio_sample.slices) // len(BANK_KEYS)), 1)
+        self.bank = (self.bank + step) % banks
+        self.update_bank_label()
 
     def enable_all_inputs(self):
         """
@@ -150,6 +324,8 @@ class AudioApp(QWidget):
         self.end_adjust_input.setEnabled(True)
         self.pitch_shift_input.setEnabled(True)
         self.adjust_button.setEnabled(True)
+        self.play_pattern_button.setEnabled(True)
+        self.bounce_button.setEnabled(True)
 
     def disable_all_inputs(self):
         """
@@ -160,10 +336,14 @@ class AudioApp(QWidget):
         self.end_adjust_input.setEnabled(False)
         self.pitch_shift_input.setEnabled(False)
         self.adjust_button.setEnabled(False)
+        self.play_pattern_button.setEnabled(False)
+        self.bounce_button.setEnabled(False)
 
     def load_audio_sample(self, file_path):
         """
-        Loads an audio sample and creates slices based on the specified number.
+        Starts loading an audio sample in the background and creates slices based on the specified number.
+
+        The slices table is filled once the loader has finished decoding and slicing the file.
 
         Parameters:
             file_path (str): Path to the audio file to load.
@@ -185,12 +365,147 @@ class AudioApp(QWidget):
             self.show_error_message("Error", str(e))
             return
 
-        # Load the audio sample and create slices based on the specified number
-        self.audio_sample = AudioSample(file_path)
-        self.audio_sample.create_slices(num_slices)
+        # A new upload replaces any load still in progress
+        self.cancel_loading()
+
+        self.loader = AudioLoader(file_path, num_slices, slice_cache=self.play_control.slice_cache,
+                                  decode_cache=self.decode_cache,
+                                  slicing_mode=self.slicing_mode_input.currentData(), parent=self)
+        self.loader.progress.connect(self.on_load_progress)
+        self.loader.loaded.connect(self.on_audio_loaded)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.finished.connect(lambda loader=self.loader: self.on_loader_finished(loader))
+        self.loader.finished.connect(self.loader.deleteLater)
+
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        self.cancel_load_button.show()
+        self.loader.start()
 
+    def cancel_loading(self):
+        """
+        Cancels the background load in progress, if any.
+        """
+        if self.loader is not None:
+            # Results of a cancelled loader are ignored even if it was already done decoding
+            self.loader.progress.disconnect()
+            self.loader.loaded.disconnect()
+            self.loader.failed.disconnect()
+            self.loader.cancel()
+            self.on_loader_finished(self.loader)
+
+    def on_load_progress(self, percent, stage):
+        """
+        Shows the progress of the background load.
+
+        Parameters:
+            percent (int): The percentage of the load done.
+            stage (str): The description of the current stage.
+        """
+        self.load_progress.setValue(percent)
+        self.load_progress.setFormat(f"{stage} %p%")
+
+    def on_audio_loaded(self, audio_sample):
+        """
+        Shows the audio sample once it has been decoded and sliced.
+
+        Parameters:
+            audio_sample (AudioSample): The loaded audio sample.
+        """
+        if self.sequencer.is_playing:
+            self.toggle_pattern()
+        self.audio_sample = audio_sample
+        # An opened project plays its stored slices from the file it is saved to
+        self.project = audio_sample.prerendered
+        self.save_project_button.setEnabled(True)
+        self.export_button.setEnabled(True)
         self.enable_all_inputs()
-        self.update_slices_table()
+        self.slices_model.set_slices(audio_sample.slices)
+        self.slices_model.set_loudness_index(audio_sample.loudness_index)
+        if self.normalize_input.isChecked():
+            # The loader pre-rendered the slices as they are; render them normalized instead
+            audio_sample.normalize_lufs = NORMALIZE_LUFS
+            self.play_control.slice_cache.prefill_async(audio_sample)
+        self.bank = 0
+        self.update_bank_label()
+        if tracer.enabled:
+            self.update_trace_overlay()
+        self.waveform.set_audio_sample(audio_sample)
+        self.build_waveform(audio_sample)
+
+    def build_waveform(self, audio_sample):
+        """
+        Builds the waveform peaks of an audio sample in the background, replacing any build in progress.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample to build the peaks of.
+        """
+        if self.peak_builder is not None:
+            self.peak_builder.built.disconnect(self.waveform.peaks_ready)
+            self.peak_builder.measured.disconnect(self.on_loudness_measured)
+            self.peak_builder.failed.disconnect(self.on_peak_builder_failed)
+            self.peak_builder.requestInterruption()
+        self.peak_builder = PeakBuilder(audio_sample, parent=self)
+        self.peak_builder.built.connect(self.waveform.peaks_ready)
+        self.peak_builder.measured.connect(self.on_loudness_measured)
+        self.peak_builder.failed.connect(self.on_peak_builder_failed)
+        self.peak_builder.finished.connect(lambda builder=self.peak_builder: self.on_peak_builder_finished(builder))
+        self.peak_builder.finished.connect(self.peak_builder.deleteLater)
+        self.peak_builder.start()
+
+    def on_loudness_measured(self, audio_sample):
+        """
+        Shows the levels of the slices once the loudness index of their audio is built.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample that was measured.
+        """
+        if audio_sample is self.audio_sample:
+            self.slices_model.set_loudness_index(audio_sample.loudness_index)
+            if audio_sample.normalize_lufs is not None:
+                # Slices played so far were not normalized yet; render them normalized now
+                self.play_control.slice_cache.prefill_async(audio_sample)
+
+    def on_peak_builder_failed(self, message):
+        """
+        Reports that the waveform or the levels of the slices could not be built.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not build the waveform: {message}")
+
+    def on_peak_builder_finished(self, builder):
+        """
+        Forgets the peak builder once it is done.
+
+        Parameters:
+            builder (PeakBuilder): The builder that has finished.
+        """
+        if builder is self.peak_builder:
+            self.peak_builder = None
+
+    def on_load_failed(self, message):
+        """
+        Reports a failed background load.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not load the audio file: {message}")
+
+    def on_loader_finished(self, loader):
+        """
+        Hides the load progress once the current loader is done.
+
+        Parameters:
+            loader (AudioLoader): The loader that has finished.
+        """
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
 
     def adjust_slice(self):
         """
@@ -251,9 +566,76 @@ class AudioApp(QWidget):
         except ValueError as e:
             self.show_error_message("Error", str(e))
 
-        # Clear the input fields and update the slices table to reflect the changes
+        # Clear the input fields; the slices table follows the adjusted slice on its own
         self.clear_slice_adjust_inputs()
-        self.update_slices_table()
+        self.waveform.update()
+
+    def change_pitch_mode(self):
+        """
+        Applies the pitch shift mode selected by the user and pre-renders the slices with it.
+        """
+        self.play_control.set_pitch_mode(self.pitch_mode_input.currentData())
+        if self.audio_sample:
+            self.play_control.slice_cache.prefill_async(self.audio_sample)
+
+    def toggle_normalization(self, enabled):
+        """
+        Turns loudness normalization of the slices on or off and pre-renders them accordingly.
+
+        Parameters:
+            enabled (bool): Whether to normalize.
+        """
+        if self.audio_sample:
+            self.audio_sample.normalize_lufs = NORMALIZE_LUFS if enabled else None
+            self.play_control.slice_cache.prefill_async(self.audio_sample)
+
+    def change_voice_mode(self):
+        """
+        Applies the voice mode selected by the user to all slices.
+        """
+        self.play_control.set_voice_mode(self.voice_mode_input.currentData())
+
+    def toggle_tracing(self, enabled):
+        """
+        Turns tracing of the playback path and the latency overlay on or off.
+
+        Parameters:
+            enabled (bool): Whether to trace.
+        """
+        if enabled:
+            tracer.clear()
+            tracer.enable()
+            self.trace_timer.start()
+        else:
+            tracer.disable()
+            self.trace_timer.stop()
+        self.trace_overlay.setVisible(enabled)
+        self.update_trace_overlay()
+
+    def update_trace_overlay(self):
+        """
+        Shows the latest per-stage latencies of the playback path and the mixer, and the load times.
+        """
+        mixer = self.play_control.mixer.latency_stats()
+        summary = f"trigger to audio p99: {mixer['p99_ms']:.2f} ms" if mixer['count'] else "no triggers yet"
+        loads = self.decode_cache.stats()
+        load_summary = (f"last load: {self.audio_sample.load_time:.3f} s, "
+                        if self.audio_sample and self.audio_sample.load_time is not None else "") + (
+            f"cold loads: {loads['cold_loads']} (avg {loads['avg_cold_time']:.3f} s), "
+            f"warm loads: {loads['warm_loads']} (avg {loads['avg_warm_time']:.3f} s)")
+        self.trace_overlay.setText(tracer.format_stats() + "\n" + summary + "\n" + load_summary)
+
+    def export_trace(self):
+        """
+        Writes the recorded spans to a file that can be opened in chrome://tracing or Perfetto.
+        """
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Trace Files (*.json)")
+        if file_name:
+            try:
+                tracer.export_chrome_trace(file_name)
+            except OSError as e:
+                self.show_error_message("Error", f"Could not export the trace: {e}")
+        self.setFocus()
 
     def show_error_message(self, title, message):
         """
@@ -287,9 +669,252 @@ class AudioApp(QWidget):
         # Set focus back to the main window to capture key presses for playback
         self.setFocus()
 
+    def save_project(self):
+        """
+        Saves the slices to the current project, asking for a file name the first time.
+
+        Saving again only appends what changed since the last save. The save runs in the
+        background with the export progress, as storing the audio renders the changed slices.
+        """
+        if not self.audio_sample or self.exporter is not None:
+            return
+        if self.project is None:
+            file_name, _ = QFileDialog.getSaveFileName(self, "Save Project", "", PROJECT_FILTER)
+            if not file_name:
+                return
+            if not file_name.endswith('.slproj'):
+                file_name += '.slproj'
+            try:
+                self.project = ProjectFile(file_name)
+            except (OSError, ValueError) as e:
+                self.show_error_message("Error", str(e))
+                return
+
+        self.exporter = ProjectSaver(self.project, self.audio_sample,
+                                     include_audio=self.store_audio_input.isChecked(),
+                                     pitch_mode=self.play_control.pitch_mode,
+                                     frame_rate=self.play_control.slice_cache.mixer_format[0], parent=self)
+        self.exporter.progress.connect(self.on_export_progress)
+        self.exporter.failed.connect(self.on_save_failed)
+        self.exporter.finished.connect(lambda exporter=self.exporter: self.on_exporter_finished(exporter))
+        self.exporter.finished.connect(self.exporter.deleteLater)
+        self.export_button.setEnabled(False)
+        self.bounce_button.setEnabled(False)
+        self.save_project_button.setEnabled(False)
+        self.export_progress.setValue(0)
+        self.export_progress.show()
+        self.cancel_export_button.show()
+        self.exporter.start()
+        self.setFocus()
+
+    def on_save_failed(self, message):
+        """
+        Reports a failed background save.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not save the project: {message}")
+
+    def open_project(self):
+        """
+        Opens a project in the background; its slices are shown once its source is found and
+        their audio is read on first play.
+        """
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open Project", "", PROJECT_FILTER)
+        if not file_name:
+            return
+        # Opening a project replaces any load still in progress
+        self.cancel_loading()
+
+        self.loader = ProjectLoader(file_name, slice_cache=self.play_control.slice_cache,
+                                    decode_cache=self.decode_cache, parent=self)
+        self.loader.progress.connect(self.on_load_progress)
+        self.loader.loaded.connect(self.on_audio_loaded)
+        self.loader.failed.connect(self.on_open_project_failed)
+        self.loader.finished.connect(lambda loader=self.loader: self.on_loader_finished(loader))
+        self.loader.finished.connect(self.loader.deleteLater)
+
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        self.cancel_load_button.show()
+        self.loader.start()
+        self.setFocus()
+
+    def on_open_project_failed(self, message):
+        """
+        Reports a project that could not be opened.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not open the project: {message}")
+
+    def export_slices(self):
+        """
+        Exports every slice with its pitch shift applied, as a folder of files or one WAV file with cue points.
+
+        The export runs in the background; its progress is shown and it can be cancelled.
+        """
+        if not self.audio_sample or self.exporter is not None:
+            return
+        file_name, chosen_filter = QFileDialog.getSaveFileName(
+            self, "Export Slices", "", ";;".join(choice[0] for choice in EXPORT_CHOICES))
+        if not file_name:
+            return
+        _, file_format, concatenate = next(choice for choice in EXPORT_CHOICES if choice[0] == chosen_filter)
+        if concatenate and not file_name.endswith('.wav'):
+            file_name += '.wav'
+        self.exporter = SliceExporter(self.audio_sample, file_name, file_format, concatenate,
+                                      pitch_mode=self.play_control.pitch_mode, parent=self)
+        self.exporter.progress.connect(self.on_export_progress)
+        self.exporter.failed.connect(self.on_export_failed)
+        self.exporter.finished.connect(lambda exporter=self.exporter: self.on_exporter_finished(exporter))
+        self.exporter.finished.connect(self.exporter.deleteLater)
+        self.export_button.setEnabled(False)
+        self.export_progress.setValue(0)
+        self.export_progress.show()
+        self.cancel_export_button.show()
+        self.exporter.start()
+        self.setFocus()
+
+    def cancel_export(self):
+        """
+        Cancels the background export, bounce or save in progress, if any; the files it wrote are removed
+        and a cancelled save keeps the previous one.
+        """
+        if self.exporter is not None:
+            self.exporter.cancel()
+
+    def on_export_progress(self, percent, stage):
+        """
+        Shows the progress of the background export, bounce or save.
+
+        Parameters:
+            percent (int): The percentage of the slices exported or saved, or of the pattern bounced.
+            stage (str): The description of the current stage.
+        """
+        self.export_progress.setValue(percent)
+        self.export_progress.setFormat(f"{stage} %p%")
+
+    def on_export_failed(self, message):
+        """
+        Reports a failed background export.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not export the slices: {message}")
+
+    def on_exporter_finished(self, exporter):
+        """
+        Hides the export progress once the exporter, bouncer or saver is done.
+
+        Parameters:
+            exporter (QThread): The SliceExporter, PatternBouncer or ProjectSaver that has finished.
+        """
+        if exporter is not self.exporter:
+            return
+        self.exporter = None
+        self.export_progress.hide()
+        self.cancel_export_button.hide()
+        self.export_button.setEnabled(self.audio_sample is not None)
+        self.bounce_button.setEnabled(self.audio_sample is not None)
+        self.save_project_button.setEnabled(self.audio_sample is not None)
+
+    def read_pattern(self):
+        """
+        Reads the pattern input, reporting an invalid pattern or slice number.
+
+        Returns:
+            Pattern: The pattern, or None if it is invalid.
+        """
+        try:
+            pattern = sequencer.Pattern.parse(self.pattern_input.text())
+        except ValueError as e:
+            self.show_error_message("Error", str(e))
+            return None
+        if self.audio_sample and any(i >= len(self.audio_sample.slices) for i in pattern.slice_indices()):
+            self.show_error_message("Error", f"The pattern plays slices 1 to {len(self.audio_sample.slices)} only.")
+            return None
+        return pattern
+
+    def toggle_pattern(self):
+        """
+        Starts playing the pattern at the chosen tempo, or stops it if it is playing.
+        """
+        if self.sequencer.is_playing:
+            self.sequencer.stop()
+            self.play_pattern_button.setText('Play Pattern')
+        elif self.audio_sample:
+            pattern = self.read_pattern()
+            if pattern is not None:
+                self.sequencer.start(self.audio_sample, pattern, self.bpm_input.value())
+                self.play_pattern_button.setText('Stop Pattern')
+        self.setFocus()
+
+    def on_sequencer_failed(self, message):
+        """
+        Resets the sequencer after an error stopped the pattern and reports it.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.sequencer.stop()
+        self.play_pattern_button.setText('Play Pattern')
+        self.show_error_message("Error", message)
+
+    def change_pattern(self):
+        """
+        Switches the playing pattern to the edited one from its next step.
+        """
+        if self.sequencer.is_playing:
+            pattern = self.read_pattern()
+            if pattern is not None:
+                self.sequencer.set_pattern(pattern)
+        self.setFocus()
+
+    def bounce_pattern(self):
+        """
+        Renders one loop of the pattern at the chosen tempo to a WAV file.
+
+        The bounce runs in the background with the export progress; it can be cancelled.
+        """
+        if not self.audio_sample or self.exporter is not None:
+            return
+        pattern = self.read_pattern()
+        if pattern is None:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Bounce Pattern", "pattern.wav", "WAV Files (*.wav)")
+        if not file_name:
+            return
+        self.exporter = PatternBouncer(self.audio_sample, pattern, self.bpm_input.value(), file_name,
+                                       slice_cache=self.play_control.slice_cache,
+                                       voice_mode=self.play_control.default_voice_mode, parent=self)
+        self.exporter.progress.connect(self.on_export_progress)
+        self.exporter.failed.connect(self.on_bounce_failed)
+        self.exporter.finished.connect(lambda exporter=self.exporter: self.on_exporter_finished(exporter))
+        self.exporter.finished.connect(self.exporter.deleteLater)
+        self.export_button.setEnabled(False)
+        self.bounce_button.setEnabled(False)
+        self.export_progress.setValue(0)
+        self.export_progress.show()
+        self.cancel_export_button.show()
+        self.exporter.start()
+        self.setFocus()
+
+    def on_bounce_failed(self, message):
+        """
+        Reports a failed background bounce.
+
+        Parameters:
+            message (str): The error message.
+        """
+        self.show_error_message("Error", f"Could not bounce the pattern: {message}")
+
     def upload_file(self):
         """
-        Opens a file dialog to select and upload an audio file, copying it to a local directory.
+        Opens a file dialog to select an audio file and loads it in the background.
         """
         options = QFileDialog.Options()
         fileName, _ = QFileDialog.getOpenFileName(self, "QFileDialog.getOpenFileName()", "", "Audio Files (*.mp3 *.wav)", options=options)
@@ -305,22 +930,16 @@ class AudioApp(QWidget):
             try:
                 num_slices = int(num_slices_text)
 
-                # Check if the number of slices is within the range from 1 to 9
-                if not (1 <= num_slices <= 9):
-                    self.show_error_message("Error", "Number of slices must be between 1 and 9.")
+                # Check if the number of slices is within the range from 1 to MAX_SLICES
+                if not (1 <= num_slices <= MAX_SLICES):
+                    self.show_error_message("Error", f"Number of slices must be between 1 and {MAX_SLICES}.")
                     return
             except ValueError as e:
                 self.show_error_message("Error", "Number of slices must be an integer.")
                 return
 
-            upload_folder = 'upload'
-            if not os.path.exists(upload_folder):
-                os.makedirs(upload_folder)
-
-            shutil.copy(fileName, os.path.join(upload_folder, os.path.basename(fileName)))
-            print(f"File uploaded to {upload_folder}")
-
-            self.load_audio_sample(os.path.join(upload_folder, os.path.basename(fileName)))
+            # The loader copies the file to the upload folder (skipped for already uploaded content)
+            self.load_audio_sample(fileName)
 
             
             # Remove focus and deactivate the "Number of Slices" input field after upload
@@ -336,10 +955,13 @@ class AudioApp(QWidget):
         """
         if self.slice_index_input.hasFocus():
             super().keyPressEvent(event)
-        else:
+            return
+        with tracer.span('key_press'):
             key = event.text()
-            if key in self.key_to_slice_map and self.audio_sample:
-                slice_index = self.key_to_slice_map[key]
+            if key in ('[', ']'):
+                self.change_bank(-1 if key == '[' else 1)
+            elif key in self.key_to_slice_map and self.audio_sample:
+                slice_index = self.bank * len(BANK_KEYS) + self.key_to_slice_map[key]
                 
                 # Check if the slice index is within the range of the selected number of slices
                 if slice_index < len(self.audio_sample.slices):
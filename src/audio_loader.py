@@ -0,0 +1,125 @@
+import os
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from audio_sample import AudioSample
+from onset_detection import EQUAL
+from project_file import open_project
+from streaming import STREAMING_THRESHOLD_BYTES
+from upload_store import LoadCancelled, store_upload
+
+class AudioLoader(QThread):
+    """
+    A worker thread that uploads, decodes and slices an audio file off the GUI thread.
+
+    Signals:
+        progress (int, str): Percentage done and a description of the current stage.
+        loaded (object): The AudioSample, emitted once decoding and slicing have finished.
+        failed (str): The error message, emitted when loading fails.
+        cancelled (): Emitted when loading was cancelled.
+    """
+
+    progress = pyqtSignal(int, str)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, file_path, num_slices, slice_cache=None, decode_cache=None, upload_folder='upload',
+                 slicing_mode=EQUAL, parent=None):
+        """
+        The constructor for AudioLoader class.
+
+        Parameters:
+            file_path (str): The path to the audio file selected by the user.
+            num_slices (int): The number of initial slices to create.
+            slice_cache (SliceCache): Optional cache to pre-render the slices into.
+            decode_cache (DecodeCache): Optional on-disk cache of decoded audio.
+            upload_folder (str): The folder holding uploaded files.
+            slicing_mode (str): How the initial slices are cut, one of onset_detection.SLICING_MODES.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.file_path = file_path
+        self.num_slices = num_slices
+        self.slice_cache = slice_cache
+        self.decode_cache = decode_cache
+        self.upload_folder = upload_folder
+        self.slicing_mode = slicing_mode
+
+    def cancel(self):
+        """Request the loader to stop at the next opportunity."""
+        self.requestInterruption()
+
+    def run(self):
+        """Upload, decode and slice the audio file, reporting progress through signals."""
+        try:
+            self.progress.emit(0, "Uploading")
+            stored_path = store_upload(self.file_path, self.upload_folder,
+                                       progress=lambda fraction: self.progress.emit(int(fraction * 30), "Uploading"),
+                                       is_cancelled=self.isInterruptionRequested)
+            self.check_cancelled()
+
+            self.progress.emit(30, "Decoding")
+            streaming = os.path.getsize(stored_path) > STREAMING_THRESHOLD_BYTES
+            audio_sample = AudioSample(stored_path, slice_cache=self.slice_cache, decode_cache=self.decode_cache,
+                                       streaming=streaming)
+            self.check_cancelled()
+
+            self.progress.emit(80, "Slicing")
+            audio_sample.create_slices(self.num_slices, self.slicing_mode)
+            self.check_cancelled()
+        except LoadCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
+        self.progress.emit(100, "Done")
+        self.loaded.emit(audio_sample)
+
+    def check_cancelled(self):
+        """Raise LoadCancelled if cancellation was requested."""
+        if self.isInterruptionRequested():
+            raise LoadCancelled()
+
+
+class ProjectLoader(AudioLoader):
+    """
+    A worker thread that opens a project off the GUI thread: finds its source by content hash,
+    then maps or decodes it and restores the slices.
+
+    The opened audio sample is emitted by the loaded signal, its prerendered attribute being the
+    ProjectFile to save it to.
+    """
+
+    def __init__(self, project_path, slice_cache=None, decode_cache=None, upload_folder='upload', parent=None):
+        """
+        The constructor for ProjectLoader class.
+
+        Parameters:
+            project_path (str): The path of the project file.
+            slice_cache (SliceCache): Optional cache of rendered slices.
+            decode_cache (DecodeCache): Optional on-disk cache of decoded audio.
+            upload_folder (str): The folder holding uploaded files.
+            parent (QObject): The parent object.
+        """
+        super().__init__(project_path, 0, slice_cache=slice_cache, decode_cache=decode_cache,
+                         upload_folder=upload_folder, parent=parent)
+
+    def run(self):
+        """Open the project, reporting progress through signals."""
+        try:
+            self.progress.emit(0, "Opening")
+            audio_sample, _ = open_project(self.file_path, slice_cache=self.slice_cache,
+                                           decode_cache=self.decode_cache, upload_folder=self.upload_folder)
+            self.check_cancelled()
+        except LoadCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
+        self.progress.emit(100, "Done")
+        self.loaded.emit(audio_sample)
@@ -1,47 +1,408 @@
-from pydub import AudioSegment
+import threading
+import time
+
+import numpy as np
+
+import pcm
+import pitch_shift
+import slice_export
+from loudness import LoudnessIndex
+from onset_detection import EQUAL, detect_boundaries
+from peak_pyramid import PeakPyramid
+from slice_collection import SliceCollection
+from tracing import tracer
+from streaming import open_stream
+from zero_crossing import ZeroCrossingIndex
+
+
+def decode_file(file_path):
+    """
+    Decode an audio file into a NumPy array.
+
+    Parameters:
+        file_path (str): The path to the audio file.
+
+    Returns:
+        tuple: The (frames, channels) samples, the frame rate and the sample width in bytes.
+    """
+    # pydub is slow to import, so it is only imported once a file is decoded
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(file_path)
+    samples = pcm.to_array(segment.raw_data, segment.sample_width, segment.channels)
+    return samples, segment.frame_rate, segment.sample_width
+
 
 class AudioSample:
     """
     A class to represent an audio sample and its slices for editing.
-    
+
     Attributes:
         file_path (str): The path to the audio file.
-        audio_data (AudioSegment): The audio segment loaded from the file.
-        slices (list): A list of dictionaries containing slice information.
+        audio_data (numpy.ndarray): The decoded audio as a (frames, channels) int16 or float32 array,
+            or None when a streamed file can only be read through get_frames.
+        frame_rate (int): The number of frames per second.
+        channels (int): The number of channels.
+        sample_width (int): The sample width of the source in bytes.
+        frame_count (int): The length of the audio in frames.
+        duration_ms (int): The length of the audio in milliseconds.
+        load_time (float): The time it took to load the audio, in seconds.
+        slices (SliceCollection): The slices of the audio.
+        slice_cache (SliceCache): Optional cache of rendered slices kept in sync with the slices.
+        decode_cache (DecodeCache): Optional on-disk cache of decoded audio.
+        stream (WavReader or ChunkedDecoder): The reader of a streamed file, None if the file was decoded up front.
+        snap_to_zero_crossings (bool): Whether slice boundaries are moved to the nearest zero crossing.
+        snap_tolerance_ms (float): How far a boundary may be moved to reach a zero crossing.
+        fade_ms (float): The fade applied at boundaries left without a zero crossing within the tolerance.
+        peak_pyramid (PeakPyramid): The waveform peaks, None until build_peak_pyramid has run.
+        prerendered (ProjectFile): Optional store of slices rendered ahead of time, e.g. a saved project.
+        loudness_index (LoudnessIndex): The levels of the audio, None until build_loudness_index has run.
+        normalize_lufs (float): The loudness slices are brought to when rendered, or None to render them as they are.
+        applied_lufs (float): The loudness renders are brought to now: normalize_lufs once the
+            loudness index is built, None before.
     """
-    
-    def __init__(self, file_path):
+
+    def __init__(self, file_path, slice_cache=None, decode_cache=None, streaming=False,
+                 snap_to_zero_crossings=True, snap_tolerance_ms=5.0, fade_ms=2.0):
         """
         The constructor for AudioSample class.
-        
+
         Parameters:
             file_path (str): The path to the audio file.
+            slice_cache (SliceCache): Optional cache of rendered slices to fill and invalidate.
+            decode_cache (DecodeCache): Optional on-disk cache to map decoded audio from.
+            streaming (bool): Memory-map WAV files and decode other formats in chunks on demand
+                instead of decoding the whole file, keeping memory use independent of its length.
+            snap_to_zero_crossings (bool): Move slice boundaries to the nearest zero crossing to avoid clicks.
+            snap_tolerance_ms (float): How far a boundary may be moved to reach a zero crossing.
+            fade_ms (float): The fade applied at boundaries left without a zero crossing within the tolerance.
         """
         self.file_path = file_path
+        self.frame_rate = None
+        self.channels = None
+        self.sample_width = None
+        self.load_time = None
+        self.decode_cache = decode_cache
+        self.stream = open_stream(file_path) if streaming else None
         self.audio_data = self.load()
-        self.slices = []
+        self.frame_count = self.stream.frame_count if self.stream is not None else len(self.audio_data)
+        self.duration_ms = self.frame_to_ms(self.frame_count)
+        self.slices = SliceCollection(self.frame_rate)
+        self.slice_cache = slice_cache
+        self.snap_to_zero_crossings = snap_to_zero_crossings
+        self.snap_tolerance_ms = snap_tolerance_ms
+        self.fade_ms = fade_ms
+        self._zero_crossings = None
+        self.peak_pyramid = None
+        self.prerendered = None
+        self.loudness_index = None
+        self.normalize_lufs = None
+        self._loudness_lock = threading.Lock()
 
     def load(self):
-        """Load the audio file into an AudioSegment object."""
-        return AudioSegment.from_file(self.file_path)
+        """
+        Decode the audio file once into a NumPy array, or map it from the decode cache.
+
+        Returns:
+            numpy.ndarray: The decoded (frames, channels) audio, or None if it is only available in chunks.
+        """
+        began = time.perf_counter()
+        if self.stream is not None:
+            self.frame_rate, self.channels, self.sample_width = self.stream.frame_rate, self.stream.channels, self.stream.sample_width
+            self.load_time = time.perf_counter() - began
+            return self.stream.samples
+        if self.decode_cache is not None:
+            samples, self.frame_rate, self.sample_width = self.decode_cache.load(self.file_path, decode_file)
+        else:
+            samples, self.frame_rate, self.sample_width = decode_file(self.file_path)
+        self.channels = samples.shape[1]
+        self.load_time = time.perf_counter() - began
+        return samples
+
+    def ms_to_frame(self, ms):
+        """
+        Convert a time in milliseconds to a frame offset.
+
+        Parameters:
+            ms (int): The time in milliseconds.
+
+        Returns:
+            int: The frame offset, clamped to the audio length.
+        """
+        return min(max(int(round(ms * self.frame_rate / 1000.0)), 0), self.frame_count)
+
+    def frame_to_ms(self, frame):
+        """
+        Convert a frame offset to a time in milliseconds.
+
+        Parameters:
+            frame (int): The frame offset.
+
+        Returns:
+            int: The time in milliseconds.
+        """
+        return int(round(frame * 1000.0 / self.frame_rate))
+
+    def get_frames(self, start_frame, end_frame):
+        """
+        Return a range of frames, as a zero-copy view when the audio is in memory or memory-mapped.
+
+        Streamed files that cannot be mapped directly are read in chunks, so only the range is decoded.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+
+        Returns:
+            numpy.ndarray: The (frames, channels) samples of the range.
+        """
+        if self.audio_data is None:
+            return self.stream.read(start_frame, end_frame)
+        return self.audio_data[start_frame:end_frame]
+
+    @property
+    def zero_crossings(self):
+        """ZeroCrossingIndex: The zero crossing index of audio in memory, built on first use."""
+        if self._zero_crossings is None:
+            frames = self.audio_data if self.audio_data is not None else self.stream
+            self._zero_crossings = ZeroCrossingIndex(frames)
+        return self._zero_crossings
+
+    def build_peak_pyramid(self, is_cancelled=None):
+        """
+        Build the waveform peaks, or map them from the decode cache if they were built before.
+
+        Parameters:
+            is_cancelled (callable): Optional function returning True to stop building early.
+
+        Returns:
+            PeakPyramid: The waveform peaks, or None if building was cancelled.
+        """
+        if self.peak_pyramid is None:
+            frames = self.audio_data if self.audio_data is not None else self.stream
+            if self.decode_cache is not None:
+                self.peak_pyramid = self.decode_cache.load_peaks(
+                    self.file_path, lambda: PeakPyramid.build(frames, is_cancelled=is_cancelled))
+            else:
+                self.peak_pyramid = PeakPyramid.build(frames, is_cancelled=is_cancelled)
+        return self.peak_pyramid
+
+    def build_loudness_index(self, is_cancelled=None):
+        """
+        Build the index answering the RMS, peak and loudness of any range of the audio.
+
+        Parameters:
+            is_cancelled (callable): Optional function returning True to stop building early.
+
+        Returns:
+            LoudnessIndex: The index, or None if building was cancelled.
+        """
+        if self.loudness_index is None:
+            # Callers on other threads wait for the build in progress and reuse its index
+            with self._loudness_lock:
+                if self.loudness_index is None:
+                    frames = self.audio_data if self.audio_data is not None else self.stream
+                    self.loudness_index = LoudnessIndex.build(frames, self.frame_rate, is_cancelled=is_cancelled)
+        return self.loudness_index
+
+    @property
+    def applied_lufs(self):
+        """float: The loudness renders are brought to now, None until the loudness index is built."""
+        return self.normalize_lufs if self.loudness_index is not None else None
+
+    def loudness_stats(self, slice_index=None):
+        """
+        Return the levels of a slice or of the whole audio, building the loudness index if needed.
+
+        Parameters:
+            slice_index (int): The index of the slice, or None for the whole audio.
+
+        Returns:
+            dict: The rms_db, peak_db and loudness_lufs.
+        """
+        if slice_index is None:
+            return self.build_loudness_index().stats(0, self.frame_count)
+        slice_info = self.slices[slice_index]
+        return self.build_loudness_index().stats(slice_info['start_frame'], slice_info['end_frame'])
+
+    def snap_frame(self, frame):
+        """
+        Move a boundary to the nearest zero crossing within the snap tolerance.
+
+        Parameters:
+            frame (int): The boundary frame offset.
+
+        Returns:
+            int: The snapped frame, or the frame itself if snapping is off or no crossing is close enough.
+        """
+        if not self.snap_to_zero_crossings or frame <= 0 or frame >= self.frame_count:
+            return frame
+        tolerance = int(self.snap_tolerance_ms * self.frame_rate / 1000.0)
+        snapped = self.nearest_crossing(frame, tolerance)
+        return frame if snapped is None else snapped
+
+    def nearest_crossing(self, frame, max_distance):
+        """
+        Find the zero crossing nearest to a frame.
+
+        Streamed audio is searched in a window around the frame instead of being indexed as a
+        whole, so snapping reads only the frames near the boundaries.
+
+        Parameters:
+            frame (int): The frame offset.
+            max_distance (int): The maximum distance in frames.
+
+        Returns:
+            int: The nearest zero crossing, or None if there is none within max_distance.
+        """
+        if self.stream is None:
+            return self.zero_crossings.nearest(frame, max_distance)
+        # One frame more on each side decides whether the frames at the window edges are crossings
+        start = max(frame - max_distance - 1, 0)
+        window = ZeroCrossingIndex(self.get_frames(start, min(frame + max_distance + 2, self.frame_count)))
+        snapped = window.nearest(frame - start, max_distance)
+        return None if snapped is None else snapped + start
+
+    def is_crossing(self, frame):
+        """
+        Tell whether a frame is a zero crossing (or the very start or end of the audio).
+
+        Parameters:
+            frame (int): The frame offset.
+
+        Returns:
+            bool: True if the frame is a clean place to cut.
+        """
+        return frame <= 0 or frame >= self.frame_count or self.nearest_crossing(frame, 0) is not None
+
+    def edge_fades(self, start_frame, end_frame):
+        """
+        Return the fades needed at the edges of a range that do not fall on a zero crossing.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+
+        Returns:
+            tuple: The fade-in and fade-out lengths in frames, 0 where no fade is needed.
+        """
+        if not self.snap_to_zero_crossings or not self.fade_ms:
+            return 0, 0
+        fade_frames = min(int(self.fade_ms * self.frame_rate / 1000.0), (end_frame - start_frame) // 2)
+        fade_in = 0 if self.is_crossing(start_frame) else fade_frames
+        fade_out = 0 if self.is_crossing(end_frame) else fade_frames
+        return fade_in, fade_out
+
+    def render_frames(self, start_frame, end_frame, semitones=0, pitch_mode=pitch_shift.RESAMPLE, frame_rate=None,
+                      normalize=True):
+        """
+        Render a range of frames with edge fades, a pitch shift and the loudness normalization applied.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+            semitones (int): The pitch shift in semitones.
+            pitch_mode (str): One of pitch_shift.MODES.
+            frame_rate (int): The frame rate to render at, the sample's own by default.
+            normalize (bool): Whether to bring the range to normalize_lufs, if that is set and the
+                loudness index is built; building it is left to a background thread, not a key press.
+
+        Returns:
+            numpy.ndarray: The rendered (frames, channels) samples; a view of the source when nothing had to change.
+        """
+        frame_rate = frame_rate or self.frame_rate
+        frames = None
+        if self.prerendered is not None:
+            frames = self.prerendered.rendered(start_frame, end_frame, semitones, pitch_mode, frame_rate)
+        if frames is None:
+            with tracer.span('read_frames'):
+                frames = pcm.apply_fades(self.get_frames(start_frame, end_frame), *self.edge_fades(start_frame, end_frame))
+            if semitones != 0 or frame_rate != self.frame_rate:
+                # Pitch shift and conversion to the target rate share a single resampling pass
+                with tracer.span('pitch_shift'):
+                    frames = pitch_shift.shift(frames, semitones, pitch_mode, frame_rate / self.frame_rate)
+        if normalize and self.applied_lufs is not None:
+            # Resampling keeps the level, so the gain is that of the source range
+            gain = self.loudness_index.normalization_gain(start_frame, end_frame, self.applied_lufs)
+            frames = pcm.to_float(frames) * np.float32(gain)
+        return frames
+
+    def render_slice(self, slice_index, pitch_mode=pitch_shift.RESAMPLE, frame_rate=None, normalize=True):
+        """
+        Render a slice with its pitch shift and the loudness normalization applied.
 
-    def create_slices(self, num_slices):
+        Parameters:
+            slice_index (int): The index of the slice.
+            pitch_mode (str): One of pitch_shift.MODES.
+            frame_rate (int): The frame rate to render at, the sample's own by default.
+            normalize (bool): Whether to bring the slice to normalize_lufs, if that is set.
+
+        Returns:
+            numpy.ndarray: The rendered (frames, channels) samples.
+        """
+        slice_info = self.slices[slice_index]
+        return self.render_frames(slice_info['start_frame'], slice_info['end_frame'], slice_info['pitch_shift'],
+                                  pitch_mode, frame_rate, normalize)
+
+    def export_slices(self, output_path, file_format=slice_export.WAV, concatenate=False,
+                      pitch_mode=pitch_shift.RESAMPLE, workers=None, progress=None, is_cancelled=None):
         """
-        Create equal-length audio slices from the audio data.
-        
+        Export every slice with its pitch shift applied, as one file per slice or as one file with cue points.
+
+        Parameters:
+            output_path (str): The folder the slice files are written to, or the concatenated WAV file.
+            file_format (str): One of slice_export.EXPORT_FORMATS; concatenated exports are always WAV.
+            concatenate (bool): Whether to write all slices to one WAV file, marking each with a cue point.
+            pitch_mode (str): One of pitch_shift.MODES.
+            workers (int): The number of render threads, the number of cores by default.
+            progress (callable): Optional function called with the fraction of slices written.
+            is_cancelled (callable): Optional function returning True to stop and remove the files written.
+
+        Returns:
+            list: The paths of the files written.
+        """
+        return slice_export.export_slices(self, output_path, file_format, concatenate, pitch_mode, workers,
+                                          progress=progress, is_cancelled=is_cancelled)
+
+    def get_slice_view(self, slice_index):
+        """
+        Return a zero-copy view of the frames of a slice.
+
+        Parameters:
+            slice_index (int): The index of the slice.
+
+        Returns:
+            numpy.ndarray: A (frames, channels) view into the audio data.
+        """
+        slice_info = self.slices[slice_index]
+        return self.get_frames(slice_info['start_frame'], slice_info['end_frame'])
+
+    def create_slices(self, num_slices, mode=EQUAL):
+        """
+        Create audio slices from the audio data, either of equal length or starting at detected transients.
+
         Parameters:
             num_slices (int): The number of slices to create.
+            mode (str): One of onset_detection.SLICING_MODES: equal divisions, onsets or beats.
         """
-        slice_duration = len(self.audio_data) // num_slices
-        for i in range(num_slices):
-            start = i * slice_duration
-            end = start + slice_duration
-            self.slices.append({'start': start, 'end': end, 'pitch_shift': 0})
+        if mode == EQUAL:
+            slice_frames = self.frame_count // num_slices
+            bounds = [(i * slice_frames, (i + 1) * slice_frames) for i in range(num_slices)]
+        else:
+            frames = self.audio_data if self.audio_data is not None else self.stream
+            starts = detect_boundaries(frames, self.frame_rate, num_slices, mode)
+            bounds = list(zip(starts, starts[1:] + [self.frame_count]))
+        # Neighbouring slices share their boundary, which is snapped once
+        snapped = {frame: self.snap_frame(frame) for frame in sorted({frame for bound in bounds for frame in bound})}
+        self.slices.extend([(snapped[start_frame], snapped[end_frame]) for start_frame, end_frame in bounds])
+
+        # Render the slices ahead of time so the first key press plays right away
+        if self.slice_cache is not None:
+            self.slice_cache.prefill(self)
 
     def adjust_slice(self, slice_index, start_adjust=None, end_adjust=None, pitch_shift=None):
         """
         Adjust the specified slice with new start, end, and pitch shift values.
-        
+
         Parameters:
             slice_index (int): The index of the slice to adjust.
             start_adjust (int): The amount to adjust the start time in milliseconds.
@@ -50,33 +411,40 @@ class AudioSample:
         """
         if 0 <= slice_index < len(self.slices):
             slice_info = self.slices[slice_index]
+            old_key = self.slice_cache.key_for(self, slice_info) if self.slice_cache is not None else None
             # Calculate new start and end times based on the adjustments
             new_start = slice_info['start'] + (start_adjust if start_adjust is not None else 0)
             new_end = slice_info['end'] + (end_adjust if end_adjust is not None else 0)
 
             # Ensure the new start and end are within the bounds of the original audio
-            if new_start < 0 or new_start > len(self.audio_data):
-                raise ValueError("Start Adjust is out of range. Must be between 0 and {} ms.".format(len(self.audio_data)))
+            if new_start < 0 or new_start > self.duration_ms:
+                raise ValueError("Start Adjust is out of range. Must be between 0 and {} ms.".format(self.duration_ms))
 
-            if new_end < 0 or new_end > len(self.audio_data):
-                raise ValueError("End Adjust is out of range. Must be between 0 and {} ms.".format(len(self.audio_data)))
+            if new_end < 0 or new_end > self.duration_ms:
+                raise ValueError("End Adjust is out of range. Must be between 0 and {} ms.".format(self.duration_ms))
 
             if new_start > new_end:
                 raise ValueError("Start Adjust must be less than or equal to End Adjust.")
 
             # Update pitch shift as a delta and limit it to the range of -24 to 24
+            new_pitch_shift = slice_info['pitch_shift']
             if pitch_shift is not None:
-                new_pitch_shift = slice_info['pitch_shift'] + pitch_shift
-                
+                new_pitch_shift += pitch_shift
+
                 # Raise a ValueError if pitch shift is out of range
                 if new_pitch_shift < -24 or new_pitch_shift > 24:
                     raise ValueError("Pitch Shift must be between -24 and 24.")
-                
-                slice_info['pitch_shift'] = new_pitch_shift
-            
-            # Update the start and end times after validation
-            slice_info['start'] = new_start
-            slice_info['end'] = new_end
 
+            # Recompute (and snap) the frame offsets of moved edges
+            start_frame, end_frame = slice_info['start_frame'], slice_info['end_frame']
+            if new_start != slice_info['start']:
+                start_frame = self.snap_frame(self.ms_to_frame(new_start))
+            if new_end != slice_info['end']:
+                end_frame = self.snap_frame(self.ms_to_frame(new_end))
+            # Snapping may move the edges past each other, collapse the slice at its end then
+            self.slices.update(slice_index, min(start_frame, end_frame), end_frame, new_pitch_shift)
 
-        
\ No newline at end of file
+            # Only the adjusted slice needs to be rendered again, in the background so adjusting stays responsive
+            if self.slice_cache is not None and self.slice_cache.key_for(self, slice_info) != old_key:
+                self.slice_cache.invalidate(old_key)
+                self.slice_cache.prefill_async(self, [slice_index])
@@ -0,0 +1,190 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pitch_shift
+from audio_sample import AudioSample
+from onset_detection import EQUAL, SLICING_MODES
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+
+def find_audio_files(patterns):
+    """
+    Expand directories and glob patterns into a sorted list of audio files.
+
+    Parameters:
+        patterns (list): Directories (searched recursively), glob patterns or file paths.
+
+    Returns:
+        list: The paths of the audio files, without duplicates.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                found.update(os.path.join(root, name) for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            found.update(path for path in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(found)
+
+
+def output_names(file_paths):
+    """
+    Choose an output folder name for every input file.
+
+    Folders are named after the file stem; stems used by several files get a short hash of
+    the full path appended, so sample packs with repeated names do not overwrite each other.
+
+    Parameters:
+        file_paths (list): The paths of the audio files.
+
+    Returns:
+        dict: The output folder name of each path.
+    """
+    stems = {}
+    for path in file_paths:
+        stems.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+    names = {}
+    for stem, paths in stems.items():
+        for path in paths:
+            if len(paths) == 1:
+                names[path] = stem
+            else:
+                digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+                names[path] = '{}-{}'.format(stem, digest)
+    return names
+
+
+def process_file(file_path, output_folder, num_slices, mode=EQUAL, pitch_mode=pitch_shift.RESAMPLE):
+    """
+    Load, slice and export a single audio file.
+
+    Every slice is written as its own 16-bit WAV file next to a manifest.json describing the
+    slices. Slices are written in chunks as they are rendered, so only a few are held in memory.
+
+    Parameters:
+        file_path (str): The path to the audio file.
+        output_folder (str): The folder the slices and the manifest are written to.
+        num_slices (int): The number of slices.
+        mode (str): One of onset_detection.SLICING_MODES.
+        pitch_mode (str): One of pitch_shift.MODES.
+
+    Returns:
+        dict: The manifest of the file.
+    """
+    sample = AudioSample(file_path)
+    sample.create_slices(num_slices, mode)
+
+    # Files are already spread across processes, so each one is rendered on a single thread
+    paths = sample.export_slices(output_folder, pitch_mode=pitch_mode, workers=1)
+    slices = []
+    for path, slice_info in zip(paths, sample.slices):
+        slices.append({
+            'file': os.path.basename(path),
+            'start': slice_info['start'],
+            'end': slice_info['end'],
+            'start_frame': slice_info['start_frame'],
+            'end_frame': slice_info['end_frame'],
+            'pitch_shift': slice_info['pitch_shift'],
+        })
+
+    manifest = {
+        'source': os.path.abspath(file_path),
+        'frame_rate': sample.frame_rate,
+        'channels': sample.channels,
+        'duration': sample.duration_ms,
+        'mode': mode,
+        'slices': slices,
+    }
+    with open(os.path.join(output_folder, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def run_batch(file_paths, output_root, num_slices, mode=EQUAL, workers=None, out=sys.stdout):
+    """
+    Slice and export many files across a process pool, reporting each file as it finishes.
+
+    Only a bounded number of files are in flight at a time, so thousands of files can be
+    queued without holding their results in memory.
+
+    Parameters:
+        file_paths (list): The paths of the audio files.
+        output_root (str): The folder the per-file output folders are created in.
+        num_slices (int): The number of slices per file.
+        mode (str): One of onset_detection.SLICING_MODES.
+        workers (int): The number of worker processes, the number of cores by default.
+        out (file): Where progress is reported.
+
+    Returns:
+        dict: The number of files done and failed, the seconds and audio minutes processed.
+    """
+    workers = workers or os.cpu_count() or 1
+    names = output_names(file_paths)
+    remaining = iter(file_paths)
+    summary = {'done': 0, 'failed': 0, 'audio_minutes': 0.0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            path = next(remaining, None)
+            if path is not None:
+                future = executor.submit(process_file, path, os.path.join(output_root, names[path]), num_slices, mode)
+                in_flight[future] = path
+
+        for _ in range(workers * 2):
+            submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    manifest = future.result()
+                except Exception as e:
+                    summary['failed'] += 1
+                    print("FAILED {}: {}".format(path, e), file=out, flush=True)
+                else:
+                    summary['done'] += 1
+                    summary['audio_minutes'] += manifest['duration'] / 60000.0
+                    print("{} -> {} ({} slices)".format(path, names[path], len(manifest['slices'])), file=out, flush=True)
+                submit_next()
+
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def main(argv=None):
+    """Parse the command line and slice the given files."""
+    parser = argparse.ArgumentParser(description="Slice audio files and export every slice with a JSON manifest.")
+    parser.add_argument('inputs', nargs='+', help="Directories, glob patterns or audio files.")
+    parser.add_argument('-o', '--output', default='slices', help="The output folder.")
+    parser.add_argument('-n', '--num-slices', type=int, default=8, help="The number of slices per file.")
+    parser.add_argument('-m', '--mode', choices=SLICING_MODES, default=EQUAL, help="How slice boundaries are chosen.")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="The number of worker processes.")
+    args = parser.parse_args(argv)
+
+    if args.num_slices < 1:
+        parser.error("The number of slices must be at least 1.")
+    file_paths = find_audio_files(args.inputs)
+    if not file_paths:
+        parser.error("No audio files found.")
+
+    summary = run_batch(file_paths, args.output, args.num_slices, args.mode, args.jobs)
+    seconds = max(summary['seconds'], 1e-9)
+    print("{} files done, {} failed in {:.1f} s: {:.2f} files/s, {:.2f} audio minutes/s".format(
+        summary['done'], summary['failed'], summary['seconds'],
+        summary['done'] / seconds, summary['audio_minutes'] / seconds))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from peak_pyramid import PeakPyramid
+from upload_store import content_hash
+
+# Header: magic, version, frame rate, channels, source sample width, dtype code, frame count
+HEADER = struct.Struct('<4sHIHHcxQ')
+HEADER_SIZE = 64
+MAGIC = b'TCPM'
+VERSION = 1
+DTYPE_CODES = {np.dtype(np.int16): b'h', np.dtype(np.float32): b'f'}
+
+
+class DecodeCache:
+    """
+    An on-disk cache of decoded audio stored as memory-mappable raw PCM files.
+
+    Each entry is a single file named after the content hash of the source: a small header with
+    the frame rate, channels and sample width followed by the (frames, channels) samples. A
+    repeat load maps the file instead of decoding the source again. The waveform peaks of a
+    source are kept next to its samples and evicted with the same budget.
+
+    Attributes:
+        cache_folder (str): The folder holding the cached files.
+        max_bytes (int): The maximum total size of the cached files in bytes.
+        cold_loads (int): Number of loads that had to decode the source.
+        warm_loads (int): Number of loads served from the cache.
+        cold_time (float): Total time spent on cold loads, in seconds.
+        warm_time (float): Total time spent on warm loads, in seconds.
+    """
+
+    def __init__(self, cache_folder=os.path.join('cache', 'decoded'), max_bytes=2 * 1024 * 1024 * 1024):
+        """
+        The constructor for DecodeCache class.
+
+        Parameters:
+            cache_folder (str): The folder holding the cached files.
+            max_bytes (int): The disk budget for cached files in bytes.
+        """
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.cold_loads = 0
+        self.warm_loads = 0
+        self.cold_time = 0.0
+        self.warm_time = 0.0
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def source_hash(self, file_path):
+        """
+        Return the content hash of a source file, remembering it while the file is unchanged.
+
+        Parameters:
+            file_path (str): The path to the source file.
+
+        Returns:
+            str: The hex digest of the file content.
+        """
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            file_hash = self._hashes.get(memo_key)
+        if file_hash is None:
+            file_hash = content_hash(file_path)
+            with self._lock:
+                self._hashes[memo_key] = file_hash
+        return file_hash
+
+    def path_for(self, file_hash):
+        """
+        Return the path of the cache entry for a content hash.
+
+        Parameters:
+            file_hash (str): The content hash of the source.
+
+        Returns:
+            str: The path of the cache file.
+        """
+        return os.path.join(self.cache_folder, file_hash + '.pcm')
+
+    def peaks_path_for(self, file_hash):
+        """
+        Return the path of the waveform peaks for a content hash.
+
+        Parameters:
+            file_hash (str): The content hash of the source.
+
+        Returns:
+            str: The path of the peaks file.
+        """
+        return os.path.join(self.cache_folder, file_hash + '.peaks')
+
+    def load(self, file_path, decode):
+        """
+        Load decoded audio from the cache, decoding and storing it on a miss.
+
+        Parameters:
+            file_path (str): The path to the source file.
+            decode (callable): Function called as decode(file_path) returning a tuple of
+                (samples, frame_rate, sample_width) where samples is a (frames, channels) array.
+
+        Returns:
+            tuple: The (samples, frame_rate, sample_width) of the decoded audio; samples is a
+                read-only memory map on a hit.
+        """
+        began = time.perf_counter()
+        cache_path = self.path_for(self.source_hash(file_path))
+
+        cached = self.read(cache_path)
+        if cached is not None:
+            with self._lock:
+                self.warm_loads += 1
+                self.warm_time += time.perf_counter() - began
+            return cached
+
+        samples, frame_rate, sample_width = decode(file_path)
+        self.write(cache_path, samples, frame_rate, sample_width)
+        self.evict()
+        with self._lock:
+            self.cold_loads += 1
+            self.cold_time += time.perf_counter() - began
+        return samples, frame_rate, sample_width
+
+    def load_peaks(self, file_path, build):
+        """
+        Load the waveform peaks of a source from the cache, building and storing them on a miss.
+
+        Parameters:
+            file_path (str): The path to the source file.
+            build (callable): Function called without arguments returning a PeakPyramid, or None if cancelled.
+
+        Returns:
+            PeakPyramid: The peaks, memory-mapped on a hit; None if building was cancelled.
+        """
+        peaks_path = self.peaks_path_for(self.source_hash(file_path))
+        pyramid = PeakPyramid.load(peaks_path)
+        if pyramid is None:
+            pyramid = build()
+            if pyramid is not None:
+                pyramid.save(peaks_path)
+                self.evict()
+        return pyramid
+
+    def read(self, cache_path):
+        """
+        Map a cache file, marking it as recently used.
+
+        Parameters:
+            cache_path (str): The path of the cache file.
+
+        Returns:
+            tuple: The (samples, frame_rate, sample_width), or None if there is no valid entry.
+        """
+        try:
+            with open(cache_path, 'rb') as f:
+                header = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < HEADER.size:
+            return None
+        magic, version, frame_rate, channels, sample_width, dtype_code, frames = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        dtype = np.int16 if dtype_code == b'h' else np.float32
+        os.utime(cache_path)
+        if frames == 0:
+            return np.zeros((0, channels), dtype=dtype), frame_rate, sample_width
+        samples = np.memmap(cache_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(frames, channels))
+        return samples, frame_rate, sample_width
+
+    def write(self, cache_path, samples, frame_rate, sample_width):
+        """
+        Store decoded audio in a cache file.
+
+        Parameters:
+            cache_path (str): The path of the cache file.
+            samples (numpy.ndarray): The (frames, channels) int16 or float32 samples.
+            frame_rate (int): The number of frames per second.
+            sample_width (int): The sample width of the source in bytes.
+        """
+        os.makedirs(self.cache_folder, exist_ok=True)
+        header = HEADER.pack(MAGIC, VERSION, frame_rate, samples.shape[1], sample_width,
+                             DTYPE_CODES[samples.dtype], samples.shape[0])
+        partial_path = cache_path + '.part'
+        with open(partial_path, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.write(np.ascontiguousarray(samples).data)
+        os.replace(partial_path, cache_path)
+
+    def evict(self):
+        """
+        Remove the least recently used cache files until the cache fits its budget.
+        """
+        try:
+            names = [name for name in os.listdir(self.cache_folder) if name.endswith(('.pcm', '.peaks'))]
+        except FileNotFoundError:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_folder, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        # Always keep the most recently used entry, even if it is over budget on its own
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def stats(self):
+        """
+        Return the cold and warm load counters.
+
+        Returns:
+            dict: Load counts and total and average times for cold and warm loads.
+        """
+        with self._lock:
+            return {
+                'cold_loads': self.cold_loads,
+                'warm_loads': self.warm_loads,
+                'cold_time': self.cold_time,
+                'warm_time': self.warm_time,
+                'avg_cold_time': self.cold_time / self.cold_loads if self.cold_loads else 0.0,
+                'avg_warm_time': self.warm_time / self.warm_loads if self.warm_loads else 0.0,
+            }
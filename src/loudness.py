@@ -0,0 +1,303 @@
+import numpy as np
+
+import pcm
+
+# The K-weighting of ITU-R BS.1770: a high shelf boosting the upper mids, then a high pass
+SHELF_GAIN_DB = 3.999843853973347
+SHELF_Q = 0.7071752369554196
+SHELF_FREQUENCY = 1681.974450955533
+HIGH_PASS_Q = 0.5003270373238773
+HIGH_PASS_FREQUENCY = 38.13547087602444
+# The filter's impulse response dies out within a few milliseconds, so it is applied truncated
+IMPULSE_FRAMES = 2048
+LOUDNESS_OFFSET = -0.691
+SILENCE_DB = -120.0
+
+
+def k_weighting(frame_rate):
+    """
+    Return the two biquads of the K-weighting filter for a frame rate.
+
+    Parameters:
+        frame_rate (int): The number of frames per second.
+
+    Returns:
+        list: The (b, a) coefficients of each biquad, with a[0] == 1.
+    """
+    k = np.tan(np.pi * SHELF_FREQUENCY / frame_rate)
+    vh = 10.0 ** (SHELF_GAIN_DB / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / SHELF_Q + k * k
+    shelf = ([(vh + vb * k / SHELF_Q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / SHELF_Q + k * k) / a0],
+             [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / SHELF_Q + k * k) / a0])
+    k = np.tan(np.pi * HIGH_PASS_FREQUENCY / frame_rate)
+    a0 = 1.0 + k / HIGH_PASS_Q + k * k
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / HIGH_PASS_Q + k * k) / a0])
+    return [shelf, high_pass]
+
+
+def k_weighting_impulse(frame_rate, length=IMPULSE_FRAMES):
+    """
+    Return the impulse response of the K-weighting filter, truncated.
+
+    Parameters:
+        frame_rate (int): The number of frames per second.
+        length (int): The number of taps.
+
+    Returns:
+        numpy.ndarray: The float32 impulse response.
+    """
+    size = 4 * length
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(size))
+    response = np.ones(len(z), dtype=np.complex128)
+    for b, a in k_weighting(frame_rate):
+        response *= (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.fft.irfft(response, size)[:length].astype(np.float32)
+
+
+def to_db(values, scale=10.0):
+    """Convert powers (scale 10) or amplitudes (scale 20) to decibels, with silence at SILENCE_DB."""
+    with np.errstate(divide='ignore'):
+        return np.maximum(scale * np.log10(values), SILENCE_DB)
+
+
+class LoudnessIndex:
+    """
+    Answers the RMS, peak and loudness of any range of audio in constant time.
+
+    A single pass over the audio stores, per block of frames, the running sums of the energy and
+    of the K-weighted energy, and the block peaks in a pyramid where each level holds the maxima
+    of pairs of the level below, about twice as many peaks as blocks in all. A range, such as a
+    slice after an edit, is then measured from two running sums and at most two peaks per level
+    for its whole blocks, plus at most two partial blocks at its edges read from the audio, so
+    the cost grows with the logarithm of its length at most. The edges of all ranges are read
+    together, each boundary block once. The K-weighted energy of a partial block is the share
+    of its block's that the partial block holds of its plain energy.
+
+    Loudness follows BS.1770 (K-weighted mean square, channels summed) without gating, so it
+    is comparable between slices of any length.
+
+    Attributes:
+        frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+        frame_count (int): The length of the audio in frames.
+        frame_rate (int): The number of frames per second.
+        block_frames (int): The number of frames per block.
+    """
+
+    def __init__(self, frames, frame_rate, block_frames, energy_sums, weighted_sums, peak_levels):
+        """
+        The constructor for LoudnessIndex class.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+            frame_rate (int): The number of frames per second.
+            block_frames (int): The number of frames per block.
+            energy_sums (numpy.ndarray): The float64 energy before every block and at the end.
+            weighted_sums (numpy.ndarray): The float64 K-weighted energy before every block and at the end.
+            peak_levels (list): The float32 peaks of every block, then of every pair of the level below.
+        """
+        self.frames = frames
+        self.frame_count = len(frames)
+        self.frame_rate = frame_rate
+        self.block_frames = block_frames
+        self._energy_sums = energy_sums
+        self._weighted_sums = weighted_sums
+        self._peak_levels = peak_levels
+
+    @classmethod
+    def build(cls, frames, frame_rate, block_frames=128, chunk_frames=(1 << 16) - IMPULSE_FRAMES, is_cancelled=None):
+        """
+        Build the index in a single pass over the audio.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+            frame_rate (int): The number of frames per second.
+            block_frames (int): The number of frames per block.
+            chunk_frames (int): The number of frames read and filtered at a time; with the impulse
+                response, a power of two is the fastest transform size.
+            is_cancelled (callable): Optional function returning True to stop building early.
+
+        Returns:
+            LoudnessIndex: The index, or None if building was cancelled.
+        """
+        frame_count = len(frames)
+        chunk_frames = max(chunk_frames // block_frames, 1) * block_frames
+        impulse = k_weighting_impulse(frame_rate)
+        fft_size = 1 << int(np.ceil(np.log2(chunk_frames + len(impulse) - 1)))
+        impulse_spectrum = np.fft.rfft(impulse, fft_size)[:, None].astype(np.complex64)
+        tail = None
+        energies, weighted, peaks = [], [], []
+        for start in range(0, frame_count, chunk_frames):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            chunk = pcm.to_float(np.asarray(frames[start:start + chunk_frames]))
+            # Filter by overlap-add: the tail of each chunk's response spills into the next chunk
+            filtered = np.fft.irfft(np.fft.rfft(chunk, fft_size, axis=0) * impulse_spectrum, fft_size, axis=0)
+            filtered = filtered[:len(chunk) + len(impulse) - 1]
+            if tail is not None:
+                filtered[:len(tail)] += tail
+            tail = filtered[len(chunk):]
+            filtered = filtered[:len(chunk)]
+
+            # Reduce whole blocks at once, channels included, which is much faster than per frame
+            padding = -len(chunk) % block_frames
+            if padding:
+                chunk = np.concatenate([chunk, np.zeros((padding, chunk.shape[1]), dtype=chunk.dtype)])
+                filtered = np.concatenate([filtered, np.zeros((padding, filtered.shape[1]), dtype=filtered.dtype)])
+            width = block_frames * chunk.shape[1]
+            energies.append(np.square(chunk).reshape(-1, width).sum(axis=1, dtype=np.float64) / chunk.shape[1])
+            weighted.append(np.square(filtered).reshape(-1, width).sum(axis=1, dtype=np.float64))
+            peaks.append(np.abs(chunk).reshape(-1, width).max(axis=1))
+
+        def running_sums(parts):
+            sums = np.zeros(sum(len(part) for part in parts) + 1)
+            if parts:
+                np.cumsum(np.concatenate(parts), out=sums[1:])
+            return sums
+
+        peak_levels = [np.concatenate(peaks) if peaks else np.zeros(0, dtype=np.float32)]
+        while len(peak_levels[-1]) > 1:
+            below = peak_levels[-1]
+            if len(below) % 2:
+                # An odd last peak has no pair and is carried up as it is
+                below = np.append(below, below[-1])
+            peak_levels.append(np.maximum(below[0::2], below[1::2]))
+        return cls(frames, frame_rate, block_frames, running_sums(energies), running_sums(weighted), peak_levels)
+
+    def edges(self, start_frames, end_frames):
+        """
+        Measure parts of single blocks from the audio, all parts at once.
+
+        Every block holding a part is read once, so neighbouring slices sharing a boundary block
+        share its read: in one gather from an array in memory, or one read per run of adjacent
+        blocks from a stream.
+
+        Parameters:
+            start_frames (numpy.ndarray): The first frame of each part.
+            end_frames (numpy.ndarray): The frame after the last frame of each part, in the same block.
+
+        Returns:
+            tuple: The energies, the K-weighted energies and the peaks of the parts, 0 for empty parts.
+        """
+        starts = np.asarray(start_frames, dtype=np.int64)
+        ends = np.asarray(end_frames, dtype=np.int64)
+        energy, weighted, peak = np.zeros(len(starts)), np.zeros(len(starts)), np.zeros(len(starts))
+        parts = ends > starts
+        if not parts.any():
+            return energy, weighted, peak
+        blocks = starts[parts] // self.block_frames
+        unique_blocks, rows = np.unique(blocks, return_inverse=True)
+        audio = self._read_blocks(unique_blocks)
+
+        # Running sums within each block give the energy of any part of it
+        block_sums = np.zeros((len(unique_blocks), self.block_frames + 1))
+        np.cumsum(np.square(audio, dtype=np.float64).sum(axis=2) / audio.shape[2], axis=1, out=block_sums[:, 1:])
+        low, high = starts[parts] - blocks * self.block_frames, ends[parts] - blocks * self.block_frames
+        part_energy = block_sums[rows, high] - block_sums[rows, low]
+        columns = np.arange(self.block_frames)
+        inside = (columns >= low[:, None]) & (columns < high[:, None])
+        part_peak = np.where(inside, np.abs(audio).max(axis=2)[rows], 0.0).max(axis=1)
+
+        block_energy = self._energy_sums[blocks + 1] - self._energy_sums[blocks]
+        block_weighted = self._weighted_sums[blocks + 1] - self._weighted_sums[blocks]
+        share = np.divide(part_energy, block_energy, out=np.zeros(len(blocks)), where=block_energy > 0)
+        energy[parts], weighted[parts], peak[parts] = part_energy, block_weighted * share, part_peak
+        return energy, weighted, peak
+
+    def _read_blocks(self, blocks):
+        """Read whole blocks as a (blocks, block_frames, channels) float32 array, zero past the end."""
+        if isinstance(self.frames, np.ndarray):
+            positions = blocks[:, None] * self.block_frames + np.arange(self.block_frames)
+            audio = np.array(pcm.to_float(self.frames[np.minimum(positions, self.frame_count - 1)]), dtype=np.float32)
+            audio[positions >= self.frame_count] = 0.0
+            return audio
+        audio = []
+        for run in np.split(blocks, np.flatnonzero(np.diff(blocks) != 1) + 1):
+            frames = pcm.to_float(np.asarray(self.frames[run[0] * self.block_frames:(run[-1] + 1) * self.block_frames]))
+            padding = len(run) * self.block_frames - len(frames)
+            if padding:
+                frames = np.concatenate([frames, np.zeros((padding, frames.shape[1]), dtype=frames.dtype)])
+            audio.append(frames.reshape(len(run), self.block_frames, -1))
+        return np.concatenate(audio).astype(np.float32, copy=False)
+
+    def _block_peaks(self, first, last):
+        """Return the peaks of the runs of blocks [first, last), climbing the pyramid for all runs at once."""
+        peak = np.zeros(len(first))
+        low, high = first.copy(), last.copy()
+        for level in self._peak_levels:
+            active = low < high
+            if not active.any():
+                break
+            # A run starting or ending on an unpaired peak takes it and leaves the pairs to the level above
+            odd = active & (low % 2 == 1)
+            peak[odd] = np.maximum(peak[odd], level[low[odd]])
+            low[odd] += 1
+            odd = active & (high % 2 == 1) & (low < high)
+            high[odd] -= 1
+            peak[odd] = np.maximum(peak[odd], level[high[odd]])
+            low //= 2
+            high //= 2
+        return peak
+
+    def stats(self, start_frames, end_frames):
+        """
+        Return the levels of ranges of the audio, all ranges in one vectorized pass.
+
+        Parameters:
+            start_frames (int or numpy.ndarray): The first frame of each range.
+            end_frames (int or numpy.ndarray): The frame after the last frame of each range.
+
+        Returns:
+            dict: The rms_db, peak_db and loudness_lufs of each range, as floats for a single
+            range or arrays for several; empty ranges read as silence.
+        """
+        scalar = np.ndim(start_frames) == 0
+        starts = np.clip(np.atleast_1d(np.asarray(start_frames, dtype=np.int64)), 0, self.frame_count)
+        ends = np.maximum(np.clip(np.atleast_1d(np.asarray(end_frames, dtype=np.int64)), 0, self.frame_count), starts)
+
+        # The whole blocks of every range, from the running sums and the peak pyramid at once
+        first = np.minimum(-(-starts // self.block_frames), ends // self.block_frames)
+        last = np.maximum(ends // self.block_frames, first)
+        energy = self._energy_sums[last] - self._energy_sums[first]
+        weighted = self._weighted_sums[last] - self._weighted_sums[first]
+        peak = self._block_peaks(first, last)
+
+        # The partial blocks before and after the whole ones, of all ranges in one read; a range
+        # within a single block is all after
+        count = len(starts)
+        edge_energy, edge_weighted, edge_peak = self.edges(
+            np.concatenate([starts, np.clip(last * self.block_frames, starts, ends)]),
+            np.concatenate([np.clip(first * self.block_frames, starts, ends), ends]))
+        energy += edge_energy[:count] + edge_energy[count:]
+        weighted += edge_weighted[:count] + edge_weighted[count:]
+        peak = np.maximum(peak, np.maximum(edge_peak[:count], edge_peak[count:]))
+
+        silent = ends == starts
+        lengths = np.maximum(ends - starts, 1)
+        stats = {
+            'rms_db': np.where(silent, SILENCE_DB, to_db(np.maximum(energy, 0.0) / lengths)),
+            'peak_db': np.where(silent, SILENCE_DB, to_db(peak, 20.0)),
+            'loudness_lufs': np.where(silent, SILENCE_DB,
+                                      np.maximum(LOUDNESS_OFFSET + to_db(np.maximum(weighted, 0.0) / lengths), SILENCE_DB)),
+        }
+        if scalar:
+            return {name: float(values[0]) for name, values in stats.items()}
+        return stats
+
+    def normalization_gain(self, start_frame, end_frame, target_lufs):
+        """
+        Return the gain bringing a range to a loudness without clipping its peak.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+            target_lufs (float): The loudness to reach.
+
+        Returns:
+            float: The linear gain, 1.0 for silence.
+        """
+        stats = self.stats(start_frame, end_frame)
+        if stats['loudness_lufs'] <= SILENCE_DB:
+            return 1.0
+        gain_db = min(target_lufs - stats['loudness_lufs'], -stats['peak_db'])
+        return 10.0 ** (gain_db / 20.0)
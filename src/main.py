@@ -1,12 +1,38 @@
+import time
+
+STARTED = time.perf_counter()
+
 import sys
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 from audio_app import AudioApp
+from project_saver import ProjectSaver
 
 def main():
-    """The main function to start the application."""
-    app = QApplication(sys.argv)
+    """
+    The main function to start the application.
+
+    With --startup-time, prints the seconds from launch until the window is shown and the
+    event loop runs, then exits.
+    """
+    measure_startup = '--startup-time' in sys.argv
+    app = QApplication([arg for arg in sys.argv if arg != '--startup-time'])
     ex = AudioApp()
-    sys.exit(app.exec_())
+    if measure_startup:
+        def report():
+            print("startup {:.3f} s".format(time.perf_counter() - STARTED), flush=True)
+            app.quit()
+        QTimer.singleShot(0, report)
+    status = app.exec_()
+    ex.sequencer.stop()
+    if ex.exporter is not None:
+        # A save is finished before exiting; an export or bounce cut off at exit is removed
+        # rather than left half written
+        if not isinstance(ex.exporter, ProjectSaver):
+            ex.exporter.cancel()
+        ex.exporter.wait()
+    ex.play_control.mixer.shutdown()
+    sys.exit(status)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from tracing import tracer
+
+# How a new trigger of a voice key treats the voice still sounding for that key
+CHOKE = 'choke'
+RETRIGGER = 'retrigger'
+VOICE_MODES = (CHOKE, RETRIGGER)
+
+
+class MixerEngine:
+    """
+    A polyphonic mixer on top of pygame mixer channels.
+
+    Sounds are handed over from the caller (usually the GUI thread) through a deque, which is
+    safe to append to and pop from without a lock, and started by a dispatcher thread. Each
+    trigger either chokes the voice of the same key or starts an additional voice. The voice of
+    every key is remembered under a lock, since callers stop voices and reserve a channel while
+    the dispatcher starts them.
+
+    pygame is imported and the mixer opened by start, not by the constructor, so creating the
+    engine costs nothing at startup. The mixer is opened in the requested format, which is
+    therefore known before it is open.
+
+    Attributes:
+        voices (int): The number of voices that can sound at the same time.
+        buffer_size (int): The mixer buffer size in frames.
+        mixer_format (tuple): The (frequency, size, channels) format of the mixer.
+        buffer_latency (float): The latency added by the mixer buffer, in seconds.
+    """
+
+    def __init__(self, voices=16, buffer_size=256, frequency=44100, size=-16, channels=2, latency_history=1000):
+        """
+        The constructor for MixerEngine class.
+
+        Parameters:
+            voices (int): The number of voices that can sound at the same time.
+            buffer_size (int): The mixer buffer size in frames; smaller is lower latency but risks underruns.
+            frequency (int): The mixer frame rate.
+            size (int): The mixer sample size, as used by pygame.mixer.init.
+            channels (int): The number of mixer output channels.
+            latency_history (int): The number of recent trigger latencies kept for the statistics.
+        """
+        self.voices = voices
+        self.buffer_size = buffer_size
+        self.mixer_format = (frequency, size, channels)
+        self.buffer_latency = buffer_size / frequency
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._starter = None
+
+        self._triggers = deque()
+        self._wakeup = threading.Event()
+        self._latencies = deque(maxlen=latency_history)
+        self._latency_lock = threading.Lock()
+        # Voices are started by the dispatcher and stopped or moved off channel 0 by callers
+        self._voices_lock = threading.Lock()
+        self._voices_by_key = {}
+        self._running = True
+        self._dispatcher = threading.Thread(target=self._dispatch, name='mixer-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def start(self):
+        """
+        Import pygame and open the mixer, unless already done; safe to call from any thread.
+
+        A mixer opened elsewhere in another format is reopened in the format of the engine.
+        """
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            import pygame
+            if pygame.mixer.get_init() not in (None, self.mixer_format):
+                pygame.mixer.quit()
+            if not pygame.mixer.get_init():
+                frequency, size, channels = self.mixer_format
+                # Without allowed changes SDL converts to the device format, so ours holds
+                pygame.mixer.init(frequency=frequency, size=size, channels=channels, buffer=self.buffer_size,
+                                  allowedchanges=0)
+            pygame.mixer.set_num_channels(self.voices)
+            self._started = True
+
+    def start_async(self):
+        """Open the mixer on a background thread."""
+        self._starter = threading.Thread(target=self.start, name='mixer-start', daemon=True)
+        self._starter.start()
+
+    def trigger(self, sound, voice_key, mode=CHOKE):
+        """
+        Queue a sound to start as soon as possible; returns immediately.
+
+        Parameters:
+            sound (pygame.mixer.Sound): The sound to play.
+            voice_key (hashable): Identifies the voice, e.g. the slice index.
+            mode (str): CHOKE to cut off the sound still playing for voice_key, RETRIGGER to layer over it.
+        """
+        self._triggers.append((time.perf_counter(), tracer.now(), sound, voice_key, mode))
+        self._wakeup.set()
+
+    def stop_all(self):
+        """Stop every voice."""
+        self._triggers.clear()
+        with self._voices_lock:
+            if self._started:
+                import pygame
+                pygame.mixer.stop()
+            self._voices_by_key.clear()
+
+    def reserve_channel(self):
+        """
+        Take channel 0 away from the voices, for a caller queueing its own sounds on it.
+
+        Returns:
+            pygame.mixer.Channel: The reserved channel, stopped.
+        """
+        self.start()
+        import pygame
+        with self._voices_lock:
+            pygame.mixer.set_reserved(1)
+            channel = pygame.mixer.Channel(0)
+            channel.stop()
+            # Channels cannot be told apart, but a key remembering channel 0 now sees it idle, and
+            # idle voices are never choked, so forgetting them all keeps keys off the reserved channel
+            for voice_key, voice_channel in list(self._voices_by_key.items()):
+                if not voice_channel.get_busy():
+                    del self._voices_by_key[voice_key]
+        return channel
+
+    def release_channel(self):
+        """Stop the reserved channel and hand it back to the voices."""
+        if self._started:
+            import pygame
+            pygame.mixer.Channel(0).stop()
+            pygame.mixer.set_reserved(0)
+
+    def shutdown(self):
+        """Stop the dispatcher thread, after waiting for a mixer still being opened."""
+        if self._starter is not None:
+            self._starter.join()
+        self._running = False
+        self._wakeup.set()
+        self._dispatcher.join()
+
+    def latency_stats(self):
+        """
+        Return statistics of the recent trigger-to-audio latencies.
+
+        The latency of a trigger is the time until the dispatcher handed the sound to the mixer
+        plus the mixer buffer latency.
+
+        Returns:
+            dict: The count, p50, p95, p99 and max latencies in milliseconds, and the buffer latency.
+        """
+        # Copying the deque iterates it, which fails if the dispatcher appends meanwhile
+        with self._latency_lock:
+            latencies = np.array(self._latencies, dtype=np.float64) * 1000.0
+        stats = {'count': len(latencies), 'buffer_ms': self.buffer_latency * 1000.0}
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats.update({'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': latencies.max()})
+        return stats
+
+    def _dispatch(self):
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while self._triggers:
+                triggered_at, traced_at, sound, voice_key, mode = self._triggers.popleft()
+                tracer.record('dispatch_wait', traced_at, tracer.now())
+                with tracer.span('start_voice'):
+                    self._start_voice(sound, voice_key, mode)
+                latency = time.perf_counter() - triggered_at + self.buffer_latency
+                with self._latency_lock:
+                    self._latencies.append(latency)
+
+    def _start_voice(self, sound, voice_key, mode):
+        with self._voices_lock:
+            channel = None
+            if mode == CHOKE:
+                previous = self._voices_by_key.get(voice_key)
+                # Reuse the voice of the previous trigger so it is cut off in the same step
+                if previous is not None and previous.get_busy():
+                    channel = previous
+            if channel is None:
+                # Steal the longest running voice when all are busy
+                # Sounds only exist once the mixer is open, so this import is a lookup of the loaded module
+                import pygame
+                channel = pygame.mixer.find_channel(True)
+            channel.play(sound)
+            self._voices_by_key[voice_key] = channel
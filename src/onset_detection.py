@@ -0,0 +1,214 @@
+import numpy as np
+
+import pcm
+
+EQUAL = 'equal'
+ONSET = 'onset'
+BEAT = 'beat'
+SLICING_MODES = (EQUAL, ONSET, BEAT)
+
+
+def onset_envelope(frames, frame_rate, n_fft=1024, hop=512, block_windows=2048):
+    """
+    Compute the spectral flux onset strength of audio, one value per hop.
+
+    The audio is mixed down to mono and analyzed in blocks of windows, so memory use is bounded
+    for long tracks and memory-mapped or streamed frames are only read once.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+        frame_rate (int): The number of frames per second.
+        n_fft (int): The analysis window length in frames.
+        hop (int): The distance between analysis windows in frames.
+        block_windows (int): The number of windows analyzed at a time.
+
+    Returns:
+        numpy.ndarray: The onset strength of the window centered on every multiple of hop.
+    """
+    total = len(frames)
+    n_windows = total // hop + 1
+    window = np.hanning(n_fft).astype(np.float32)
+    envelope = np.zeros(n_windows, dtype=np.float32)
+    previous = None
+
+    for first in range(0, n_windows, block_windows):
+        count = min(block_windows, n_windows - first)
+        # Windows are centered on first * hop; read the block with half a window of context on each side
+        start = first * hop - n_fft // 2
+        end = start + (count - 1) * hop + n_fft
+        block = pcm.to_float(np.asarray(frames[max(start, 0):min(end, total)])).mean(axis=1)
+        block = np.pad(block, (max(-start, 0), max(end - total, 0)))
+
+        windows = np.lib.stride_tricks.sliding_window_view(block, n_fft)[::hop][:count]
+        magnitude = np.log1p(100.0 * np.abs(np.fft.rfft(windows * window, axis=-1)))
+        if previous is None:
+            previous = magnitude[:1]
+        flux = np.maximum(np.diff(np.concatenate([previous, magnitude]), axis=0), 0.0).sum(axis=1)
+        envelope[first:first + count] = flux
+        previous = magnitude[-1:]
+    return envelope
+
+
+def pick_onsets(envelope, frame_rate, hop=512, min_gap=0.05, threshold=0.1):
+    """
+    Find the onsets in an onset envelope.
+
+    Parameters:
+        envelope (numpy.ndarray): The onset strength per hop.
+        frame_rate (int): The number of frames per second.
+        hop (int): The distance between envelope values in frames.
+        min_gap (float): The minimum distance between onsets in seconds.
+        threshold (float): How far, relative to the envelope peak, an onset must rise above the local mean.
+
+    Returns:
+        tuple: The onset positions in frames and their strengths, both sorted by position.
+    """
+    if len(envelope) == 0 or envelope.max() <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    gap = max(int(min_gap * frame_rate / hop), 1)
+    padded = np.pad(envelope, gap, constant_values=-np.inf)
+    neighbourhood = np.lib.stride_tricks.sliding_window_view(padded, 2 * gap + 1)
+    is_peak = envelope >= neighbourhood.max(axis=1)
+
+    kernel = np.ones(4 * gap + 1, dtype=np.float32) / (4 * gap + 1)
+    local_mean = np.convolve(envelope, kernel, mode='same')
+    is_onset = is_peak & (envelope > local_mean + threshold * envelope.max())
+
+    positions = np.flatnonzero(is_onset)
+    return positions * hop, envelope[positions]
+
+
+def estimate_tempo(envelope, frame_rate, hop=512, min_bpm=60.0, max_bpm=180.0, prior_bpm=120.0):
+    """
+    Estimate the tempo from the autocorrelation of an onset envelope.
+
+    The autocorrelation is weighted by a log-normal prior around prior_bpm, which resolves
+    the ambiguity between a tempo and its half or double.
+
+    Parameters:
+        envelope (numpy.ndarray): The onset strength per hop.
+        frame_rate (int): The number of frames per second.
+        hop (int): The distance between envelope values in frames.
+        min_bpm (float): The slowest tempo considered.
+        max_bpm (float): The fastest tempo considered.
+        prior_bpm (float): The most likely tempo.
+
+    Returns:
+        float: The beat period in envelope steps, or 0.0 if no tempo was found.
+    """
+    centered = envelope - envelope.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(centered) + 1)))
+    spectrum = np.fft.rfft(centered, size)
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(centered)]
+
+    steps_per_second = frame_rate / hop
+    shortest = max(int(steps_per_second * 60.0 / max_bpm), 1)
+    longest = min(int(steps_per_second * 60.0 / min_bpm) + 1, len(autocorrelation) - 2)
+    if longest <= shortest:
+        return 0.0
+    lags = np.arange(shortest, longest + 1)
+    bpm = 60.0 * steps_per_second / lags
+    weighted = autocorrelation[lags] * np.exp(-0.5 * np.log2(bpm / prior_bpm) ** 2)
+    lag = int(lags[np.argmax(weighted)])
+
+    # Refine the peak between integer lags by fitting a parabola
+    before, peak, after = autocorrelation[lag - 1:lag + 2]
+    curvature = before - 2 * peak + after
+    offset = 0.5 * (before - after) / curvature if curvature < 0 else 0.0
+    return float(lag + np.clip(offset, -0.5, 0.5))
+
+
+def track_beats(envelope, period, tightness=100.0):
+    """
+    Track beats through an onset envelope by dynamic programming.
+
+    Every step scores the strongest path of beats ending there, penalizing beat intervals that
+    stray from the period; the best path is then read back from the end.
+
+    Parameters:
+        envelope (numpy.ndarray): The onset strength per hop.
+        period (float): The beat period in envelope steps.
+        tightness (float): How strongly intervals other than the period are penalized.
+
+    Returns:
+        numpy.ndarray: The beat positions in envelope steps.
+    """
+    if period <= 0 or len(envelope) == 0:
+        return np.zeros(0, dtype=np.int64)
+    normalized = envelope / (envelope.std() or 1.0)
+
+    # Candidate predecessors lie between half and twice the period back
+    offsets = np.arange(-int(round(2 * period)), -int(round(period / 2)) + 1)
+    penalty = -tightness * np.log(-offsets / period) ** 2
+
+    score = normalized.astype(np.float64).copy()
+    backlink = np.full(len(envelope), -1, dtype=np.int64)
+    for step in range(-offsets[-1], len(envelope)):
+        candidates = step + offsets
+        valid = candidates >= 0
+        weighted = np.where(valid, score[np.maximum(candidates, 0)] + penalty, -np.inf)
+        best = int(np.argmax(weighted))
+        if weighted[best] > 0:
+            score[step] += weighted[best]
+            backlink[step] = candidates[best]
+
+    # Start from the best scoring step within the last period
+    tail = max(len(envelope) - int(round(period)), 0)
+    beat = tail + int(np.argmax(score[tail:]))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    return np.array(beats[::-1], dtype=np.int64)
+
+
+def detect_boundaries(frames, frame_rate, num_slices, mode=ONSET, hop=512):
+    """
+    Find slice start positions snapped to transients or beats.
+
+    ONSET keeps the strongest onsets; BEAT picks the beat nearest to each equal division. Missing
+    boundaries (e.g. in silent audio) fall back to equal divisions.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+        frame_rate (int): The number of frames per second.
+        num_slices (int): The number of slices.
+        mode (str): ONSET or BEAT.
+        hop (int): The analysis hop in frames.
+
+    Returns:
+        list: The sorted start frames of the slices, the first one always 0.
+    """
+    total = len(frames)
+    equal = [i * total // num_slices for i in range(num_slices)]
+    if num_slices <= 1 or total == 0:
+        return equal[:1] if equal else [0]
+
+    envelope = onset_envelope(frames, frame_rate, hop=hop)
+    if mode == ONSET:
+        positions, strengths = pick_onsets(envelope, frame_rate, hop)
+        keep = positions > 0
+        positions, strengths = positions[keep], strengths[keep]
+        chosen = np.sort(positions[np.argsort(strengths)[::-1][:num_slices - 1]])
+    elif mode == BEAT:
+        beats = track_beats(envelope, estimate_tempo(envelope, frame_rate, hop)) * hop
+        beats = beats[(beats > 0) & (beats < total)]
+        chosen = np.unique(beats[np.abs(beats[None, :] - np.array(equal[1:])[:, None]).argmin(axis=1)]) if len(beats) else beats
+    else:
+        raise ValueError("Unknown slicing mode: {}".format(mode))
+
+    boundaries = sorted(set([0] + [int(position) for position in chosen]))
+    # Fill up with equal divisions that are not too close to a detected boundary
+    for position in equal[1:]:
+        if len(boundaries) >= num_slices:
+            break
+        if min(abs(position - boundary) for boundary in boundaries) > hop:
+            boundaries.append(position)
+            boundaries.sort()
+    for position in equal[1:]:
+        if len(boundaries) >= num_slices:
+            break
+        if position not in boundaries:
+            boundaries.append(position)
+            boundaries.sort()
+    return boundaries[:num_slices]
@@ -0,0 +1,63 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import sequencer
+from mixer_engine import CHOKE
+from slice_export import ExportCancelled
+
+
+class PatternBouncer(QThread):
+    """
+    A worker thread that bounces a pattern to a WAV file off the GUI thread.
+
+    Signals:
+        progress (int, str): Percentage done and a description of the current stage.
+        bounced (str): The path written, emitted once the bounce has finished.
+        failed (str): The error message, emitted when bouncing fails.
+        cancelled (): Emitted when the bounce was cancelled and its file removed.
+    """
+
+    progress = pyqtSignal(int, str)
+    bounced = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, audio_sample, pattern, bpm, file_path, slice_cache=None, voice_mode=CHOKE, parent=None):
+        """
+        The constructor for PatternBouncer class.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample the slices belong to.
+            pattern (Pattern): The pattern to bounce.
+            bpm (float): The tempo in beats per minute.
+            file_path (str): The path of the WAV file.
+            slice_cache (SliceCache): The cache to render through, e.g. PlayControl.slice_cache.
+            voice_mode (str): One of mixer_engine.VOICE_MODES.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.audio_sample = audio_sample
+        self.pattern = pattern
+        self.bpm = bpm
+        self.file_path = file_path
+        self.slice_cache = slice_cache
+        self.voice_mode = voice_mode
+
+    def cancel(self):
+        """Request the bouncer to stop at the next block."""
+        self.requestInterruption()
+
+    def run(self):
+        """Bounce the pattern, reporting progress through signals."""
+        try:
+            self.progress.emit(0, "Bouncing")
+            sequencer.bounce(self.audio_sample, self.pattern, self.bpm, self.file_path,
+                             voice_mode=self.voice_mode, slice_cache=self.slice_cache,
+                             progress=lambda fraction: self.progress.emit(int(fraction * 100), "Bouncing"),
+                             is_cancelled=self.isInterruptionRequested)
+        except ExportCancelled:
+            self.cancelled.emit()
+            return
+        except (OSError, ValueError, IndexError) as e:
+            self.failed.emit(str(e))
+            return
+        self.bounced.emit(self.file_path)
@@ -0,0 +1,156 @@
+import wave
+
+import numpy as np
+
+# pygame mixer sample sizes (as returned by pygame.mixer.get_init) and their NumPy types
+MIXER_DTYPES = {8: np.uint8, -8: np.int8, 16: np.uint16, -16: np.int16, 32: np.float32}
+
+
+def to_array(raw_data, sample_width, channels):
+    """
+    Convert interleaved PCM bytes into a (frames, channels) NumPy array without copying 16-bit data.
+
+    Parameters:
+        raw_data (bytes): The interleaved PCM data.
+        sample_width (int): The sample width in bytes.
+        channels (int): The number of channels.
+
+    Returns:
+        numpy.ndarray: An int16 array for 8/16-bit audio, a float32 array in [-1, 1] otherwise.
+    """
+    if sample_width == 2:
+        samples = np.frombuffer(raw_data, dtype=np.int16)
+    elif sample_width == 1:
+        # 8-bit PCM is unsigned, widen it to signed 16-bit
+        samples = (np.frombuffer(raw_data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 3:
+        packed = np.frombuffer(raw_data, dtype=np.uint8).reshape(-1, 3)
+        widened = (packed[:, 0].astype(np.int32) << 8) | (packed[:, 1].astype(np.int32) << 16) | (packed[:, 2].astype(np.int32) << 24)
+        samples = (widened / 2147483648.0).astype(np.float32)
+    elif sample_width == 4:
+        samples = (np.frombuffer(raw_data, dtype=np.int32) / 2147483648.0).astype(np.float32)
+    else:
+        raise ValueError("Unsupported sample width: {} bytes.".format(sample_width))
+    return samples.reshape(-1, channels)
+
+
+def to_float(frames):
+    """
+    Return the frames as float32 in the range [-1, 1].
+
+    Parameters:
+        frames (numpy.ndarray): Integer or float frames.
+
+    Returns:
+        numpy.ndarray: The float32 frames.
+    """
+    if frames.dtype == np.float32:
+        return frames
+    if frames.dtype == np.int16:
+        return frames.astype(np.float32) / 32768.0
+    return frames.astype(np.float32)
+
+
+def resample(frames, ratio):
+    """
+    Resample frames by linear interpolation.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        ratio (float): Output length divided by input length.
+
+    Returns:
+        numpy.ndarray: The resampled float32 frames.
+    """
+    frames = to_float(frames)
+    if ratio == 1.0 or len(frames) == 0:
+        return frames
+    out_length = max(int(len(frames) * ratio), 1)
+    positions = np.arange(out_length, dtype=np.float64) / ratio
+    source_positions = np.arange(len(frames), dtype=np.float64)
+    resampled = np.empty((out_length, frames.shape[1]), dtype=np.float32)
+    for channel in range(frames.shape[1]):
+        resampled[:, channel] = np.interp(positions, source_positions, frames[:, channel])
+    return resampled
+
+
+def match_channels(frames, channels):
+    """
+    Mix down or duplicate channels to the requested channel count.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        channels (int): The requested number of channels.
+
+    Returns:
+        numpy.ndarray: The frames with the requested number of channels, in the input's sample type and scale.
+    """
+    if frames.shape[1] == channels:
+        return frames
+    if frames.shape[1] == 1:
+        return np.repeat(frames, channels, axis=1)
+    mono = frames.mean(axis=1, keepdims=True, dtype=np.float32)
+    if frames.dtype.kind in 'iu':
+        mono = np.rint(mono).astype(frames.dtype)
+    return np.repeat(mono, channels, axis=1)
+
+
+def from_float(frames, size):
+    """
+    Convert float frames in [-1, 1] to the mixer sample type.
+
+    Parameters:
+        frames (numpy.ndarray): The float32 frames.
+        size (int): The mixer sample size, as returned by pygame.mixer.get_init.
+
+    Returns:
+        numpy.ndarray: A C-contiguous array in the mixer sample type.
+    """
+    dtype = np.dtype(MIXER_DTYPES[size])
+    if dtype.kind == 'f':
+        return np.ascontiguousarray(frames, dtype=dtype)
+    info = np.iinfo(dtype)
+    scale = (int(info.max) - int(info.min) + 1) / 2.0
+    offset = 0.0 if info.min < 0 else scale
+    converted = np.clip(frames * scale + offset, info.min, info.max)
+    return np.ascontiguousarray(converted, dtype=dtype)
+
+
+def apply_fades(frames, fade_in, fade_out):
+    """
+    Apply linear fades to the edges of frames.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        fade_in (int): The fade-in length in frames.
+        fade_out (int): The fade-out length in frames.
+
+    Returns:
+        numpy.ndarray: The faded float32 frames; the input itself if no fade is needed.
+    """
+    if not fade_in and not fade_out:
+        return frames
+    faded = np.array(to_float(frames), dtype=np.float32)
+    if fade_in:
+        faded[:fade_in] *= np.linspace(0.0, 1.0, fade_in, endpoint=False, dtype=np.float32)[:, None]
+    if fade_out:
+        faded[len(faded) - fade_out:] *= np.linspace(1.0, 0.0, fade_out, endpoint=False, dtype=np.float32)[:, None]
+    return faded
+
+
+def write_wav(file_path, frames, frame_rate):
+    """
+    Write frames to a 16-bit PCM WAV file.
+
+    Parameters:
+        file_path (str): The path of the WAV file.
+        frames (numpy.ndarray): The (frames, channels) int16 or float32 samples.
+        frame_rate (int): The number of frames per second.
+    """
+    if frames.dtype != np.int16:
+        frames = from_float(to_float(frames), -16)
+    with wave.open(file_path, 'wb') as f:
+        f.setnchannels(frames.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(frame_rate)
+        f.writeframes(np.ascontiguousarray(frames).tobytes())
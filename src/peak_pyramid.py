@@ -0,0 +1,210 @@
+import os
+import struct
+
+import numpy as np
+
+import pcm
+
+# Header: magic, version, frames per bucket of the finest level, reduction factor, level count, frame count
+HEADER = struct.Struct('<4sHIHHQ')
+HEADER_SIZE = 32
+MAGIC = b'TCPK'
+VERSION = 1
+
+
+class PeakPyramid:
+    """
+    Min/max peaks of audio at several resolutions, for drawing waveforms at any zoom.
+
+    The finest level holds the minimum and maximum sample of every base_block frames; every
+    coarser level merges factor buckets of the level below. Drawing a window of audio then
+    only reads about factor buckets per pixel, however long the file is.
+
+    Attributes:
+        frame_count (int): The length of the audio in frames.
+        base_block (int): The number of frames per bucket of the finest level.
+        factor (int): How many buckets of a level are merged into one bucket of the next.
+        levels (list): The (buckets, 2) float32 min/max arrays, finest first.
+    """
+
+    def __init__(self, frame_count, base_block, factor, levels):
+        """
+        The constructor for PeakPyramid class.
+
+        Parameters:
+            frame_count (int): The length of the audio in frames.
+            base_block (int): The number of frames per bucket of the finest level.
+            factor (int): How many buckets of a level are merged into one bucket of the next.
+            levels (list): The (buckets, 2) float32 min/max arrays, finest first.
+        """
+        self.frame_count = frame_count
+        self.base_block = base_block
+        self.factor = factor
+        self.levels = levels
+
+    @classmethod
+    def build(cls, frames, base_block=256, factor=4, block_frames=1 << 20, is_cancelled=None):
+        """
+        Build the pyramid in a single pass over the audio.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+            base_block (int): The number of frames per bucket of the finest level.
+            factor (int): How many buckets of a level are merged into one bucket of the next.
+            block_frames (int): The number of frames read at a time.
+            is_cancelled (callable): Optional function returning True to stop building early.
+
+        Returns:
+            PeakPyramid: The pyramid, or None if building was cancelled.
+        """
+        frame_count = len(frames)
+        block_frames = max(block_frames // base_block, 1) * base_block
+        parts = []
+        for start in range(0, frame_count, block_frames):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            block = pcm.to_float(np.asarray(frames[start:start + block_frames]))
+            lows, highs = block.min(axis=1), block.max(axis=1)
+            padding = -len(block) % base_block
+            if padding:
+                lows = np.concatenate([lows, np.full(padding, lows[-1], dtype=np.float32)])
+                highs = np.concatenate([highs, np.full(padding, highs[-1], dtype=np.float32)])
+            parts.append(np.stack([lows.reshape(-1, base_block).min(axis=1),
+                                   highs.reshape(-1, base_block).max(axis=1)], axis=1))
+
+        levels = [np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.float32)]
+        while len(levels[-1]) > 1:
+            levels.append(cls.merge(levels[-1], factor))
+        return cls(frame_count, base_block, factor, levels)
+
+    @staticmethod
+    def merge(level, factor):
+        """
+        Merge every factor buckets of a level into one.
+
+        Parameters:
+            level (numpy.ndarray): The (buckets, 2) min/max array.
+            factor (int): The number of buckets merged.
+
+        Returns:
+            numpy.ndarray: The coarser (buckets, 2) min/max array.
+        """
+        starts = np.arange(0, len(level), factor)
+        return np.stack([np.minimum.reduceat(level[:, 0], starts),
+                         np.maximum.reduceat(level[:, 1], starts)], axis=1)
+
+    def bucket_frames(self, level_index):
+        """
+        Return the number of frames per bucket of a level.
+
+        Parameters:
+            level_index (int): The index of the level, 0 being the finest.
+
+        Returns:
+            int: The number of frames per bucket.
+        """
+        return self.base_block * self.factor ** level_index
+
+    def peaks(self, start_frame, end_frame, width, frames=None):
+        """
+        Return the min/max peaks of a window of audio, one pair per pixel column.
+
+        The coarsest level that still has at least one bucket per column is used. When zoomed in
+        further than the finest level and the audio is given, the peaks are taken from the audio.
+
+        Parameters:
+            start_frame (int): The first frame of the window.
+            end_frame (int): The frame after the last frame of the window.
+            width (int): The number of columns.
+            frames (numpy.ndarray): Optional (frames, channels) audio for the closest zoom levels.
+
+        Returns:
+            numpy.ndarray: The (columns, 2) float32 min/max of every column; columns past the end of the audio are 0.
+        """
+        width = max(int(width), 1)
+        frames_per_column = (end_frame - start_frame) / width
+        edges = start_frame + (end_frame - start_frame) * np.arange(width + 1, dtype=np.float64) / width
+        visible = (edges[:-1] < self.frame_count) & (edges[:-1] >= 0)
+        result = np.zeros((width, 2), dtype=np.float32)
+        if not visible.any() or end_frame <= start_frame:
+            return result
+
+        if frames_per_column < self.base_block and frames is not None:
+            first = max(int(start_frame), 0)
+            last = min(int(np.ceil(end_frame)), self.frame_count)
+            block = pcm.to_float(np.asarray(frames[first:last]))
+            source = np.stack([block.min(axis=1), block.max(axis=1)], axis=1)
+            offset, bucket = first, 1
+        else:
+            level_index = 0
+            while (level_index + 1 < len(self.levels)
+                   and self.bucket_frames(level_index + 1) <= frames_per_column):
+                level_index += 1
+            source, offset, bucket = self.levels[level_index], 0, self.bucket_frames(level_index)
+        if len(source) == 0:
+            return result
+
+        indices = np.clip(((edges[:-1] - offset) // bucket).astype(np.int64), 0, len(source) - 1)
+        # reduceat needs increasing indices; a column narrower than a bucket repeats the previous one
+        indices = np.maximum.accumulate(indices)
+        result[:, 0] = np.minimum.reduceat(source[:, 0], indices)
+        result[:, 1] = np.maximum.reduceat(source[:, 1], indices)
+        # reduceat reads up to the next index, so the last column would run to the end of the source
+        last_end = min(int(np.ceil((edges[-1] - offset) / bucket)), len(source))
+        if last_end > indices[-1]:
+            result[-1] = source[indices[-1]:last_end, 0].min(), source[indices[-1]:last_end, 1].max()
+        else:
+            result[-1] = source[indices[-1]]
+        result[~visible] = 0.0
+        return result
+
+    def save(self, file_path):
+        """
+        Write the pyramid to a file.
+
+        Parameters:
+            file_path (str): The path of the file.
+        """
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        header = HEADER.pack(MAGIC, VERSION, self.base_block, self.factor, len(self.levels), self.frame_count)
+        partial_path = file_path + '.part'
+        with open(partial_path, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            for level in self.levels:
+                f.write(np.ascontiguousarray(level, dtype=np.float32).data)
+        os.replace(partial_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Map a pyramid written by save.
+
+        Parameters:
+            file_path (str): The path of the file.
+
+        Returns:
+            PeakPyramid: The pyramid with memory-mapped levels, or None if there is no valid file.
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                header = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < HEADER.size:
+            return None
+        magic, version, base_block, factor, level_count, frame_count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        os.utime(file_path)
+        levels = []
+        offset = HEADER_SIZE
+        buckets = -(-frame_count // base_block)
+        for _ in range(level_count):
+            if buckets == 0:
+                levels.append(np.zeros((0, 2), dtype=np.float32))
+            else:
+                levels.append(np.memmap(file_path, dtype=np.float32, mode='r', offset=offset, shape=(buckets, 2)))
+            offset += buckets * 2 * 4
+            buckets = -(-buckets // factor)
+        return cls(frame_count, base_block, factor, levels)
@@ -0,0 +1,192 @@
+import numpy as np
+
+import pcm
+
+MIN_SEMITONES = -24
+MAX_SEMITONES = 24
+
+# Speed factors for every semitone AudioSample.adjust_slice allows, e.g. 2.0 for +12
+SEMITONE_RATIOS = {semitones: 2 ** (semitones / 12.0) for semitones in range(MIN_SEMITONES, MAX_SEMITONES + 1)}
+
+RESAMPLE = 'resample'
+PRESERVE_DURATION = 'preserve'
+MODES = (RESAMPLE, PRESERVE_DURATION)
+
+
+def semitone_ratio(semitones):
+    """
+    Return the speed factor of a pitch shift.
+
+    Parameters:
+        semitones (int): The pitch shift in semitones.
+
+    Returns:
+        float: The speed factor, e.g. 2.0 for one octave up.
+    """
+    ratio = SEMITONE_RATIOS.get(semitones)
+    return ratio if ratio is not None else 2 ** (semitones / 12.0)
+
+
+def resample_shift(frames, semitones, rate_ratio=1.0):
+    """
+    Shift the pitch by playing the frames faster or slower, which also changes their duration.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        semitones (int): The pitch shift in semitones.
+        rate_ratio (float): Output frame rate divided by input frame rate, applied in the same pass.
+
+    Returns:
+        numpy.ndarray: The pitch-shifted float32 frames.
+    """
+    return pcm.resample(frames, rate_ratio / semitone_ratio(semitones))
+
+
+def stretch_shift(frames, semitones, rate_ratio=1.0, n_fft=2048):
+    """
+    Shift the pitch while keeping the duration, using a phase vocoder.
+
+    The frames are time-stretched by the speed factor of the shift and then resampled back to
+    their original duration.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        semitones (int): The pitch shift in semitones.
+        rate_ratio (float): Output frame rate divided by input frame rate, applied in the same pass.
+        n_fft (int): The analysis window length in frames.
+
+    Returns:
+        numpy.ndarray: The pitch-shifted float32 frames.
+    """
+    frames = pcm.to_float(frames)
+    if semitones == 0 or len(frames) == 0:
+        return pcm.resample(frames, rate_ratio)
+
+    speed = semitone_ratio(semitones)
+    stretched = time_stretch(frames, speed, n_fft)
+    target_length = max(int(len(frames) * rate_ratio), 1)
+    shifted = pcm.resample(stretched, target_length / len(stretched))
+    return fit_length(shifted, target_length)
+
+
+def time_stretch(frames, factor, n_fft=2048):
+    """
+    Change the duration of float frames by a factor without changing their pitch.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) float32 input.
+        factor (float): Output duration divided by input duration.
+        n_fft (int): The analysis window length in frames, a multiple of 4.
+
+    Returns:
+        numpy.ndarray: The stretched (frames, channels) float32 output.
+    """
+    hop = n_fft // 4
+    length = len(frames)
+    target_length = max(int(round(length * factor)), 1)
+    window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+
+    # Pad so every input frame is covered by four analysis windows
+    padded = np.pad(frames, ((n_fft, n_fft + hop), (0, 0)))
+    n_windows = 1 + (len(padded) - n_fft) // hop
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=0)[::hop][:n_windows]
+    spectrum = np.fft.rfft(windows * window, axis=-1)  # (windows, channels, bins)
+
+    # Read the analysis frames at fractional steps and accumulate phase along the new time axis
+    steps = np.arange(0, n_windows - 1, 1.0 / factor)
+    base = steps.astype(np.int64)
+    alpha = (steps - base).astype(np.float32)[:, None, None]
+    current, following = spectrum[base], spectrum[base + 1]
+    magnitude = (1.0 - alpha) * np.abs(current) + alpha * np.abs(following)
+
+    expected_advance = 2 * np.pi * hop * np.arange(spectrum.shape[-1]) / n_fft
+    advance = np.angle(following) - np.angle(current) - expected_advance
+    advance = advance - 2 * np.pi * np.round(advance / (2 * np.pi)) + expected_advance
+    phase = np.angle(spectrum[0]) + np.concatenate([np.zeros_like(advance[:1]), np.cumsum(advance[:-1], axis=0)])
+    phase = lock_phase(phase, magnitude, np.angle(current))
+
+    synthesized = np.fft.irfft(magnitude * np.exp(1j * phase), n=n_fft, axis=-1).astype(np.float32) * window
+    synthesized = synthesized.transpose(0, 2, 1)  # (windows, n_fft, channels)
+
+    # Overlap-add: each window spans four hops
+    n_out = len(steps)
+    output = np.zeros((n_out + 3, hop, frames.shape[1]), dtype=np.float32)
+    blocks = synthesized.reshape(n_out, 4, hop, frames.shape[1])
+    for k in range(4):
+        output[k:k + n_out] += blocks[:, k]
+    output = output.reshape(-1, frames.shape[1])
+
+    # A squared Hann window at a quarter-window hop sums to 1.5
+    output /= 1.5
+    start = int(round(n_fft * factor))
+    return fit_length(output[start:], target_length)
+
+
+def lock_phase(phase, magnitude, analysis_phase):
+    """
+    Lock the phase of every bin to the nearest spectral peak (identity phase locking).
+
+    Bins around a peak keep their analysis phase relative to the peak, which keeps the partials
+    of a sinusoid coherent and avoids the phasiness of a plain phase vocoder.
+
+    Parameters:
+        phase (numpy.ndarray): The accumulated (windows, channels, bins) synthesis phase.
+        magnitude (numpy.ndarray): The (windows, channels, bins) synthesis magnitude.
+        analysis_phase (numpy.ndarray): The (windows, channels, bins) analysis phase.
+
+    Returns:
+        numpy.ndarray: The locked synthesis phase.
+    """
+    bins = magnitude.shape[-1]
+    index = np.arange(bins)
+    padded = np.pad(magnitude, ((0, 0), (0, 0), (1, 1)), constant_values=-1.0)
+    is_peak = (magnitude > padded[..., :-2]) & (magnitude >= padded[..., 2:])
+
+    # Nearest peak at or below and at or above every bin
+    below = np.maximum.accumulate(np.where(is_peak, index, -1), axis=-1)
+    above = np.minimum.accumulate(np.where(is_peak, index, bins)[..., ::-1], axis=-1)[..., ::-1]
+    use_above = (below < 0) | ((above < bins) & (above - index < index - below))
+    peak = np.where(use_above, above, below)
+    peak = np.clip(peak, 0, bins - 1)
+
+    peak_phase = np.take_along_axis(phase, peak, axis=-1)
+    peak_analysis_phase = np.take_along_axis(analysis_phase, peak, axis=-1)
+    return peak_phase + analysis_phase - peak_analysis_phase
+
+
+def fit_length(frames, length):
+    """
+    Trim or pad frames with silence to an exact length.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        length (int): The required number of frames.
+
+    Returns:
+        numpy.ndarray: The frames with the required length.
+    """
+    if len(frames) >= length:
+        return frames[:length]
+    return np.pad(frames, ((0, length - len(frames)), (0, 0)))
+
+
+def shift(frames, semitones, mode=RESAMPLE, rate_ratio=1.0):
+    """
+    Shift the pitch of frames using the given mode.
+
+    Parameters:
+        frames (numpy.ndarray): The (frames, channels) input.
+        semitones (int): The pitch shift in semitones.
+        mode (str): RESAMPLE for the fast, duration-changing shift or PRESERVE_DURATION for the phase vocoder.
+        rate_ratio (float): Output frame rate divided by input frame rate, applied in the same pass.
+
+    Returns:
+        numpy.ndarray: The pitch-shifted float32 frames.
+    """
+    if not MIN_SEMITONES <= semitones <= MAX_SEMITONES:
+        raise ValueError("Pitch Shift must be between {} and {}.".format(MIN_SEMITONES, MAX_SEMITONES))
+    if mode == RESAMPLE:
+        return resample_shift(frames, semitones, rate_ratio)
+    if mode == PRESERVE_DURATION:
+        return stretch_shift(frames, semitones, rate_ratio)
+    raise ValueError("Unknown pitch shift mode: {}".format(mode))
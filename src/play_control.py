@@ -1,59 +1,107 @@
-import pygame
-import threading
+import numpy as np
+
+import pcm
+import pitch_shift
+from mixer_engine import CHOKE, VOICE_MODES, MixerEngine
+from slice_cache import SliceCache
+from tracing import tracer
 
 class PlayControl:
     """
     A class to control the playback of audio slices using pygame mixer.
-    
+
+    The mixer is opened when the first slice is rendered, or earlier with mixer.start_async.
+
     Attributes:
-        current_playback (pygame.mixer.Sound): The current playback sound object.
-        playback_lock (threading.Lock): A lock to ensure thread-safe control of the playback.
+        mixer (MixerEngine): The polyphonic mixer the slices are played on.
+        slice_cache (SliceCache): The cache of slices already rendered as mixer sounds.
+        pitch_mode (str): How slices are pitch shifted, one of pitch_shift.MODES.
+        default_voice_mode (str): Whether replaying a slice chokes or layers over it, one of mixer_engine.VOICE_MODES.
+        voice_modes (dict): Per-slice overrides of the default voice mode.
     """
-    
-    def __init__(self):
-        """The constructor for PlayControl class."""
-        pygame.mixer.init()
-        self.current_playback = None
-        self.playback_lock = threading.Lock()
+
+    def __init__(self, cache_max_bytes=64 * 1024 * 1024, pitch_mode=pitch_shift.RESAMPLE, voices=16, buffer_size=256):
+        """
+        The constructor for PlayControl class.
+
+        Parameters:
+            cache_max_bytes (int): The memory budget for rendered slices in bytes.
+            pitch_mode (str): How slices are pitch shifted, one of pitch_shift.MODES.
+            voices (int): The number of slices that can sound at the same time.
+            buffer_size (int): The mixer buffer size in frames.
+        """
+        self.mixer = MixerEngine(voices=voices, buffer_size=buffer_size)
+        self.pitch_mode = pitch_mode
+        self.default_voice_mode = CHOKE
+        self.voice_modes = {}
+        self.slice_cache = SliceCache(self.render_slice, max_bytes=cache_max_bytes,
+                                      mixer_format=self.mixer.mixer_format)
 
     def play(self, audio_sample, slice_index):
         """
         Play a specific slice from an audio sample.
-        
+
         Parameters:
             audio_sample (AudioSample): The audio sample containing the slice.
             slice_index (int): The index of the slice to play.
         """
-        with self.playback_lock:
-            if self.current_playback:
-                self.current_playback.stop()
+        with tracer.span('cache_get'):
+            sound = self.slice_cache.get(audio_sample, slice_index)
+        self.mixer.trigger(sound, slice_index, self.voice_modes.get(slice_index, self.default_voice_mode))
+
+    def set_voice_mode(self, voice_mode, slice_index=None):
+        """
+        Set whether replaying a slice chokes the sound still playing for it or layers over it.
 
-            slice_info = audio_sample.slices[slice_index]
-            start, end, pitch_shift = slice_info['start'], slice_info['end'], slice_info['pitch_shift']
-            
-            # Extract the slice audio using the timecodes
-            slice_audio = audio_sample.audio_data[start:end]
+        Parameters:
+            voice_mode (str): One of mixer_engine.VOICE_MODES.
+            slice_index (int): The slice to set the mode for, or None to set the default for all slices.
+        """
+        if voice_mode not in VOICE_MODES:
+            raise ValueError("Unknown voice mode: {}".format(voice_mode))
+        if slice_index is None:
+            self.default_voice_mode = voice_mode
+        else:
+            self.voice_modes[slice_index] = voice_mode
 
-            # Apply pitch shift if needed
-            if pitch_shift != 0:
-                slice_audio = self.change_pitch(slice_audio, pitch_shift)
+    def set_pitch_mode(self, pitch_mode):
+        """
+        Change how slices are pitch shifted, dropping slices rendered with the previous mode.
 
-            raw_audio_data = slice_audio.raw_data
-            sound = pygame.mixer.Sound(buffer=raw_audio_data)
-            self.current_playback = sound.play()
+        Parameters:
+            pitch_mode (str): One of pitch_shift.MODES.
+        """
+        if pitch_mode not in pitch_shift.MODES:
+            raise ValueError("Unknown pitch shift mode: {}".format(pitch_mode))
+        if pitch_mode != self.pitch_mode:
+            self.pitch_mode = pitch_mode
+            self.slice_cache.clear()
 
-    def change_pitch(self, audio_segment, pitch_shift):
+    def render_slice(self, audio_sample, start_frame, end_frame, semitones):
         """
-        Change the pitch of a given audio segment.
-        
+        Render a slice of an audio sample as a sound in the mixer format.
+
         Parameters:
-            audio_segment (AudioSegment): The audio segment to change pitch of.
-            pitch_shift (int): The amount to shift the pitch.
-        
+            audio_sample (AudioSample): The audio sample containing the slice.
+            start_frame (int): The first frame of the slice.
+            end_frame (int): The frame after the last frame of the slice.
+            semitones (int): The pitch shift of the slice in semitones.
+
         Returns:
-            AudioSegment: The pitch-shifted audio segment.
+            tuple: The pygame.mixer.Sound and its size in bytes.
         """
-        # Adjust pitch while attempting to preserve quality
-        new_frame_rate = int(audio_segment.frame_rate * (2 ** (pitch_shift / 12.0)))
-        shifted_audio = audio_segment._spawn(audio_segment.raw_data, overrides={'frame_rate': new_frame_rate})
-        return shifted_audio.set_frame_rate(audio_segment.frame_rate)
\ No newline at end of file
+        frequency, size, channels = self.slice_cache.mixer_format
+        frames = audio_sample.render_frames(start_frame, end_frame, semitones, self.pitch_mode, frequency)
+
+        # Slices already in the mixer format are handed over as they are
+        with tracer.span('mixer_format'):
+            frames = pcm.match_channels(frames, channels)
+            if frames.dtype != pcm.MIXER_DTYPES[size]:
+                frames = pcm.from_float(pcm.to_float(frames), size)
+            rendered = np.ascontiguousarray(frames)
+        # Sounds need an open mixer; the first slice rendered opens it if nothing did before
+        self.mixer.start()
+        import pygame
+        with tracer.span('sound_build'):
+            sound = pygame.mixer.Sound(buffer=rendered)
+        return sound, rendered.nbytes
@@ -0,0 +1,474 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+import pcm
+import pitch_shift
+from audio_sample import AudioSample
+from streaming import STREAMING_THRESHOLD_BYTES
+from upload_store import content_hash
+
+# File header: magic, version
+FILE_HEADER = struct.Struct('<4sH10x')
+MAGIC = b'TCPJ'
+VERSION = 1
+# Record header: kind, payload length; payloads are padded to 8 bytes so PCM can be memory-mapped
+RECORD_HEADER = struct.Struct('<4s4xQ')
+# Trailer: magic, offset of the index record
+TRAILER = struct.Struct('<4s4xQ')
+TRAILER_MAGIC = b'TCPE'
+# How much of the file is read at a time while looking for the last trailer
+SEARCH_BLOCK = 64 * 1024
+
+META = b'META'
+SLICES = b'SLCS'
+AUDIO = b'SLPC'
+INDEX = b'INDX'
+
+
+class SaveCancelled(Exception):
+    """Raised when a save of a project is cancelled."""
+
+
+class ProjectFile:
+    """
+    A project file holding a reference to the source audio, the slice table and, optionally,
+    the rendered audio of the slices.
+
+    The file is a sequence of records that is only ever appended to: a save writes the records
+    that changed, then a new index pointing at the current records, then a trailer pointing at
+    the index. Editing one slice therefore appends the slice table and that slice's audio, not
+    the whole project. Records left behind are dropped when the file is compacted.
+
+    Attributes:
+        path (str): The path of the project file.
+        meta (dict): The source hash, file name and format of the source audio.
+        dead_bytes (int): The size of the records no longer referenced by the index.
+    """
+
+    def __init__(self, path):
+        """
+        The constructor for ProjectFile class; reads the index if the file exists.
+
+        Parameters:
+            path (str): The path of the project file.
+
+        Raises:
+            ValueError: If the file exists but is not a project file.
+        """
+        self.path = path
+        self.meta = None
+        self.dead_bytes = 0
+        self._index = None
+        if os.path.exists(path):
+            self._index = self.read_index()
+            self.meta = json.loads(self.read_record(self._index['meta'], META))
+            self.dead_bytes = self._index['dead_bytes']
+
+    def read_index(self):
+        """
+        Find the latest complete index of the file.
+
+        A save interrupted before its trailer was written leaves the previous trailer in place,
+        so the file is searched backwards for the last trailer pointing at a complete index.
+
+        Returns:
+            dict: The index.
+
+        Raises:
+            ValueError: If the file is not a project file or has no complete index.
+        """
+        with open(self.path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (MAGIC, VERSION):
+                raise ValueError("Not a project file: {}".format(self.path))
+            end = f.seek(0, 2)
+            block_end = end
+            while block_end > FILE_HEADER.size:
+                block_start = max(block_end - SEARCH_BLOCK, FILE_HEADER.size)
+                f.seek(block_start)
+                # Overlap blocks so a trailer on a block border is still found
+                block = f.read(min(block_end + TRAILER.size, end) - block_start)
+                position = block.rfind(TRAILER_MAGIC, 0, block_end - block_start)
+                while position >= 0:
+                    if position + TRAILER.size <= len(block):
+                        index = self.index_at(f, TRAILER.unpack_from(block, position)[1], block_start + position)
+                        if index is not None:
+                            index['end'] = block_start + position + TRAILER.size
+                            return index
+                    position = block.rfind(TRAILER_MAGIC, 0, position)
+                block_end = block_start
+        raise ValueError("Project file has no complete index: {}".format(self.path))
+
+    @staticmethod
+    def index_at(f, offset, trailer_offset):
+        """
+        Read the index record a trailer points at.
+
+        Parameters:
+            f (file): The open project file.
+            offset (int): The offset of the index record.
+            trailer_offset (int): The offset of the trailer; the index must end right before it.
+
+        Returns:
+            dict: The index, or None if there is no complete index at the offset.
+        """
+        if offset < FILE_HEADER.size or offset + RECORD_HEADER.size > trailer_offset:
+            return None
+        f.seek(offset)
+        kind, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+        if kind != INDEX or offset + RECORD_HEADER.size + ProjectFile.padded(length) != trailer_offset:
+            return None
+        try:
+            index = json.loads(f.read(length))
+        except ValueError:
+            return None
+        index['index'] = offset
+        return index
+
+    def read_record(self, offset, kind):
+        """
+        Read the payload of a record.
+
+        Parameters:
+            offset (int): The offset of the record.
+            kind (bytes): The expected kind of the record.
+
+        Returns:
+            bytes: The payload.
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            record_kind, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            if record_kind != kind:
+                raise ValueError("No {} record at offset {}.".format(kind.decode(), offset))
+            return f.read(length)
+
+    def slice_table(self):
+        """
+        Read the slice table.
+
+        Returns:
+            tuple: The start frames, end frames and pitch shifts of the slices.
+        """
+        payload = self.read_record(self._index['slices'], SLICES)
+        count = self._index['slice_count']
+        start_frames = np.frombuffer(payload, dtype='<i8', count=count)
+        end_frames = np.frombuffer(payload, dtype='<i8', count=count, offset=8 * count)
+        pitch_shifts = np.frombuffer(payload, dtype=np.int8, count=count, offset=16 * count)
+        return start_frames, end_frames, pitch_shifts
+
+    def rendered(self, start_frame, end_frame, semitones, pitch_mode, frame_rate):
+        """
+        Return the stored audio of a slice, if the project holds a render of exactly this slice.
+
+        Parameters:
+            start_frame (int): The first frame of the slice.
+            end_frame (int): The frame after the last frame of the slice.
+            semitones (int): The pitch shift of the slice.
+            pitch_mode (str): The pitch shift mode.
+            frame_rate (int): The frame rate of the render.
+
+        Returns:
+            numpy.memmap: The (frames, channels) int16 render, mapped from the file, or None.
+        """
+        if self._index is None:
+            return None
+        entry = self._index['audio'].get(self.audio_key(start_frame, end_frame, semitones, pitch_mode, frame_rate))
+        if entry is None:
+            return None
+        offset, frames, channels = entry
+        if frames == 0:
+            return np.zeros((0, channels), dtype=np.int16)
+        return np.memmap(self.path, dtype='<i2', mode='r', offset=offset + RECORD_HEADER.size, shape=(frames, channels))
+
+    @staticmethod
+    def audio_key(start_frame, end_frame, semitones, pitch_mode, frame_rate):
+        """
+        Return the index key of a slice render.
+
+        Parameters:
+            start_frame (int): The first frame of the slice.
+            end_frame (int): The frame after the last frame of the slice.
+            semitones (int): The pitch shift of the slice.
+            pitch_mode (str): The pitch shift mode.
+            frame_rate (int): The frame rate of the render.
+
+        Returns:
+            str: The key.
+        """
+        return '{}:{}:{}:{}:{}'.format(int(start_frame), int(end_frame), int(semitones), pitch_mode, int(frame_rate))
+
+    def save(self, audio_sample, include_audio=False, pitch_mode=pitch_shift.RESAMPLE, frame_rate=None,
+             progress=None, is_cancelled=None):
+        """
+        Save an audio sample and its slices, appending only what changed since the last save.
+
+        The slice table is copied first, so slices edited while the save runs in the background
+        are saved the next time instead of mixing two versions of the table.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample to save.
+            include_audio (bool): Also store the rendered audio of every slice.
+            pitch_mode (str): The pitch shift mode the slices are rendered with.
+            frame_rate (int): The frame rate the slices are rendered at, the sample's own by default.
+            progress (callable): Optional function called with the fraction of slices saved.
+            is_cancelled (callable): Optional function returning True to stop; the records appended
+                so far are dropped, the previous save is kept and SaveCancelled is raised.
+        """
+        frame_rate = frame_rate or audio_sample.frame_rate
+        slices = audio_sample.slices
+        start_frames = np.array(slices.start_frames, dtype='<i8')
+        end_frames = np.array(slices.end_frames, dtype='<i8')
+        pitch_shifts = np.array(slices.pitch_shifts, dtype=np.int8)
+        source_path = os.path.abspath(audio_sample.file_path)
+        if self.meta is not None and self.meta['source_path'] == source_path:
+            source_hash = self.meta['source_hash']
+        else:
+            source_hash = self.source_hash(audio_sample)
+        meta = {
+            'source_hash': source_hash,
+            'source_path': source_path,
+            'extension': os.path.splitext(audio_sample.file_path)[1].lower(),
+            'frame_rate': audio_sample.frame_rate,
+            'channels': audio_sample.channels,
+            'sample_width': audio_sample.sample_width,
+            'frame_count': audio_sample.frame_count,
+        }
+
+        if self._index is None:
+            with open(self.path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION))
+            old = {'meta': None, 'slices': None, 'index': None, 'audio': {}, 'dead_bytes': 0, 'end': FILE_HEADER.size}
+        else:
+            old = self._index
+
+        try:
+            with open(self.path, 'r+b') as f:
+                index = self.append_records(f, old, meta, start_frames, end_frames, pitch_shifts, audio_sample,
+                                            include_audio, pitch_mode, frame_rate, progress, is_cancelled)
+        except SaveCancelled:
+            if self._index is None:
+                os.remove(self.path)
+            raise
+
+        self._index = index
+        self.meta = meta
+        self.dead_bytes = index['dead_bytes']
+        if self.dead_bytes > max(index['end'] - self.dead_bytes, 1024 * 1024):
+            self.compact(audio_sample, include_audio, pitch_mode, frame_rate)
+
+    def append_records(self, f, old, meta, start_frames, end_frames, pitch_shifts, audio_sample, include_audio,
+                       pitch_mode, frame_rate, progress=None, is_cancelled=None):
+        """
+        Append the records of a save behind the previous trailer, then the new index and trailer.
+
+        Parameters:
+            f (file): The project file opened for reading and writing.
+            old (dict): The index of the previous save.
+            meta (dict): The metadata to save.
+            start_frames (numpy.ndarray): The start frames of the slices.
+            end_frames (numpy.ndarray): The end frames of the slices.
+            pitch_shifts (numpy.ndarray): The pitch shifts of the slices.
+            audio_sample (AudioSample): The audio sample the slices are rendered from.
+            include_audio (bool): Also store the rendered audio of every slice.
+            pitch_mode (str): The pitch shift mode the slices are rendered with.
+            frame_rate (int): The frame rate the slices are rendered at.
+            progress (callable): Optional function called with the fraction of slices saved.
+            is_cancelled (callable): Optional function returning True to stop.
+
+        Returns:
+            dict: The new index.
+        """
+        f.seek(old['end'])
+        index = {'audio': {}, 'dead_bytes': old['dead_bytes'], 'slice_count': len(start_frames)}
+
+        if meta != self.meta:
+            index['meta'] = self.append_record(f, META, json.dumps(meta).encode('utf-8'))
+            index['dead_bytes'] += self.record_size(f, old['meta'])
+        else:
+            index['meta'] = old['meta']
+
+        table = start_frames.tobytes() + end_frames.tobytes() + pitch_shifts.tobytes()
+        index['slices'] = self.append_record(f, SLICES, table)
+        index['dead_bytes'] += self.record_size(f, old['slices'])
+
+        if include_audio:
+            for i, (start_frame, end_frame, semitones) in enumerate(zip(start_frames, end_frames, pitch_shifts)):
+                if is_cancelled is not None and is_cancelled():
+                    # Without a new trailer the previous save is still the one read back
+                    f.truncate(old['end'])
+                    raise SaveCancelled("The save was cancelled.")
+                key = self.audio_key(start_frame, end_frame, semitones, pitch_mode, frame_rate)
+                if key not in index['audio']:
+                    if key in old['audio']:
+                        index['audio'][key] = old['audio'][key]
+                    else:
+                        # Stored unnormalized; normalization is applied on top when the render is read back
+                        rendered = audio_sample.render_frames(int(start_frame), int(end_frame), int(semitones),
+                                                              pitch_mode, frame_rate, normalize=False)
+                        if rendered.dtype != np.int16:
+                            rendered = pcm.from_float(pcm.to_float(rendered), -16)
+                        offset = self.append_record(f, AUDIO, np.ascontiguousarray(rendered, dtype='<i2').tobytes())
+                        index['audio'][key] = [offset, rendered.shape[0], rendered.shape[1]]
+                if progress is not None:
+                    progress((i + 1) / len(start_frames))
+        for key, (offset, _, _) in old['audio'].items():
+            if key not in index['audio']:
+                index['dead_bytes'] += self.record_size(f, offset)
+        if old['index'] is not None:
+            index['dead_bytes'] += self.record_size(f, old['index']) + TRAILER.size
+
+        # Make the records durable before the trailer that makes them visible
+        index_offset = self.append_record(f, INDEX, json.dumps(index).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+        f.write(TRAILER.pack(TRAILER_MAGIC, index_offset))
+        index['index'] = index_offset
+        index['end'] = f.tell()
+        # Drop whatever an interrupted save left behind the previous trailer
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        return index
+
+    def compact(self, audio_sample, include_audio=False, pitch_mode=pitch_shift.RESAMPLE, frame_rate=None):
+        """
+        Rewrite the project without the records left behind by earlier saves.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample to save.
+            include_audio (bool): Also store the rendered audio of every slice.
+            pitch_mode (str): The pitch shift mode the slices are rendered with.
+            frame_rate (int): The frame rate the slices are rendered at, the sample's own by default.
+        """
+        partial_path = self.path + '.part'
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        partial = ProjectFile(partial_path)
+        # Renders already in this file are copied instead of rendered again
+        previous = audio_sample.prerendered
+        audio_sample.prerendered = self
+        try:
+            partial.save(audio_sample, include_audio, pitch_mode, frame_rate)
+        finally:
+            audio_sample.prerendered = previous
+        # Slices already mapped from the old file keep reading it until they are dropped
+        os.replace(partial_path, self.path)
+        self._index = partial._index
+        self.meta = partial.meta
+        self.dead_bytes = 0
+
+    @staticmethod
+    def source_hash(audio_sample):
+        """
+        Return the content hash of the source of an audio sample.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample.
+
+        Returns:
+            str: The hex digest of the source content.
+        """
+        if audio_sample.decode_cache is not None:
+            return audio_sample.decode_cache.source_hash(audio_sample.file_path)
+        return content_hash(audio_sample.file_path)
+
+    @staticmethod
+    def padded(length):
+        """Return a payload length rounded up to a multiple of 8 bytes."""
+        return (length + 7) & ~7
+
+    def append_record(self, f, kind, payload):
+        """
+        Append a record at the current position of an open project file.
+
+        Parameters:
+            f (file): The project file opened for writing.
+            kind (bytes): The kind of the record.
+            payload (bytes): The payload.
+
+        Returns:
+            int: The offset of the record.
+        """
+        offset = f.tell()
+        f.write(RECORD_HEADER.pack(kind, len(payload)))
+        f.write(payload)
+        f.write(b'\0' * (self.padded(len(payload)) - len(payload)))
+        return offset
+
+    def record_size(self, f, offset):
+        """
+        Return the size of a record, header and padding included.
+
+        Parameters:
+            f (file): The open project file.
+            offset (int): The offset of the record, or None.
+
+        Returns:
+            int: The size in bytes, 0 if offset is None.
+        """
+        if offset is None:
+            return 0
+        position = f.tell()
+        f.seek(offset)
+        _, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+        f.seek(position)
+        return RECORD_HEADER.size + self.padded(length)
+
+
+def find_source(meta, upload_folder='upload'):
+    """
+    Find the source audio of a project by its content hash.
+
+    The uploaded copy, named after the hash, is preferred; the original file is only used if
+    its content still matches.
+
+    Parameters:
+        meta (dict): The project metadata.
+        upload_folder (str): The folder holding uploaded files.
+
+    Returns:
+        str: The path to the source audio.
+
+    Raises:
+        FileNotFoundError: If the source audio cannot be found.
+    """
+    uploaded = os.path.join(upload_folder, meta['source_hash'] + meta['extension'])
+    if os.path.exists(uploaded):
+        return uploaded
+    original = meta['source_path']
+    if os.path.exists(original) and content_hash(original) == meta['source_hash']:
+        return original
+    raise FileNotFoundError("The source audio of the project was not found: {}".format(original))
+
+
+def open_project(path, slice_cache=None, decode_cache=None, upload_folder='upload'):
+    """
+    Open a project, showing its slices without rendering any of them up front.
+
+    Like an upload, the source is streamed when it is larger than STREAMING_THRESHOLD_BYTES and
+    mapped from the decode cache otherwise. Slices stored in the project are played from the
+    project file, so their audio is only read when a slice is first played.
+
+    Parameters:
+        path (str): The path of the project file.
+        slice_cache (SliceCache): Optional cache of rendered slices.
+        decode_cache (DecodeCache): Optional on-disk cache of decoded audio.
+        upload_folder (str): The folder holding uploaded files.
+
+    Returns:
+        tuple: The AudioSample with the project's slices and the ProjectFile to save it to.
+    """
+    project = ProjectFile(path)
+    source_path = find_source(project.meta, upload_folder)
+    streaming = os.path.getsize(source_path) > STREAMING_THRESHOLD_BYTES
+    audio_sample = AudioSample(source_path, slice_cache=slice_cache, decode_cache=decode_cache, streaming=streaming)
+    start_frames, end_frames, pitch_shifts = project.slice_table()
+    # Compressed sources may decode to a slightly different length when streamed
+    bounds = np.minimum(np.stack([start_frames, end_frames], axis=1), audio_sample.frame_count)
+    audio_sample.slices.extend(bounds, pitch_shifts)
+    audio_sample.prerendered = project
+    return audio_sample, project
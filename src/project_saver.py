@@ -0,0 +1,60 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import pitch_shift
+from project_file import SaveCancelled
+
+
+class ProjectSaver(QThread):
+    """
+    A worker thread that saves a project off the GUI thread, rendering the slices it stores.
+
+    Signals:
+        progress (int, str): Percentage done and a description of the current stage.
+        saved (object): The ProjectFile, emitted once the save has finished.
+        failed (str): The error message, emitted when saving fails.
+        cancelled (): Emitted when the save was cancelled and the previous save kept.
+    """
+
+    progress = pyqtSignal(int, str)
+    saved = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, project, audio_sample, include_audio=False, pitch_mode=pitch_shift.RESAMPLE,
+                 frame_rate=None, parent=None):
+        """
+        The constructor for ProjectSaver class.
+
+        Parameters:
+            project (ProjectFile): The project file to save to.
+            audio_sample (AudioSample): The audio sample to save.
+            include_audio (bool): Also store the rendered audio of every slice.
+            pitch_mode (str): The pitch shift mode the slices are rendered with.
+            frame_rate (int): The frame rate the slices are rendered at, the sample's own by default.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.project = project
+        self.audio_sample = audio_sample
+        self.include_audio = include_audio
+        self.pitch_mode = pitch_mode
+        self.frame_rate = frame_rate
+
+    def cancel(self):
+        """Request the saver to stop at the next slice."""
+        self.requestInterruption()
+
+    def run(self):
+        """Save the project, reporting progress through signals."""
+        try:
+            self.progress.emit(0, "Saving")
+            self.project.save(self.audio_sample, self.include_audio, self.pitch_mode, self.frame_rate,
+                              progress=lambda fraction: self.progress.emit(int(fraction * 100), "Saving"),
+                              is_cancelled=self.isInterruptionRequested)
+        except SaveCancelled:
+            self.cancelled.emit()
+            return
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.saved.emit(self.project)
@@ -0,0 +1,450 @@
+import threading
+import time
+
+import numpy as np
+
+import pcm
+import pitch_shift
+from mixer_engine import CHOKE, VOICE_MODES
+from slice_cache import SliceCache
+from slice_export import ExportCancelled, WavWriter, write_chunked
+from tracing import tracer
+
+REST = '.'
+CHORD_SEPARATOR = '+'
+
+
+class Pattern:
+    """
+    A loop of steps, each triggering any number of slices.
+
+    Patterns are written as text with one token per step: slice numbers counted from 1, joined
+    with + to trigger several slices at once, or . for a rest, e.g. "1 . 3 . 2+4 . 3 .".
+
+    Attributes:
+        steps (list): The tuple of slice indices of every step, empty for a rest.
+        steps_per_beat (int): The number of steps per beat, 4 for sixteenth notes.
+    """
+
+    def __init__(self, steps, steps_per_beat=4):
+        """
+        The constructor for Pattern class.
+
+        Parameters:
+            steps (list): The slices of every step: a slice index, an iterable of them, or None for a rest.
+            steps_per_beat (int): The number of steps per beat.
+        """
+        if not steps:
+            raise ValueError("A pattern needs at least one step.")
+        self.steps = [() if step is None else (step,) if isinstance(step, int) else tuple(step) for step in steps]
+        self.steps_per_beat = steps_per_beat
+
+    @classmethod
+    def parse(cls, text, steps_per_beat=4):
+        """
+        Read a pattern from its text form.
+
+        Parameters:
+            text (str): The steps separated by spaces, e.g. "1 . 3+5 .".
+            steps_per_beat (int): The number of steps per beat.
+
+        Returns:
+            Pattern: The pattern.
+        """
+        steps = []
+        for token in text.split():
+            if token == REST:
+                steps.append(())
+                continue
+            try:
+                numbers = [int(number) for number in token.split(CHORD_SEPARATOR)]
+            except ValueError:
+                raise ValueError("Steps are slice numbers joined with {} or {} for a rest, not {!r}.".format(
+                    CHORD_SEPARATOR, REST, token))
+            if min(numbers) < 1:
+                raise ValueError("Slice numbers start at 1.")
+            steps.append(tuple(number - 1 for number in numbers))
+        return cls(steps, steps_per_beat)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __str__(self):
+        return ' '.join(CHORD_SEPARATOR.join(str(i + 1) for i in step) if step else REST for step in self.steps)
+
+    def slice_indices(self):
+        """
+        Return the slices the pattern triggers.
+
+        Returns:
+            list: The sorted slice indices.
+        """
+        return sorted({i for step in self.steps for i in step})
+
+    def loop_frames(self, bpm, frame_rate):
+        """
+        Return the length of one loop of the pattern.
+
+        Parameters:
+            bpm (float): The tempo in beats per minute.
+            frame_rate (int): The number of frames per second.
+
+        Returns:
+            float: The length in frames, which need not be whole.
+        """
+        return len(self.steps) * step_frames(bpm, frame_rate, self.steps_per_beat)
+
+
+def step_frames(bpm, frame_rate, steps_per_beat=4):
+    """
+    Return the length of a step.
+
+    Parameters:
+        bpm (float): The tempo in beats per minute.
+        frame_rate (int): The number of frames per second.
+        steps_per_beat (int): The number of steps per beat.
+
+    Returns:
+        float: The length in frames, which need not be whole.
+    """
+    if bpm <= 0:
+        raise ValueError("The tempo must be above 0 BPM.")
+    return frame_rate * 60.0 / (bpm * steps_per_beat)
+
+
+class PatternMixer:
+    """
+    Mixes a pattern into consecutive blocks of audio, placing every step at its exact frame.
+
+    Step k starts at the frame nearest to k step lengths after the start, computed from the
+    step number rather than by adding up step lengths, so no rounding error accumulates however
+    long the pattern plays. Blocks can be of any size; the same pattern mixes to the same
+    audio whether it is mixed in one block or many.
+
+    Attributes:
+        pattern (Pattern): The pattern being played; a new one takes over at the next step.
+        bpm (float): The tempo; a new tempo takes over at the next step.
+        frame_rate (int): The number of frames per second.
+        channels (int): The number of channels.
+        voice_mode (str): CHOKE to cut a slice off when it is triggered again, RETRIGGER to layer it.
+        position (int): The frame the next block starts at.
+        step (int): The number of the next step to trigger.
+    """
+
+    def __init__(self, pattern, bpm, frame_rate, channels, render, voice_mode=CHOKE):
+        """
+        The constructor for PatternMixer class.
+
+        Parameters:
+            pattern (Pattern): The pattern to play.
+            bpm (float): The tempo in beats per minute.
+            frame_rate (int): The number of frames per second.
+            channels (int): The number of channels.
+            render (callable): Returns the (frames, channels) int16 or float32 audio of a slice index
+                at frame_rate.
+            voice_mode (str): One of mixer_engine.VOICE_MODES.
+        """
+        if voice_mode not in VOICE_MODES:
+            raise ValueError("Unknown voice mode: {}".format(voice_mode))
+        self.pattern = pattern
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.render = render
+        self.voice_mode = voice_mode
+        self.position = 0
+        self.step = 0
+        self._voices = []
+        self._anchor_step = 0
+        self._anchor_frame = 0.0
+        self.bpm = bpm
+        self._step_frames = step_frames(bpm, frame_rate, pattern.steps_per_beat)
+
+    def set_tempo(self, bpm):
+        """
+        Change the tempo from the next step on.
+
+        Parameters:
+            bpm (float): The tempo in beats per minute.
+        """
+        frames = step_frames(bpm, self.frame_rate, self.pattern.steps_per_beat)
+        # Steps are counted from the next one at the new tempo
+        self._anchor_frame = self._anchor_frame + (self.step - self._anchor_step) * self._step_frames
+        self._anchor_step = self.step
+        self._step_frames = frames
+        self.bpm = bpm
+
+    def step_frame(self, step):
+        """
+        Return the frame a step starts at.
+
+        Parameters:
+            step (int): The number of the step, counted from the start or the last tempo change.
+
+        Returns:
+            int: The frame offset.
+        """
+        return int(np.floor(self._anchor_frame + (step - self._anchor_step) * self._step_frames + 0.5))
+
+    def mix(self, frame_count):
+        """
+        Mix the next block.
+
+        Parameters:
+            frame_count (int): The length of the block in frames.
+
+        Returns:
+            numpy.ndarray: The (frame_count, channels) float32 block, not clipped.
+        """
+        start, end = self.position, self.position + frame_count
+        while self.step_frame(self.step) < end:
+            frame = self.step_frame(self.step)
+            for slice_index in self.pattern.steps[self.step % len(self.pattern)]:
+                audio = self.render(slice_index)
+                if self.voice_mode == CHOKE:
+                    for voice in self._voices:
+                        if voice[0] == slice_index:
+                            voice[3] = min(voice[3], frame)
+                self._voices.append([slice_index, audio, frame, frame + len(audio)])
+            self.step += 1
+
+        block = np.zeros((frame_count, self.channels), dtype=np.float32)
+        for _, audio, voice_start, voice_end in self._voices:
+            first, last = max(voice_start, start), min(voice_end, end)
+            if last > first:
+                block[first - start:last - start] += pcm.to_float(audio[first - voice_start:last - voice_start])
+        self._voices = [voice for voice in self._voices if voice[3] > end]
+        self.position = end
+        return block
+
+    @property
+    def sounding(self):
+        """bool: Whether any voice continues past the last block."""
+        return bool(self._voices)
+
+
+def slice_renderer(audio_sample, slice_cache=None, pitch_mode=pitch_shift.RESAMPLE, frame_rate=None,
+                   channels=None, max_bytes=64 * 1024 * 1024):
+    """
+    Return a function rendering slices through a cache of rendered slices.
+
+    With the cache of a PlayControl, the pattern shares the slices already rendered for the keys
+    and its mixer sounds are read in place as int16 arrays. Without one, a cache of float32 audio
+    is made for the renderer. Caches are keyed by the slice bounds and pitch shift, so edited
+    slices are rendered again and unchanged ones come from the cache.
+
+    Parameters:
+        audio_sample (AudioSample): The audio sample the slices belong to.
+        slice_cache (SliceCache): The cache to render through, e.g. PlayControl.slice_cache.
+        pitch_mode (str): One of pitch_shift.MODES, without a slice_cache.
+        frame_rate (int): The frame rate to render at without a slice_cache, the sample's own by default.
+        channels (int): The number of channels to render without a slice_cache, the sample's own by default.
+        max_bytes (int): The memory budget of the cache made without a slice_cache, in bytes.
+
+    Returns:
+        callable: A function of a slice index returning its (frames, channels) audio, with the
+            frame rate, size and channels of the cache's mixer_format.
+    """
+    if slice_cache is None:
+        frame_rate = frame_rate or audio_sample.frame_rate
+        channels = channels or audio_sample.channels
+
+        def render_float(audio_sample, start_frame, end_frame, semitones):
+            frames = audio_sample.render_frames(start_frame, end_frame, semitones, pitch_mode, frame_rate)
+            frames = np.ascontiguousarray(pcm.match_channels(pcm.to_float(frames), channels))
+            return frames, frames.nbytes
+
+        slice_cache = SliceCache(render_float, max_bytes=max_bytes, mixer_format=(frame_rate, 32, channels))
+
+    def render(slice_index):
+        rendered = slice_cache.get(audio_sample, slice_index)
+        if isinstance(rendered, np.ndarray):
+            return rendered
+        import pygame
+        return pygame.sndarray.samples(rendered)
+
+    render.mixer_format = slice_cache.mixer_format
+    return render
+
+
+def bounce(audio_sample, pattern, bpm, file_path, loops=1, pitch_mode=pitch_shift.RESAMPLE, voice_mode=CHOKE,
+           tail=False, block_frames=1 << 16, slice_cache=None, progress=None, is_cancelled=None):
+    """
+    Render loops of a pattern to a 16-bit WAV file, as fast as the slices can be mixed.
+
+    Parameters:
+        audio_sample (AudioSample): The audio sample the slices belong to.
+        pattern (Pattern): The pattern to render.
+        bpm (float): The tempo in beats per minute.
+        file_path (str): The path of the WAV file.
+        loops (int): The number of times the pattern is played.
+        pitch_mode (str): One of pitch_shift.MODES, without a slice_cache.
+        voice_mode (str): One of mixer_engine.VOICE_MODES.
+        tail (bool): Whether to let slices still sounding at the end ring out instead of cutting
+            the file at the loop length, which keeps it seamless when looped.
+        block_frames (int): The number of frames mixed and written at a time.
+        slice_cache (SliceCache): Optional cache to render through, e.g. PlayControl.slice_cache;
+            the file is then written at its mixer frame rate and channels instead of the sample's.
+        progress (callable): Optional function called with the fraction of the loops written.
+        is_cancelled (callable): Optional function returning True to stop; the unfinished file is
+            removed and ExportCancelled raised.
+
+    Returns:
+        int: The number of frames written.
+    """
+    if audio_sample.normalize_lufs is not None:
+        audio_sample.build_loudness_index()
+    render = slice_renderer(audio_sample, slice_cache, pitch_mode)
+    frame_rate, _, channels = render.mixer_format
+    mixer = PatternMixer(pattern, bpm, frame_rate, channels, render, voice_mode)
+    total = int(round(loops * pattern.loop_frames(bpm, frame_rate)))
+    writer = WavWriter(file_path, channels, frame_rate)
+    try:
+        while mixer.position < total or (tail and mixer.sounding):
+            if is_cancelled is not None and is_cancelled():
+                raise ExportCancelled("The bounce was cancelled.")
+            frames = block_frames if mixer.position >= total else min(block_frames, total - mixer.position)
+            # Steps after the last loop must not start in the tail
+            if mixer.position + frames > total:
+                mixer.pattern = Pattern([None])
+            write_chunked(writer, np.clip(mixer.mix(frames), -1.0, 1.0))
+            if progress is not None:
+                progress(min(mixer.position / total, 1.0))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.frames_written
+
+
+class Sequencer:
+    """
+    Plays a pattern live, mixed ahead of the audio clock into blocks queued on a mixer channel.
+
+    A scheduler thread keeps the next block queued behind the one playing, so pygame starts it
+    the moment the playing one ends and every step lands on its exact frame, however late
+    the thread wakes up. Tempo and pattern changes are heard from the first block not yet queued.
+
+    Attributes:
+        play_control (PlayControl): The playback whose mixer and pitch mode are used.
+        block_frames (int): The number of frames per queued block; smaller blocks react faster to changes.
+        blocks_played (int): The number of blocks queued since the last start.
+        underruns (int): The number of times the queue ran dry and a block started late.
+        error (Exception): The error that stopped the last pattern, if any.
+        on_error (callable): Called from the scheduler thread with the message of an error
+            stopping the pattern, e.g. a slice of the pattern having been deleted.
+    """
+
+    def __init__(self, play_control, block_frames=4096, on_error=None):
+        """
+        The constructor for Sequencer class.
+
+        Parameters:
+            play_control (PlayControl): The playback whose mixer and pitch mode are used.
+            block_frames (int): The number of frames per queued block.
+            on_error (callable): Optional function called with the message of an error stopping the pattern.
+        """
+        self.play_control = play_control
+        self.block_frames = block_frames
+        self.on_error = on_error
+        self.blocks_played = 0
+        self.underruns = 0
+        self.error = None
+        self._mixer = None
+        self._channel = None
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_playing(self):
+        """bool: Whether a pattern is playing."""
+        return self._running
+
+    def start(self, audio_sample, pattern, bpm):
+        """
+        Start playing a pattern from its first step, stopping any pattern playing.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample the slices belong to.
+            pattern (Pattern): The pattern to play.
+            bpm (float): The tempo in beats per minute.
+        """
+        self.stop()
+        mixer_engine = self.play_control.mixer
+        mixer_engine.start()
+        # The pattern plays the slices rendered for the keys, read from the same cache
+        render = slice_renderer(audio_sample, self.play_control.slice_cache)
+        frequency, size, channels = render.mixer_format
+        self._mixer = PatternMixer(pattern, bpm, frequency, channels, render,
+                                   self.play_control.default_voice_mode)
+        self.blocks_played = 0
+        self.underruns = 0
+        self.error = None
+        self._channel = mixer_engine.reserve_channel()
+        self._running = True
+        self._thread = threading.Thread(target=self._schedule, name='sequencer', daemon=True)
+        self._thread.start()
+
+    def set_tempo(self, bpm):
+        """
+        Change the tempo of the pattern playing.
+
+        Parameters:
+            bpm (float): The tempo in beats per minute.
+        """
+        if self._mixer is not None:
+            with self._lock:
+                self._mixer.set_tempo(bpm)
+
+    def set_pattern(self, pattern):
+        """
+        Switch to another pattern, continuing from the same step number.
+
+        Parameters:
+            pattern (Pattern): The pattern to play.
+        """
+        if self._mixer is not None:
+            with self._lock:
+                self._mixer.pattern = pattern
+
+    def stop(self):
+        """Stop playing, also after an error, and hand the sequencer channel back to the voices."""
+        if self._thread is None:
+            return
+        self._running = False
+        self._thread.join()
+        self._thread = None
+        self.play_control.mixer.release_channel()
+
+    def _schedule(self):
+        try:
+            self._queue_blocks()
+        except Exception as e:
+            self.error = e
+            self._running = False
+            if self.on_error is not None:
+                self.on_error("The pattern stopped: {}".format(e))
+
+    def _queue_blocks(self):
+        import pygame
+        # The sequencer owns channel 0 while it plays; the key-triggered voices use the others
+        channel = self._channel
+        size = self.play_control.mixer.mixer_format[1]
+        # Render every slice of the pattern before the first block is queued
+        for slice_index in self._mixer.pattern.slice_indices():
+            self._mixer.render(slice_index)
+        block_seconds = self.block_frames / self._mixer.frame_rate
+        while self._running:
+            if channel.get_busy() and channel.get_queue() is not None:
+                time.sleep(block_seconds / 4)
+                continue
+            with tracer.span('sequencer_block'), self._lock:
+                block = np.clip(self._mixer.mix(self.block_frames), -1.0, 1.0)
+            sound = pygame.mixer.Sound(buffer=np.ascontiguousarray(pcm.from_float(block, size)))
+            if channel.get_busy():
+                channel.queue(sound)
+            else:
+                if self.blocks_played:
+                    self.underruns += 1
+                channel.play(sound)
+            self.blocks_played += 1
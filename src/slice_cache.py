@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+class SliceCache:
+    """
+    A memory-bounded LRU cache of rendered audio slices.
+
+    Rendered slices are keyed by their source file, start and end frames, pitch shift and the
+    mixer format they were rendered for, so a slice that has not changed is never rendered twice.
+
+    Attributes:
+        render (callable): Function called as render(audio_sample, start_frame, end_frame, pitch_shift)
+            that returns a tuple of (rendered_slice, size_in_bytes).
+        max_bytes (int): The maximum total size of the cached slices in bytes.
+        mixer_format (tuple): The output format the slices are rendered for.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that had to render the slice.
+        render_count (int): Number of slices rendered so far.
+        render_time (float): Total time spent rendering slices, in seconds.
+    """
+
+    def __init__(self, render, max_bytes=64 * 1024 * 1024, mixer_format=None):
+        """
+        The constructor for SliceCache class.
+
+        Parameters:
+            render (callable): The slice render function.
+            max_bytes (int): The memory budget for cached slices in bytes.
+            mixer_format (tuple): The output format the slices are rendered for.
+        """
+        self.render = render
+        self.max_bytes = max_bytes
+        self.mixer_format = mixer_format
+        self.hits = 0
+        self.misses = 0
+        self.render_count = 0
+        self.render_time = 0.0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._executor = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, audio_sample, slice_info):
+        """
+        Build the cache key for a slice.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample containing the slice.
+            slice_info (dict): The slice information.
+
+        Returns:
+            tuple: The (file_path, start_frame, end_frame, pitch_shift, applied_lufs, mixer_format) key.
+        """
+        return (audio_sample.file_path, slice_info['start_frame'], slice_info['end_frame'], slice_info['pitch_shift'],
+                audio_sample.applied_lufs, self.mixer_format)
+
+    def get(self, audio_sample, slice_index):
+        """
+        Return the rendered slice, rendering and caching it on a miss.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample containing the slice.
+            slice_index (int): The index of the slice.
+
+        Returns:
+            object: The rendered slice.
+        """
+        key = self.key_for(audio_sample, audio_sample.slices[slice_index])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        # A slice already being rendered in the background is waited for, not rendered twice
+        if pending is not None:
+            with tracer.span('cache_wait'):
+                return pending.result()
+        return self._render_and_store(audio_sample, key)
+
+    def prefill(self, audio_sample, slice_indices=None):
+        """
+        Render the given slices (all slices by default) ahead of playback.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample containing the slices.
+            slice_indices (iterable): The indices of the slices to render.
+        """
+        if slice_indices is None:
+            slice_indices = range(len(audio_sample.slices))
+        for slice_index in slice_indices:
+            key = self.key_for(audio_sample, audio_sample.slices[slice_index])
+            with self._lock:
+                if key in self._entries:
+                    continue
+            self._render_and_store(audio_sample, key)
+
+    def prefill_async(self, audio_sample, slice_indices=None):
+        """
+        Render the given slices (all slices by default) on a background thread.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample containing the slices.
+            slice_indices (iterable): The indices of the slices to render.
+        """
+        if slice_indices is None:
+            slice_indices = range(len(audio_sample.slices))
+        for slice_index in slice_indices:
+            key = self.key_for(audio_sample, audio_sample.slices[slice_index])
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slice-render')
+                future = self._executor.submit(self._render_and_store, audio_sample, key)
+                self._pending[key] = future
+            future.add_done_callback(lambda _, key=key: self._forget_pending(key))
+
+    def invalidate(self, key):
+        """
+        Drop a single rendered slice from the cache.
+
+        Parameters:
+            key (tuple): The key of the slice to drop, as returned by key_for.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+
+    def clear(self):
+        """Drop all rendered slices, including renders still in progress."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            self._generation += 1
+
+    @property
+    def hit_rate(self):
+        """float: The fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Return a snapshot of the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate, render count and time, entry count and size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'render_count': self.render_count,
+                'render_time': self.render_time,
+                'avg_render_time': self.render_time / self.render_count if self.render_count else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+            }
+
+    def _forget_pending(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _render_and_store(self, audio_sample, key):
+        start_frame, end_frame, pitch_shift = key[1:4]
+        generation = self._generation
+        began = time.perf_counter()
+        rendered, size = self.render(audio_sample, start_frame, end_frame, pitch_shift)
+        elapsed = time.perf_counter() - began
+
+        with self._lock:
+            self.render_count += 1
+            self.render_time += elapsed
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            # Slices larger than the whole budget, or rendered before a clear, are played but never cached
+            if size <= self.max_bytes and generation == self._generation:
+                self._entries[key] = (rendered, size)
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted_size
+        return rendered
@@ -0,0 +1,217 @@
+import numpy as np
+
+
+class Slice:
+    """
+    A lightweight view of one slice in a SliceCollection.
+
+    Fields are read like a dictionary, e.g. slice_info['start_frame'], so code written against
+    plain slice dictionaries keeps working; values always come from the collection.
+
+    Attributes:
+        collection (SliceCollection): The collection holding the slice.
+        index (int): The index of the slice in the collection.
+    """
+
+    __slots__ = ('collection', 'index')
+
+    FIELDS = ('start', 'end', 'pitch_shift', 'start_frame', 'end_frame')
+
+    def __init__(self, collection, index):
+        """
+        The constructor for Slice class.
+
+        Parameters:
+            collection (SliceCollection): The collection holding the slice.
+            index (int): The index of the slice in the collection.
+        """
+        self.collection = collection
+        self.index = index
+
+    def __getitem__(self, field):
+        """Return a field of the slice: start and end in milliseconds, pitch_shift, start_frame or end_frame."""
+        collection = self.collection
+        if field == 'start_frame':
+            return int(collection.start_frames[self.index])
+        if field == 'end_frame':
+            return int(collection.end_frames[self.index])
+        if field == 'pitch_shift':
+            return int(collection.pitch_shifts[self.index])
+        if field == 'start':
+            return collection.frame_to_ms(collection.start_frames[self.index])
+        if field == 'end':
+            return collection.frame_to_ms(collection.end_frames[self.index])
+        raise KeyError(field)
+
+    def to_dict(self):
+        """
+        Return the fields of the slice as a dictionary.
+
+        Returns:
+            dict: The start, end, pitch_shift, start_frame and end_frame of the slice.
+        """
+        return {field: self[field] for field in self.FIELDS}
+
+
+class SliceCollection:
+    """
+    The slices of an audio sample, stored column-wise in NumPy arrays.
+
+    Slices are edited through the collection, which notifies its listeners of the rows that
+    changed, so views can update just those rows instead of rebuilding everything.
+
+    Attributes:
+        frame_rate (int): The number of frames per second, used to report times in milliseconds.
+        start_frames (numpy.ndarray): The first frame of every slice.
+        end_frames (numpy.ndarray): The frame after the last frame of every slice.
+        pitch_shifts (numpy.ndarray): The pitch shift of every slice in semitones.
+    """
+
+    def __init__(self, frame_rate):
+        """
+        The constructor for SliceCollection class.
+
+        Parameters:
+            frame_rate (int): The number of frames per second.
+        """
+        self.frame_rate = frame_rate
+        self._start_frames = np.zeros(0, dtype=np.int64)
+        self._end_frames = np.zeros(0, dtype=np.int64)
+        self._pitch_shifts = np.zeros(0, dtype=np.int8)
+        self._count = 0
+        self._changed_listeners = []
+        self._reset_listeners = []
+
+    @property
+    def start_frames(self):
+        """numpy.ndarray: The first frame of every slice."""
+        return self._start_frames[:self._count]
+
+    @property
+    def end_frames(self):
+        """numpy.ndarray: The frame after the last frame of every slice."""
+        return self._end_frames[:self._count]
+
+    @property
+    def pitch_shifts(self):
+        """numpy.ndarray: The pitch shift of every slice in semitones."""
+        return self._pitch_shifts[:self._count]
+
+    def __len__(self):
+        """Return the number of slices."""
+        return self._count
+
+    def __getitem__(self, index):
+        """Return a view of the slice at index; negative indices count from the end."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Slice index out of range.")
+        return Slice(self, index)
+
+    def __iter__(self):
+        """Iterate over views of the slices in order."""
+        return (Slice(self, index) for index in range(self._count))
+
+    def frame_to_ms(self, frame):
+        """
+        Convert a frame offset to a time in milliseconds.
+
+        Parameters:
+            frame (int): The frame offset.
+
+        Returns:
+            int: The time in milliseconds.
+        """
+        return int(round(frame * 1000.0 / self.frame_rate))
+
+    def add_listener(self, changed=None, reset=None):
+        """
+        Register functions to call when slices change.
+
+        Parameters:
+            changed (callable): Called as changed(first, last) after the slices first to last (inclusive) were edited.
+            reset (callable): Called without arguments after slices were added or removed.
+        """
+        if changed is not None:
+            self._changed_listeners.append(changed)
+        if reset is not None:
+            self._reset_listeners.append(reset)
+
+    def remove_listener(self, changed=None, reset=None):
+        """
+        Unregister functions registered with add_listener.
+
+        Parameters:
+            changed (callable): The changed function to remove.
+            reset (callable): The reset function to remove.
+        """
+        if changed in self._changed_listeners:
+            self._changed_listeners.remove(changed)
+        if reset in self._reset_listeners:
+            self._reset_listeners.remove(reset)
+
+    def extend(self, bounds, pitch_shifts=None):
+        """
+        Append slices.
+
+        Parameters:
+            bounds (list): The (start_frame, end_frame) of every new slice.
+            pitch_shifts (list): The pitch shift of every new slice, none by default.
+        """
+        bounds = np.asarray(bounds, dtype=np.int64).reshape(-1, 2)
+        needed = self._count + len(bounds)
+        if needed > len(self._start_frames):
+            # Grow geometrically so adding slices one at a time stays cheap
+            capacity = max(needed, 2 * len(self._start_frames), 16)
+            self._start_frames = np.resize(self._start_frames, capacity)
+            self._end_frames = np.resize(self._end_frames, capacity)
+            self._pitch_shifts = np.resize(self._pitch_shifts, capacity)
+        self._start_frames[self._count:needed] = bounds[:, 0]
+        self._end_frames[self._count:needed] = bounds[:, 1]
+        self._pitch_shifts[self._count:needed] = 0 if pitch_shifts is None else pitch_shifts
+        self._count = needed
+        self._notify_reset()
+
+    def clear(self):
+        """Remove all slices."""
+        self._count = 0
+        self._notify_reset()
+
+    def update(self, index, start_frame=None, end_frame=None, pitch_shift=None):
+        """
+        Change the bounds or the pitch shift of a slice.
+
+        Parameters:
+            index (int): The index of the slice.
+            start_frame (int): The new first frame, or None to keep it.
+            end_frame (int): The new end frame, or None to keep it.
+            pitch_shift (int): The new pitch shift in semitones, or None to keep it.
+        """
+        if not 0 <= index < self._count:
+            raise IndexError("Slice index out of range.")
+        if start_frame is not None:
+            self._start_frames[index] = start_frame
+        if end_frame is not None:
+            self._end_frames[index] = end_frame
+        if pitch_shift is not None:
+            self._pitch_shifts[index] = pitch_shift
+        for listener in list(self._changed_listeners):
+            listener(index, index)
+
+    def visible(self, start_frame, end_frame):
+        """
+        Return the indices of the slices overlapping a range of frames.
+
+        Parameters:
+            start_frame (float): The first frame of the range.
+            end_frame (float): The frame after the last frame of the range.
+
+        Returns:
+            numpy.ndarray: The indices of the overlapping slices.
+        """
+        return np.flatnonzero((self.end_frames >= start_frame) & (self.start_frames <= end_frame))
+
+    def _notify_reset(self):
+        for listener in list(self._reset_listeners):
+            listener()
@@ -0,0 +1,350 @@
+import os
+import struct
+import subprocess
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import pcm
+import pitch_shift
+
+WAV = 'wav'
+FLAC = 'flac'
+EXPORT_FORMATS = (WAV, FLAC)
+CHUNK_FRAMES = 1 << 16
+SAMPLE_WIDTH = 2
+MAX_RIFF_BYTES = 0xFFFFFFFF
+
+
+class ExportCancelled(Exception):
+    """Raised when an export of slices is cancelled."""
+
+
+class WavWriter:
+    """
+    Writes a 16-bit PCM WAV file as frames arrive, with optional cue points.
+
+    The header is written with placeholder sizes and fixed on close, so the frames never have
+    to be held in memory at once. Cue points are stored in a cue chunk with their labels in an
+    associated data list, which samplers and editors show as markers. The file is written next
+    to its destination and moved into place on close.
+
+    Attributes:
+        file_path (str): The path of the WAV file.
+        channels (int): The number of channels.
+        frame_rate (int): The number of frames per second.
+        frames_written (int): The number of frames written so far.
+    """
+
+    def __init__(self, file_path, channels, frame_rate):
+        """
+        The constructor for WavWriter class.
+
+        Parameters:
+            file_path (str): The path of the WAV file.
+            channels (int): The number of channels.
+            frame_rate (int): The number of frames per second.
+        """
+        self.file_path = file_path
+        self.channels = channels
+        self.frame_rate = frame_rate
+        self.frames_written = 0
+        self.cues = []
+        self._file = open(file_path + '.part', 'wb')
+        block_align = channels * SAMPLE_WIDTH
+        self._file.write(struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 0, b'WAVE', b'fmt ', 16, 1, channels, frame_rate,
+                                     frame_rate * block_align, block_align, SAMPLE_WIDTH * 8, b'data', 0))
+
+    def write(self, frames):
+        """
+        Append 16-bit samples to the data chunk.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) int16 samples.
+        """
+        self._file.write(np.ascontiguousarray(frames, dtype=np.int16).tobytes())
+        self.frames_written += len(frames)
+
+    def add_cue(self, label):
+        """
+        Mark the current position with a labeled cue point.
+
+        Parameters:
+            label (str): The label of the cue point.
+        """
+        self.cues.append((self.frames_written, label))
+
+    def close(self):
+        """Write the cue points, fix the chunk sizes and move the file into place."""
+        data_size = self.frames_written * self.channels * SAMPLE_WIDTH
+        if self.cues:
+            cue = struct.pack('<I', len(self.cues)) + b''.join(
+                struct.pack('<II4sIII', i + 1, frame, b'data', 0, 0, frame) for i, (frame, _) in enumerate(self.cues))
+            labels = b'adtl'
+            for i, (_, label) in enumerate(self.cues):
+                text = label.encode('utf-8') + b'\0'
+                text += b'\0' * (len(text) % 2)
+                labels += struct.pack('<4sII', b'labl', 4 + len(text), i + 1) + text
+            self._file.write(struct.pack('<4sI', b'cue ', len(cue)) + cue)
+            self._file.write(struct.pack('<4sI', b'LIST', len(labels)) + labels)
+        riff_size = self._file.tell() - 8
+        if riff_size > MAX_RIFF_BYTES:
+            self.abort()
+            raise ValueError("The export is larger than the 4 GB a WAV file can hold.")
+        self._file.seek(4)
+        self._file.write(struct.pack('<I', riff_size))
+        self._file.seek(40)
+        self._file.write(struct.pack('<I', data_size))
+        self._file.close()
+        os.replace(self.file_path + '.part', self.file_path)
+
+    def abort(self):
+        """Close and remove the unfinished file."""
+        self._file.close()
+        if os.path.exists(self.file_path + '.part'):
+            os.remove(self.file_path + '.part')
+
+
+class FlacWriter:
+    """
+    Writes a FLAC file as frames arrive by piping 16-bit samples through ffmpeg.
+
+    Attributes:
+        file_path (str): The path of the FLAC file.
+        frames_written (int): The number of frames written so far.
+    """
+
+    def __init__(self, file_path, channels, frame_rate):
+        """
+        The constructor for FlacWriter class.
+
+        Parameters:
+            file_path (str): The path of the FLAC file.
+            channels (int): The number of channels.
+            frame_rate (int): The number of frames per second.
+
+        Raises:
+            RuntimeError: If ffmpeg is not installed.
+        """
+        from pydub.utils import which
+        converter = which('ffmpeg') or which('avconv')
+        if converter is None:
+            raise RuntimeError("Exporting FLAC needs ffmpeg.")
+        self.file_path = file_path
+        self.frames_written = 0
+        self._process = subprocess.Popen(
+            [converter, '-loglevel', 'error', '-y', '-f', 's16le', '-ar', str(frame_rate), '-ac', str(channels),
+             '-i', 'pipe:0', '-f', 'flac', file_path + '.part'],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frames):
+        """
+        Append 16-bit samples to the file.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) int16 samples.
+        """
+        self._process.stdin.write(np.ascontiguousarray(frames, dtype=np.int16).tobytes())
+        self.frames_written += len(frames)
+
+    def add_cue(self, label):
+        """FLAC files are only exported one per slice, so cue points are not supported."""
+        raise ValueError("Cue points can only be written to WAV files.")
+
+    def close(self):
+        """Finish encoding and move the file into place."""
+        self._process.stdin.close()
+        errors = self._process.stderr.read()
+        if self._process.wait() != 0:
+            self.abort()
+            raise RuntimeError("ffmpeg could not encode {}: {}".format(self.file_path, errors.decode('utf-8', 'replace')))
+        os.replace(self.file_path + '.part', self.file_path)
+
+    def abort(self):
+        """Stop encoding and remove the unfinished file."""
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        if os.path.exists(self.file_path + '.part'):
+            os.remove(self.file_path + '.part')
+
+
+WRITERS = {WAV: WavWriter, FLAC: FlacWriter}
+
+
+def write_chunked(writer, frames, chunk_frames=CHUNK_FRAMES):
+    """
+    Convert frames to 16 bits and write them a chunk at a time, so no full-length copy is made.
+
+    Parameters:
+        writer (WavWriter): The writer.
+        frames (numpy.ndarray): The (frames, channels) samples in any format pcm.to_float reads.
+        chunk_frames (int): The number of frames converted and written at a time.
+    """
+    for start in range(0, len(frames), chunk_frames):
+        chunk = frames[start:start + chunk_frames]
+        writer.write(chunk if chunk.dtype == np.int16 else pcm.from_float(pcm.to_float(chunk), -16))
+
+
+# Work run in the export process pool. Every worker opens the source once, from the decode cache
+# or as a stream, and renders the frame ranges it is sent, so the audio is never pickled.
+
+_export_sample = None
+
+
+def _open_export_sample(file_path, cache_folder, cache_max_bytes, streaming, snap_to_zero_crossings,
+                        snap_tolerance_ms, fade_ms):
+    global _export_sample
+    # Imported here, as audio_sample imports this module
+    from audio_sample import AudioSample
+    from decode_cache import DecodeCache
+    decode_cache = DecodeCache(cache_folder, cache_max_bytes) if cache_folder is not None else None
+    _export_sample = AudioSample(file_path, decode_cache=decode_cache, streaming=streaming,
+                                 snap_to_zero_crossings=snap_to_zero_crossings,
+                                 snap_tolerance_ms=snap_tolerance_ms, fade_ms=fade_ms)
+
+
+def _render_range(start_frame, end_frame, semitones, pitch_mode, gain):
+    frames = _export_sample.render_frames(start_frame, end_frame, semitones, pitch_mode, normalize=False)
+    if gain is not None:
+        frames = pcm.to_float(frames) * np.float32(gain)
+    return frames
+
+
+def slice_file_name(slice_index, file_format=WAV):
+    """
+    Return the file name a slice is exported under.
+
+    Parameters:
+        slice_index (int): The index of the slice.
+        file_format (str): One of EXPORT_FORMATS.
+
+    Returns:
+        str: The file name, numbered from 1.
+    """
+    return 'slice_{:03d}.{}'.format(slice_index + 1, file_format)
+
+
+def export_slices(audio_sample, output_path, file_format=WAV, concatenate=False, pitch_mode=pitch_shift.RESAMPLE,
+                  workers=None, chunk_frames=CHUNK_FRAMES, progress=None, is_cancelled=None):
+    """
+    Export every slice of an audio sample with its pitch shift applied.
+
+    The slices are visited in the order they start in the source, so the source is read in a
+    single forward pass. A source the workers can open again, mapped from the decode cache or
+    streamed, is rendered on a pool of processes, each sent the frame ranges, pitch shifts and
+    normalization gains of its slices rather than the audio; pitch shifting is mostly Python
+    driven NumPy and does not scale on threads holding the GIL. Any other source is rendered on
+    threads sharing its buffer, as a new process would have to decode it again. Slices stored
+    in a project are read from it. At most two renders per worker are held at a time and each is
+    written out in fixed-size chunks as soon as it is its turn, so memory stays bounded however
+    many slices there are.
+
+    Parameters:
+        audio_sample (AudioSample): The audio sample.
+        output_path (str): The folder the slice files are written to, or the concatenated WAV file.
+        file_format (str): One of EXPORT_FORMATS; concatenated exports are always WAV.
+        concatenate (bool): Whether to write one file with a labeled cue point at the start of every slice.
+        pitch_mode (str): One of pitch_shift.MODES.
+        workers (int): The number of render processes or threads, the number of cores by default.
+        chunk_frames (int): The number of frames converted and written at a time.
+        progress (callable): Optional function called with the fraction of slices written.
+        is_cancelled (callable): Optional function returning True to stop; the files written so
+            far are removed and ExportCancelled is raised.
+
+    Returns:
+        list: The paths of the files written, in slice order.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError("The export format must be one of {}.".format(', '.join(EXPORT_FORMATS)))
+    if concatenate and file_format != WAV:
+        raise ValueError("Concatenated exports are written as WAV files with cue points.")
+    if audio_sample.normalize_lufs is not None:
+        # Playback skips normalization until the index is built; exports wait for it
+        audio_sample.build_loudness_index()
+    slices = audio_sample.slices
+    order = np.argsort(slices.start_frames, kind='stable')
+    workers = workers or os.cpu_count() or 1
+    channels, frame_rate = audio_sample.channels, audio_sample.frame_rate
+
+    paths = [output_path] if concatenate else [None] * len(slices)
+    concatenated = WavWriter(output_path, channels, frame_rate) if concatenate else None
+    if not concatenate:
+        os.makedirs(output_path, exist_ok=True)
+
+    written = [0]
+
+    def write(slice_index, frames):
+        if is_cancelled is not None and is_cancelled():
+            raise ExportCancelled()
+        if concatenated is not None:
+            concatenated.add_cue("Slice {}".format(slice_index + 1))
+            write_chunked(concatenated, frames, chunk_frames)
+        else:
+            path = os.path.join(output_path, slice_file_name(slice_index, file_format))
+            writer = WRITERS[file_format](path, channels, frame_rate)
+            try:
+                write_chunked(writer, frames, chunk_frames)
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+            paths[slice_index] = path
+        written[0] += 1
+        if progress is not None:
+            progress(written[0] / len(slices))
+
+    if audio_sample.decode_cache is not None or audio_sample.stream is not None:
+        decode_cache = audio_sample.decode_cache
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_open_export_sample, initargs=(
+            audio_sample.file_path, decode_cache.cache_folder if decode_cache is not None else None,
+            decode_cache.max_bytes if decode_cache is not None else None, audio_sample.stream is not None,
+            audio_sample.snap_to_zero_crossings, audio_sample.snap_tolerance_ms, audio_sample.fade_ms))
+
+        def submit(slice_index):
+            slice_info = slices[slice_index]
+            start_frame, end_frame = slice_info['start_frame'], slice_info['end_frame']
+            semitones = slice_info['pitch_shift']
+            gain = None
+            if audio_sample.applied_lufs is not None:
+                gain = audio_sample.loudness_index.normalization_gain(start_frame, end_frame, audio_sample.applied_lufs)
+            if audio_sample.prerendered is not None:
+                frames = audio_sample.prerendered.rendered(start_frame, end_frame, semitones, pitch_mode, frame_rate)
+                if frames is not None:
+                    future = Future()
+                    future.set_result(frames if gain is None else pcm.to_float(frames) * np.float32(gain))
+                    return future
+            return executor.submit(_render_range, start_frame, end_frame, semitones, pitch_mode, gain)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='slice-export')
+
+        def submit(slice_index):
+            return executor.submit(audio_sample.render_slice, slice_index, pitch_mode)
+
+    try:
+        with executor:
+            pending = deque()
+            try:
+                for slice_index in order:
+                    pending.append((slice_index, submit(int(slice_index))))
+                    if len(pending) >= workers * 2:
+                        slice_index, future = pending.popleft()
+                        write(int(slice_index), future.result())
+                while pending:
+                    slice_index, future = pending.popleft()
+                    write(int(slice_index), future.result())
+            finally:
+                for _, future in pending:
+                    future.cancel()
+    except BaseException as e:
+        if concatenated is not None:
+            concatenated.abort()
+        elif isinstance(e, ExportCancelled):
+            for path in paths:
+                if path is not None:
+                    os.remove(path)
+        raise
+    if concatenated is not None:
+        concatenated.close()
+    return paths
@@ -0,0 +1,62 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import pitch_shift
+import slice_export
+from slice_export import ExportCancelled
+
+
+class SliceExporter(QThread):
+    """
+    A worker thread that exports the slices of an audio sample off the GUI thread.
+
+    Signals:
+        progress (int, str): Percentage done and a description of the current stage.
+        exported (object): The list of paths written, emitted once the export has finished.
+        failed (str): The error message, emitted when exporting fails.
+        cancelled (): Emitted when the export was cancelled and its files removed.
+    """
+
+    progress = pyqtSignal(int, str)
+    exported = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, audio_sample, output_path, file_format=slice_export.WAV, concatenate=False,
+                 pitch_mode=pitch_shift.RESAMPLE, parent=None):
+        """
+        The constructor for SliceExporter class.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample whose slices are exported.
+            output_path (str): The folder the slice files are written to, or the concatenated WAV file.
+            file_format (str): One of slice_export.EXPORT_FORMATS.
+            concatenate (bool): Whether to write all slices to one WAV file with cue points.
+            pitch_mode (str): One of pitch_shift.MODES.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.audio_sample = audio_sample
+        self.output_path = output_path
+        self.file_format = file_format
+        self.concatenate = concatenate
+        self.pitch_mode = pitch_mode
+
+    def cancel(self):
+        """Request the exporter to stop at the next slice."""
+        self.requestInterruption()
+
+    def run(self):
+        """Export the slices, reporting progress through signals."""
+        try:
+            self.progress.emit(0, "Exporting")
+            paths = self.audio_sample.export_slices(
+                self.output_path, self.file_format, self.concatenate, pitch_mode=self.pitch_mode,
+                progress=lambda fraction: self.progress.emit(int(fraction * 100), "Exporting"),
+                is_cancelled=self.isInterruptionRequested)
+        except ExportCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.exported.emit(paths)
@@ -0,0 +1,149 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QVariant
+
+# Keys playing the slices of a bank, in order
+BANK_KEYS = "asdfghjkl"
+
+COLUMNS = ('Playback Key', 'Start (ms)', 'End (ms)', 'Pitch Shift', 'RMS (dB)', 'Peak (dB)', 'Loudness (LUFS)')
+# The level shown in each of the last columns
+LEVEL_COLUMNS = ('rms_db', 'peak_db', 'loudness_lufs')
+
+
+def bank_key(slice_index):
+    """
+    Return the bank and key that play a slice.
+
+    Parameters:
+        slice_index (int): The index of the slice.
+
+    Returns:
+        tuple: The bank index and the key.
+    """
+    bank, position = divmod(slice_index, len(BANK_KEYS))
+    return bank, BANK_KEYS[position]
+
+
+class SliceTableModel(QAbstractTableModel):
+    """
+    A table model presenting a SliceCollection to Qt views.
+
+    Cells are read from the collection when the view asks for them, so no per-row objects are
+    kept; an edit of one slice repaints only its row. Levels are measured for all slices at once
+    from a loudness index and kept as arrays; an edit measures only its row again.
+
+    Attributes:
+        slices (SliceCollection): The slices shown, if any.
+        loudness_index (LoudnessIndex): The levels of the audio, if known; the level columns are empty until then.
+    """
+
+    def __init__(self, parent=None):
+        """
+        The constructor for SliceTableModel class.
+
+        Parameters:
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.slices = None
+        self.loudness_index = None
+        self.levels = None
+
+    def set_slices(self, slices):
+        """
+        Show another slice collection, following its changes from now on.
+
+        Parameters:
+            slices (SliceCollection): The slices to show, or None to show nothing.
+        """
+        self.beginResetModel()
+        if self.slices is not None:
+            self.slices.remove_listener(changed=self.on_slices_changed, reset=self.on_slices_reset)
+        self.slices = slices
+        self.loudness_index = None
+        self.levels = None
+        if slices is not None:
+            slices.add_listener(changed=self.on_slices_changed, reset=self.on_slices_reset)
+        self.endResetModel()
+
+    def set_loudness_index(self, loudness_index):
+        """
+        Fill the level columns from a loudness index of the audio the slices are cut from.
+
+        Parameters:
+            loudness_index (LoudnessIndex): The index, or None to empty the level columns.
+        """
+        self.loudness_index = loudness_index
+        self.measure_levels()
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, len(COLUMNS) - len(LEVEL_COLUMNS)),
+                                  self.index(self.rowCount() - 1, len(COLUMNS) - 1))
+
+    def measure_levels(self, first=None, last=None):
+        """
+        Measure the levels of all slices, or of a range of them, in one vectorized query.
+
+        Parameters:
+            first (int): The index of the first slice to measure, or None for all slices.
+            last (int): The index of the last slice to measure.
+        """
+        if self.loudness_index is None or self.slices is None:
+            self.levels = None
+            return
+        if first is None or self.levels is None:
+            self.levels = self.loudness_index.stats(self.slices.start_frames, self.slices.end_frames)
+            return
+        stats = self.loudness_index.stats(self.slices.start_frames[first:last + 1], self.slices.end_frames[first:last + 1])
+        for name, values in stats.items():
+            self.levels[name][first:last + 1] = values
+
+    def on_slices_changed(self, first, last):
+        """
+        Repaint the rows of edited slices.
+
+        Parameters:
+            first (int): The index of the first edited slice.
+            last (int): The index of the last edited slice.
+        """
+        self.measure_levels(first, last)
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(COLUMNS) - 1))
+
+    def on_slices_reset(self):
+        """Reload the table after slices were added or removed."""
+        self.beginResetModel()
+        self.measure_levels()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of slices."""
+        if parent.isValid() or self.slices is None:
+            return 0
+        return len(self.slices)
+
+    def columnCount(self, parent=QModelIndex()):
+        """Return the number of columns."""
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Return the text of a cell."""
+        if role != Qt.DisplayRole or not index.isValid() or self.slices is None:
+            return QVariant()
+        row, column = index.row(), index.column()
+        if column == 0:
+            bank, key = bank_key(row)
+            return "{}:{}".format(bank + 1, key)
+        if column == 1:
+            return str(self.slices.frame_to_ms(self.slices.start_frames[row]))
+        if column == 2:
+            return str(self.slices.frame_to_ms(self.slices.end_frames[row]))
+        if column == 3:
+            return str(int(self.slices.pitch_shifts[row]))
+        if self.levels is None:
+            return ""
+        return "{:.1f}".format(self.levels[LEVEL_COLUMNS[column - 4]][row])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Return the column titles and the slice numbers."""
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return str(section + 1)
@@ -0,0 +1,469 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import pcm
+import pitch_shift
+from audio_sample import AudioSample
+from decode_cache import DecodeCache
+from onset_detection import EQUAL, SLICING_MODES
+
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+STATUS_TEXT = {
+    200: 'OK', 201: 'Created', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+USER_PATTERN = r'(?P<user>[A-Za-z0-9_-]{1,64})'
+SAMPLE_PATTERN = r'(?P<sample>[0-9a-f]{64})'
+ROUTES = [
+    ('POST', re.compile(r'^/users/{}/samples$'.format(USER_PATTERN)), 'upload'),
+    ('GET', re.compile(r'^/users/{}/samples$'.format(USER_PATTERN)), 'list_samples'),
+    ('POST', re.compile(r'^/users/{}/samples/{}/slices$'.format(USER_PATTERN, SAMPLE_PATTERN)), 'create_slices'),
+    ('GET', re.compile(r'^/users/{}/samples/{}/slices$'.format(USER_PATTERN, SAMPLE_PATTERN)), 'get_slices'),
+    ('PATCH', re.compile(r'^/users/{}/samples/{}/slices/(?P<index>\d+)$'.format(USER_PATTERN, SAMPLE_PATTERN)), 'adjust_slice'),
+    ('GET', re.compile(r'^/users/{}/samples/{}/slices/(?P<index>\d+)\.wav$'.format(USER_PATTERN, SAMPLE_PATTERN)), 'get_slice_audio'),
+]
+
+
+class HttpError(Exception):
+    """Raised by request handlers to answer with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Work run in the process pool. Every worker keeps its own handle on the shared on-disk decode
+# cache, so a file is decoded once no matter which worker or user asks for it, and keeps the
+# samples it loaded last, so the jobs of a sample reuse its zero-crossing and loudness indexes.
+
+MAX_WORKER_SAMPLES = 4
+
+_decode_cache = None
+_samples = OrderedDict()
+
+
+def _init_worker(cache_folder):
+    global _decode_cache
+    _decode_cache = DecodeCache(cache_folder)
+
+
+def _load(path, slices=None):
+    key = _decode_cache.source_hash(path) if _decode_cache is not None else os.path.abspath(path)
+    sample = _samples.pop(key, None)
+    if sample is None:
+        sample = AudioSample(path, decode_cache=_decode_cache)
+    _samples[key] = sample
+    while len(_samples) > MAX_WORKER_SAMPLES:
+        _samples.popitem(last=False)
+    # Workers run one job at a time; each job starts from the slice table it was given
+    sample.slices.clear()
+    if slices:
+        sample.slices.extend([(s['start_frame'], s['end_frame']) for s in slices], [s['pitch_shift'] for s in slices])
+    return sample
+
+
+def analyze_file(path):
+    """Decode a file (filling the decode cache) and return its format."""
+    sample = _load(path)
+    return {'frame_rate': sample.frame_rate, 'channels': sample.channels, 'frame_count': sample.frame_count,
+            'duration': sample.duration_ms}
+
+
+def slice_file(path, num_slices, mode):
+    """Slice a file and return the slice table."""
+    sample = _load(path)
+    sample.create_slices(num_slices, mode)
+    return [s.to_dict() for s in sample.slices]
+
+
+def adjust_file_slice(path, slices, index, start_adjust, end_adjust, pitch_shift):
+    """Adjust a slice of a slice table and return the new table."""
+    sample = _load(path, slices)
+    sample.adjust_slice(index, start_adjust, end_adjust, pitch_shift)
+    return [s.to_dict() for s in sample.slices]
+
+
+def render_file_slice(path, slice_info, pitch_mode, output_path):
+    """Render a slice into a WAV file."""
+    sample = _load(path, [slice_info])
+    partial_path = output_path + '.part{}'.format(os.getpid())
+    pcm.write_wav(partial_path, sample.render_slice(0, pitch_mode), sample.frame_rate)
+    os.replace(partial_path, output_path)
+    return output_path
+
+
+class SlicingService:
+    """
+    An asyncio HTTP service for uploading, slicing and rendering audio samples of many users.
+
+    Uploads are streamed to disk while being hashed and stored once per content, however many
+    users upload the same file. Decoding, analysis and rendering run in a bounded process pool,
+    so the event loop never waits on ffmpeg or NumPy. Rendered slices are kept on disk and
+    served with an ETag derived from their content, so clients can cache them.
+
+    Routes:
+        POST /users/<user>/samples?name=<file name>             Upload a sample (the request body).
+        GET /users/<user>/samples                               List the user's samples.
+        POST /users/<user>/samples/<sample>/slices              Slice a sample: {"num_slices": n, "mode": m}.
+        GET /users/<user>/samples/<sample>/slices               The slice table.
+        PATCH /users/<user>/samples/<sample>/slices/<i>         Adjust a slice: {"start_adjust", "end_adjust", "pitch_shift"}.
+        GET /users/<user>/samples/<sample>/slices/<i>.wav       The rendered slice.
+
+    Attributes:
+        storage_folder (str): The folder holding uploads, user data and rendered slices.
+        workers (int): The number of worker processes.
+        max_upload_bytes (int): The largest accepted upload.
+        max_pending_jobs (int): The most jobs queued for the workers at a time.
+    """
+
+    def __init__(self, storage_folder='service', workers=None, max_upload_bytes=512 * 1024 * 1024, max_pending_jobs=64):
+        """
+        The constructor for SlicingService class.
+
+        Parameters:
+            storage_folder (str): The folder holding uploads, user data and rendered slices.
+            workers (int): The number of worker processes, the number of cores by default.
+            max_upload_bytes (int): The largest accepted upload.
+            max_pending_jobs (int): The most jobs queued for the workers at a time; further requests wait.
+        """
+        self.storage_folder = storage_folder
+        self.workers = workers or os.cpu_count() or 1
+        self.max_upload_bytes = max_upload_bytes
+        self.max_pending_jobs = max_pending_jobs
+        self.upload_folder = os.path.join(storage_folder, 'uploads')
+        self.render_folder = os.path.join(storage_folder, 'slices')
+        self.user_folder = os.path.join(storage_folder, 'users')
+        for folder in (self.upload_folder, self.render_folder, self.user_folder):
+            os.makedirs(folder, exist_ok=True)
+        self._pool = None
+        self._server = None
+        self._jobs = None
+        self._locks = {}
+        self._renders = {}
+
+    async def start(self, host='127.0.0.1', port=8080):
+        """
+        Start the worker pool and listen for requests.
+
+        Parameters:
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 for any free port.
+
+        Returns:
+            int: The port the service listens on.
+        """
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(os.path.join(self.storage_folder, 'cache', 'decoded'),))
+        self._jobs = asyncio.Semaphore(self.max_pending_jobs)
+        self._server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening and shut the worker pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    async def run_job(self, function, *args):
+        """
+        Run a function in the worker pool, waiting for a free slot if too many jobs are queued.
+
+        Parameters:
+            function (callable): A module-level function.
+            *args: Its arguments.
+
+        Returns:
+            object: The result of the function.
+        """
+        async with self._jobs:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+
+    async def handle_connection(self, reader, writer):
+        """Answer one request per connection."""
+        try:
+            try:
+                method, target, headers = await self.read_head(reader)
+                url = urlsplit(target)
+                for route_method, pattern, handler_name in ROUTES:
+                    match = pattern.match(url.path)
+                    if match and route_method == method:
+                        handler = getattr(self, handler_name)
+                        await handler(reader, writer, headers, parse_qs(url.query), **match.groupdict())
+                        break
+                else:
+                    known = any(pattern.match(url.path) for _, pattern, _ in ROUTES)
+                    raise HttpError(405 if known else 404, "No route for {} {}".format(method, url.path))
+            except HttpError as e:
+                await self.send_json(writer, e.status, {'error': str(e)})
+            except (ValueError, KeyError) as e:
+                await self.send_json(writer, 400, {'error': str(e)})
+            except Exception as e:
+                await self.send_json(writer, 500, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_head(reader):
+        """
+        Read the request line and headers.
+
+        Returns:
+            tuple: The method, the target and a dict of lower-cased header names to values.
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "Request head too large.")
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return parts[0], parts[1], headers
+
+    @staticmethod
+    async def read_json(reader, headers, limit=1024 * 1024):
+        """Read a small JSON request body."""
+        length = int(headers.get('content-length', 0))
+        if length > limit:
+            raise HttpError(413, "Request body too large.")
+        return json.loads(await reader.readexactly(length)) if length else {}
+
+    @staticmethod
+    async def send(writer, status, headers, body=b''):
+        """Send a response with a complete body."""
+        lines = ['HTTP/1.1 {} {}'.format(status, STATUS_TEXT.get(status, '')),
+                 'Content-Length: {}'.format(len(body)), 'Connection: close']
+        lines += ['{}: {}'.format(name, value) for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def send_json(self, writer, status, data, headers=None, request_headers=None):
+        """Send a JSON response; with request_headers, answer 304 if the client's copy is current."""
+        body = json.dumps(data).encode('utf-8')
+        headers = dict(headers or {})
+        if request_headers is not None:
+            headers['ETag'] = '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+            headers['Cache-Control'] = 'no-cache'
+            if request_headers.get('if-none-match') == headers['ETag']:
+                await self.send(writer, 304, headers)
+                return
+        headers['Content-Type'] = 'application/json'
+        await self.send(writer, status, headers, body)
+
+    async def send_file(self, writer, path, headers):
+        """Stream a file as the response body."""
+        size = os.path.getsize(path)
+        lines = ['HTTP/1.1 200 OK', 'Content-Length: {}'.format(size), 'Connection: close']
+        lines += ['{}: {}'.format(name, value) for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    def user_path(self, user, *names):
+        """Return a path in a user's folder, creating the folder."""
+        folder = os.path.join(self.user_folder, user)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, *names)
+
+    def read_user_json(self, user, name, default):
+        """Read a JSON file of a user, or return default if there is none."""
+        try:
+            with open(self.user_path(user, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def write_user_json(self, user, name, data):
+        """Replace a JSON file of a user atomically."""
+        path = self.user_path(user, name)
+        with open(path + '.part', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.part', path)
+
+    def lock_for(self, user, sample):
+        """Return the lock serializing edits of a user's sample."""
+        return self._locks.setdefault((user, sample), asyncio.Lock())
+
+    def sample_path(self, user, sample):
+        """Return the uploaded file of a user's sample."""
+        entry = self.read_user_json(user, 'samples.json', {}).get(sample)
+        if entry is None:
+            raise HttpError(404, "Unknown sample.")
+        return os.path.join(self.upload_folder, sample + entry['extension'])
+
+    async def upload(self, reader, writer, headers, query, user):
+        """Stream an upload to disk while hashing it, then store it once per content."""
+        if 'content-length' not in headers:
+            raise HttpError(411, "Uploads need a Content-Length.")
+        length = int(headers['content-length'])
+        if length > self.max_upload_bytes:
+            raise HttpError(413, "Uploads are limited to {} bytes.".format(self.max_upload_bytes))
+        name = query.get('name', ['upload.wav'])[0]
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in AUDIO_EXTENSIONS:
+            raise HttpError(400, "Only {} files are accepted.".format(', '.join(AUDIO_EXTENSIONS)))
+
+        loop = asyncio.get_running_loop()
+        digest = hashlib.sha256()
+        fd, partial_path = tempfile.mkstemp(dir=self.upload_folder, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                remaining = length
+                while remaining:
+                    chunk = await reader.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise HttpError(400, "Upload ended early.")
+                    remaining -= len(chunk)
+                    digest.update(chunk)
+                    await loop.run_in_executor(None, f.write, chunk)
+            sample = digest.hexdigest()
+            stored_path = os.path.join(self.upload_folder, sample + extension)
+            deduplicated = os.path.exists(stored_path)
+            if deduplicated:
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, stored_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        try:
+            info = await self.run_job(analyze_file, stored_path)
+        except Exception as e:
+            raise HttpError(400, "Could not decode the upload: {}".format(e))
+        async with self.lock_for(user, ''):
+            samples = self.read_user_json(user, 'samples.json', {})
+            samples[sample] = dict(info, name=name, extension=extension)
+            self.write_user_json(user, 'samples.json', samples)
+        await self.send_json(writer, 201, dict(info, sample=sample, name=name, deduplicated=deduplicated))
+
+    async def list_samples(self, reader, writer, headers, query, user):
+        """List the samples of a user."""
+        await self.send_json(writer, 200, self.read_user_json(user, 'samples.json', {}), request_headers=headers)
+
+    async def create_slices(self, reader, writer, headers, query, user, sample):
+        """Slice a sample into equal parts, at onsets or at beats."""
+        body = await self.read_json(reader, headers)
+        num_slices = int(body.get('num_slices', 8))
+        mode = body.get('mode', EQUAL)
+        if not 1 <= num_slices <= 999 or mode not in SLICING_MODES:
+            raise HttpError(400, "num_slices must be 1 to 999 and mode one of {}.".format(', '.join(SLICING_MODES)))
+        path = self.sample_path(user, sample)
+        async with self.lock_for(user, sample):
+            slices = await self.run_job(slice_file, path, num_slices, mode)
+            self.write_user_json(user, sample + '.json', slices)
+        await self.send_json(writer, 201, slices)
+
+    async def get_slices(self, reader, writer, headers, query, user, sample):
+        """Return the slice table of a sample."""
+        self.sample_path(user, sample)
+        slices = self.read_user_json(user, sample + '.json', None)
+        if slices is None:
+            raise HttpError(404, "The sample has not been sliced.")
+        await self.send_json(writer, 200, slices, request_headers=headers)
+
+    async def adjust_slice(self, reader, writer, headers, query, user, sample, index):
+        """Move the edges of a slice or change its pitch shift."""
+        body = await self.read_json(reader, headers)
+        path = self.sample_path(user, sample)
+        index = int(index)
+        async with self.lock_for(user, sample):
+            slices = self.read_user_json(user, sample + '.json', None)
+            if slices is None or index >= len(slices):
+                raise HttpError(404, "Unknown slice.")
+            try:
+                slices = await self.run_job(adjust_file_slice, path, slices, index, body.get('start_adjust'),
+                                            body.get('end_adjust'), body.get('pitch_shift'))
+            except ValueError as e:
+                raise HttpError(400, str(e))
+            self.write_user_json(user, sample + '.json', slices)
+        await self.send_json(writer, 200, slices[index])
+
+    async def get_slice_audio(self, reader, writer, headers, query, user, sample, index):
+        """Serve a rendered slice, rendering it once per distinct slice and pitch mode."""
+        path = self.sample_path(user, sample)
+        slices = self.read_user_json(user, sample + '.json', None)
+        index = int(index)
+        if slices is None or index >= len(slices):
+            raise HttpError(404, "Unknown slice.")
+        pitch_mode = query.get('pitch_mode', [pitch_shift.RESAMPLE])[0]
+        if pitch_mode not in pitch_shift.MODES:
+            raise HttpError(400, "pitch_mode must be one of {}.".format(', '.join(pitch_shift.MODES)))
+
+        slice_info = slices[index]
+        # A render depends only on the source content and the slice, so it is shared by all users
+        render_key = hashlib.sha256('{}:{}:{}:{}:{}'.format(
+            sample, slice_info['start_frame'], slice_info['end_frame'], slice_info['pitch_shift'], pitch_mode
+        ).encode('ascii')).hexdigest()[:32]
+        etag = '"{}"'.format(render_key)
+        cache_headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable'}
+        if headers.get('if-none-match') == etag:
+            await self.send(writer, 304, cache_headers)
+            return
+
+        output_path = os.path.join(self.render_folder, render_key + '.wav')
+        if not os.path.exists(output_path):
+            # Concurrent requests for the same slice share a single render
+            render = self._renders.get(render_key)
+            if render is None:
+                render = asyncio.ensure_future(self.run_job(render_file_slice, path, slice_info, pitch_mode, output_path))
+                self._renders[render_key] = render
+                render.add_done_callback(lambda _: self._renders.pop(render_key, None))
+            await asyncio.shield(render)
+        await self.send_file(writer, output_path, dict(cache_headers, **{'Content-Type': 'audio/wav'}))
+
+
+def main(argv=None):
+    """Run the service until interrupted."""
+    parser = argparse.ArgumentParser(description="Serve uploading, slicing and rendering of audio samples over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="The address to listen on.")
+    parser.add_argument('--port', type=int, default=8080, help="The port to listen on.")
+    parser.add_argument('--storage', default='service', help="The folder holding uploads and slices.")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="The number of worker processes.")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        service = SlicingService(args.storage, args.workers)
+        port = await service.start(args.host, args.port)
+        print("Listening on http://{}:{}".format(args.host, port), flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import pcm
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Files larger than this are streamed instead of being decoded into memory up front
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+
+class WavReader:
+    """
+    Reads frames of a WAV file through a memory map, without decoding the whole file.
+
+    16-bit PCM and 32-bit float files are exposed directly as a (frames, channels) memory map;
+    other sample widths are converted chunk by chunk when read.
+
+    Attributes:
+        file_path (str): The path to the WAV file.
+        frame_rate (int): The number of frames per second.
+        channels (int): The number of channels.
+        sample_width (int): The sample width in bytes.
+        frame_count (int): The number of frames in the file.
+        samples (numpy.memmap): The (frames, channels) memory map, or None if samples have to be converted.
+    """
+
+    def __init__(self, file_path):
+        """
+        The constructor for WavReader class.
+
+        Parameters:
+            file_path (str): The path to the WAV file.
+
+        Raises:
+            ValueError: If the file is not a PCM or float WAV file.
+        """
+        self.file_path = file_path
+        format_tag, self.channels, self.frame_rate, bits, data_offset, data_size = self.parse_header(file_path)
+        self.sample_width = bits // 8
+        frame_size = self.sample_width * self.channels
+        self.frame_count = data_size // frame_size
+
+        self.samples = None
+        self._raw = None
+        if self.frame_count == 0:
+            self.samples = np.zeros((0, self.channels), dtype=np.int16)
+        elif format_tag == WAVE_FORMAT_PCM and self.sample_width == 2:
+            self.samples = np.memmap(file_path, dtype='<i2', mode='r', offset=data_offset, shape=(self.frame_count, self.channels))
+        elif format_tag == WAVE_FORMAT_IEEE_FLOAT and self.sample_width == 4:
+            self.samples = np.memmap(file_path, dtype='<f4', mode='r', offset=data_offset, shape=(self.frame_count, self.channels))
+        elif format_tag == WAVE_FORMAT_PCM:
+            self._raw = np.memmap(file_path, dtype=np.uint8, mode='r', offset=data_offset, shape=(self.frame_count * frame_size,))
+        else:
+            raise ValueError("Unsupported WAV sample format: {} at {} bits.".format(format_tag, bits))
+
+    @staticmethod
+    def parse_header(file_path):
+        """
+        Find the format and the data chunk of a WAV file.
+
+        Parameters:
+            file_path (str): The path to the WAV file.
+
+        Returns:
+            tuple: The (format_tag, channels, frame_rate, bits_per_sample, data_offset, data_size).
+
+        Raises:
+            ValueError: If the file is not a WAV file.
+        """
+        with open(file_path, 'rb') as f:
+            riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave != b'WAVE':
+                raise ValueError("Not a WAV file: {}".format(file_path))
+
+            fmt = None
+            while True:
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    raise ValueError("WAV file has no data chunk: {}".format(file_path))
+                chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+                if chunk_id == b'fmt ':
+                    body = f.read(chunk_size)
+                    format_tag, channels, frame_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        format_tag = struct.unpack('<H', body[24:26])[0]
+                    fmt = (format_tag, channels, frame_rate, bits)
+                    if chunk_size % 2:
+                        f.seek(1, 1)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        raise ValueError("WAV data chunk precedes its format chunk: {}".format(file_path))
+                    data_offset = f.tell()
+                    f.seek(0, 2)
+                    # Tolerate truncated files and streaming writers that leave the size unset
+                    data_size = min(chunk_size, f.tell() - data_offset)
+                    return fmt + (data_offset, data_size)
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+
+    def __len__(self):
+        """Return the number of frames, so the reader can stand in for a (frames, channels) array."""
+        return self.frame_count
+
+    def __getitem__(self, key):
+        """Read a slice of frames, e.g. reader[start:end], like slicing a (frames, channels) array."""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Frames can only be read with contiguous slices.")
+        start, end, _ = key.indices(self.frame_count)
+        return self.read(start, end)
+
+    def read(self, start_frame, end_frame):
+        """
+        Read a range of frames.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+
+        Returns:
+            numpy.ndarray: The (frames, channels) samples; a view into the memory map when possible.
+        """
+        if self.samples is not None:
+            return self.samples[start_frame:end_frame]
+        frame_size = self.sample_width * self.channels
+        start_frame = max(start_frame, 0)
+        end_frame = max(min(end_frame, self.frame_count), start_frame)
+        raw = self._raw[start_frame * frame_size:end_frame * frame_size]
+        return pcm.to_array(raw, self.sample_width, self.channels)
+
+
+class ChunkedDecoder:
+    """
+    Decodes compressed audio on demand, one fixed-size chunk of frames at a time.
+
+    Only chunks covering the frames that are read are decoded, and at most max_chunks decoded
+    chunks are kept in memory, so memory use does not grow with the length of the file.
+
+    Attributes:
+        file_path (str): The path to the audio file.
+        frame_rate (int): The number of frames per second.
+        channels (int): The number of channels.
+        sample_width (int): The sample width of the decoded audio in bytes.
+        frame_count (int): The number of frames in the file.
+        chunk_frames (int): The number of frames decoded at a time.
+        max_chunks (int): The maximum number of decoded chunks kept in memory.
+        samples (None): Always None, samples are only available through read.
+    """
+
+    def __init__(self, file_path, chunk_frames=1 << 18, max_chunks=8):
+        """
+        The constructor for ChunkedDecoder class.
+
+        Parameters:
+            file_path (str): The path to the audio file.
+            chunk_frames (int): The number of frames decoded at a time.
+            max_chunks (int): The maximum number of decoded chunks kept in memory.
+        """
+        self.file_path = file_path
+        self.chunk_frames = chunk_frames
+        self.max_chunks = max_chunks
+        self.samples = None
+        self.sample_width = 2
+
+        from pydub.utils import mediainfo_json
+        info = mediainfo_json(file_path)
+        stream = next(s for s in info['streams'] if s.get('codec_type') == 'audio')
+        self.frame_rate = int(stream['sample_rate'])
+        self.channels = int(stream['channels'])
+        duration = float(stream.get('duration') or info['format']['duration'])
+        self.frame_count = int(round(duration * self.frame_rate))
+
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of frames, so the reader can stand in for a (frames, channels) array."""
+        return self.frame_count
+
+    def __getitem__(self, key):
+        """Read a slice of frames, e.g. reader[start:end], like slicing a (frames, channels) array."""
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Frames can only be read with contiguous slices.")
+        start, end, _ = key.indices(self.frame_count)
+        return self.read(start, end)
+
+    def read(self, start_frame, end_frame):
+        """
+        Read a range of frames, decoding only the chunks that cover it.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+
+        Returns:
+            numpy.ndarray: The (frames, channels) int16 samples.
+        """
+        start_frame = max(start_frame, 0)
+        end_frame = max(min(end_frame, self.frame_count), start_frame)
+        if start_frame == end_frame:
+            return np.zeros((0, self.channels), dtype=np.int16)
+
+        first_chunk = start_frame // self.chunk_frames
+        last_chunk = (end_frame - 1) // self.chunk_frames
+        parts = [self.chunk(index) for index in range(first_chunk, last_chunk + 1)]
+        joined = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        offset = first_chunk * self.chunk_frames
+        return joined[start_frame - offset:end_frame - offset]
+
+    def chunk(self, index):
+        """
+        Return a decoded chunk, decoding it on a miss.
+
+        Parameters:
+            index (int): The index of the chunk.
+
+        Returns:
+            numpy.ndarray: The (chunk_frames, channels) int16 samples of the chunk.
+        """
+        with self._lock:
+            cached = self._chunks.get(index)
+            if cached is not None:
+                self._chunks.move_to_end(index)
+                return cached
+
+        decoded = self.decode_range(index * self.chunk_frames, min((index + 1) * self.chunk_frames, self.frame_count))
+        with self._lock:
+            self._chunks[index] = decoded
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+        return decoded
+
+    def decode_range(self, start_frame, end_frame):
+        """
+        Decode a range of frames with ffmpeg.
+
+        Parameters:
+            start_frame (int): The first frame of the range.
+            end_frame (int): The frame after the last frame of the range.
+
+        Returns:
+            numpy.ndarray: The (frames, channels) int16 samples, padded with silence if the decoder came up short.
+        """
+        from pydub.utils import get_encoder_name
+        frames = end_frame - start_frame
+        command = [
+            get_encoder_name(), '-v', 'error',
+            '-ss', '{:.6f}'.format(start_frame / self.frame_rate),
+            '-i', self.file_path,
+            '-t', '{:.6f}'.format(frames / self.frame_rate),
+            '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ac', str(self.channels), '-ar', str(self.frame_rate),
+            '-',
+        ]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        decoded = pcm.to_array(result.stdout[:frames * self.channels * 2], 2, self.channels)
+        if len(decoded) < frames:
+            decoded = np.concatenate([decoded, np.zeros((frames - len(decoded), self.channels), dtype=np.int16)])
+        return decoded
+
+
+def open_stream(file_path):
+    """
+    Open an audio file for streaming: memory-mapped if it is a WAV file, chunk-decoded otherwise.
+
+    Parameters:
+        file_path (str): The path to the audio file.
+
+    Returns:
+        WavReader or ChunkedDecoder: The reader for the file.
+    """
+    try:
+        return WavReader(file_path)
+    except (ValueError, struct.error):
+        return ChunkedDecoder(file_path)
@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _NullSpan:
+    """The span handed out while tracing is off; entering and leaving it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """A span being timed; records itself in its tracer when it ends."""
+
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Tracer:
+    """
+    Records how long each stage of the playback path takes.
+
+    Stages are timed with monotonic timestamps, either around a block with span or between two
+    timestamps taken on different threads with record. Recent durations of every stage are kept
+    for percentile statistics, and recent spans for export to a trace viewer. While the tracer is
+    off, span returns a shared object that does nothing and record returns immediately.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        history (int): The number of recent durations kept per stage.
+    """
+
+    def __init__(self, enabled=False, history=1000, max_events=100000):
+        """
+        The constructor for Tracer class.
+
+        Parameters:
+            enabled (bool): Whether spans are recorded from the start.
+            history (int): The number of recent durations kept per stage for the statistics.
+            max_events (int): The number of recent spans kept for export.
+        """
+        self.enabled = enabled
+        self.history = history
+        self._durations = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def enable(self):
+        """Start recording spans."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording spans; what was recorded so far is kept."""
+        self.enabled = False
+
+    def clear(self):
+        """Forget all recorded spans."""
+        with self._lock:
+            self._durations.clear()
+            self._events.clear()
+
+    def span(self, name):
+        """
+        Time a block of code as a stage, e.g. with tracer.span('render'): ...
+
+        Parameters:
+            name (str): The name of the stage.
+
+        Returns:
+            object: A context manager timing the block.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def now(self):
+        """
+        Return a timestamp for record, or 0 while the tracer is off.
+
+        Returns:
+            int: The monotonic time in nanoseconds.
+        """
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def record(self, name, start, end):
+        """
+        Record a stage between two timestamps, which may have been taken on different threads.
+
+        Parameters:
+            name (str): The name of the stage.
+            start (int): The start, from now or time.perf_counter_ns.
+            end (int): The end, from now or time.perf_counter_ns.
+        """
+        if not self.enabled or not start:
+            return
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.history)
+            durations.append(end - start)
+            self._events.append((name, start, end - start, threading.get_ident()))
+
+    def stats(self):
+        """
+        Return the statistics of the recent durations of every stage.
+
+        Returns:
+            dict: The count, p50, p95, p99 and max duration in milliseconds of every stage.
+        """
+        with self._lock:
+            durations = {name: np.array(values, dtype=np.float64) / 1e6 for name, values in self._durations.items()}
+        stats = {}
+        for name, values in durations.items():
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                stats[name] = {'count': len(values), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': values.max()}
+        return stats
+
+    def format_stats(self):
+        """
+        Return the statistics as a text table.
+
+        Returns:
+            str: One line per stage.
+        """
+        lines = ["{:<18} {:>6} {:>8} {:>8} {:>8} {:>8}".format("stage", "count", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+        for name, stage in sorted(self.stats().items()):
+            lines.append("{:<18} {:>6} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}".format(
+                name, stage['count'], stage['p50_ms'], stage['p95_ms'], stage['p99_ms'], stage['max_ms']))
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, file_path):
+        """
+        Write the recent spans in the Chrome trace event format, as opened by chrome://tracing or Perfetto.
+
+        Parameters:
+            file_path (str): The path of the JSON file.
+        """
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace_events = [{
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self._origin) / 1000.0,
+            'dur': duration / 1000.0,
+            'pid': pid,
+            'tid': thread_id,
+        } for name, start, duration, thread_id in events]
+        with open(file_path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+# The tracer used throughout the application; set SLICER_TRACE=1 to turn it on at startup
+tracer = Tracer(enabled=bool(os.environ.get('SLICER_TRACE')))
@@ -0,0 +1,79 @@
+import hashlib
+import os
+
+CHUNK_SIZE = 1024 * 1024
+
+class LoadCancelled(Exception):
+    """Raised when loading an audio file is cancelled by the user."""
+
+
+def content_hash(file_path, progress=None, is_cancelled=None):
+    """
+    Compute the SHA-256 hash of a file's content, reading it in chunks.
+
+    Parameters:
+        file_path (str): The path to the file.
+        progress (callable): Optional function called with the fraction of the file read.
+        is_cancelled (callable): Optional function returning True to abort hashing.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    total = os.path.getsize(file_path) or 1
+    done = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            if is_cancelled is not None and is_cancelled():
+                raise LoadCancelled()
+            digest.update(chunk)
+            done += len(chunk)
+            if progress is not None:
+                progress(done / total)
+    return digest.hexdigest()
+
+
+def store_upload(file_path, upload_folder='upload', progress=None, is_cancelled=None):
+    """
+    Copy a file into the upload folder under its content hash, unless it is already there.
+
+    Parameters:
+        file_path (str): The path to the file to upload.
+        upload_folder (str): The folder holding uploaded files.
+        progress (callable): Optional function called with the fraction of the work done.
+        is_cancelled (callable): Optional function returning True to abort the upload.
+
+    Returns:
+        str: The path to the uploaded file.
+    """
+    hash_progress = (lambda fraction: progress(fraction / 2)) if progress is not None else None
+    file_hash = content_hash(file_path, hash_progress, is_cancelled)
+
+    if not os.path.exists(upload_folder):
+        os.makedirs(upload_folder)
+
+    extension = os.path.splitext(file_path)[1].lower()
+    stored_path = os.path.join(upload_folder, file_hash + extension)
+
+    # Re-uploading the same content is a no-op
+    if not os.path.exists(stored_path):
+        partial_path = stored_path + '.part'
+        total = os.path.getsize(file_path) or 1
+        copied = 0
+        try:
+            with open(file_path, 'rb') as src, open(partial_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    if is_cancelled is not None and is_cancelled():
+                        raise LoadCancelled()
+                    dst.write(chunk)
+                    copied += len(chunk)
+                    if progress is not None:
+                        progress(0.5 + copied / total / 2)
+            os.replace(partial_path, stored_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    if progress is not None:
+        progress(1.0)
+    return stored_path
@@ -0,0 +1,214 @@
+from PyQt5.QtCore import QLineF, QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen
+from PyQt5.QtWidgets import QWidget
+
+# Slice regions alternate between these colors so neighbouring slices stay apart
+SLICE_COLORS = (QColor(70, 130, 180, 60), QColor(255, 165, 0, 60))
+WAVEFORM_COLOR = QColor(40, 40, 40)
+BACKGROUND_COLOR = QColor(250, 250, 250)
+
+
+class PeakBuilder(QThread):
+    """
+    A worker thread that builds the waveform peaks and then the loudness index of an audio sample off the GUI thread.
+
+    Signals:
+        built (object): The AudioSample, emitted once its peak_pyramid is ready.
+        measured (object): The AudioSample, emitted once its loudness_index is ready.
+        failed (str): The error message, emitted when building fails.
+    """
+
+    built = pyqtSignal(object)
+    measured = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, audio_sample, parent=None):
+        """
+        The constructor for PeakBuilder class.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample to build the peaks of.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+        self.audio_sample = audio_sample
+
+    def run(self):
+        """Build the peaks, or map them from the decode cache of the sample, then the loudness index."""
+        try:
+            pyramid = self.audio_sample.build_peak_pyramid(is_cancelled=self.isInterruptionRequested)
+            if pyramid is None:
+                return
+            self.built.emit(self.audio_sample)
+            if self.audio_sample.build_loudness_index(is_cancelled=self.isInterruptionRequested) is not None:
+                self.measured.emit(self.audio_sample)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class WaveformView(QWidget):
+    """
+    A waveform overview of an audio sample with its slices drawn as colored regions.
+
+    Only the visible window is drawn, from the coarsest peak level that still resolves one
+    pixel, so painting costs the same at any zoom and for any file length. The wheel zooms
+    around the cursor and dragging pans.
+
+    Attributes:
+        audio_sample (AudioSample): The audio sample shown, if any.
+        view_start (float): The first frame of the visible window.
+        view_end (float): The frame after the last frame of the visible window.
+        min_view_frames (int): The narrowest visible window in frames.
+    """
+
+    def __init__(self, parent=None, min_view_frames=64):
+        """
+        The constructor for WaveformView class.
+
+        Parameters:
+            parent (QWidget): The parent widget.
+            min_view_frames (int): The narrowest visible window in frames.
+        """
+        super().__init__(parent)
+        self.audio_sample = None
+        self.view_start = 0.0
+        self.view_end = 0.0
+        self.min_view_frames = min_view_frames
+        self._drag_x = None
+        self._peaks_key = None
+        self._peak_lines = []
+        self.setMinimumHeight(120)
+        self.setFocusPolicy(Qt.NoFocus)
+
+    def set_audio_sample(self, audio_sample):
+        """
+        Show an audio sample, zoomed out to its full length.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample, or None to clear the view.
+        """
+        self.audio_sample = audio_sample
+        self.view_start = 0.0
+        self.view_end = float(audio_sample.frame_count) if audio_sample is not None else 0.0
+        self._peaks_key = None
+        self.update()
+
+    def peaks_ready(self, audio_sample):
+        """
+        Repaint once the peaks of an audio sample have been built.
+
+        Parameters:
+            audio_sample (AudioSample): The audio sample whose peaks are ready.
+        """
+        if audio_sample is self.audio_sample:
+            self._peaks_key = None
+            self.update()
+
+    def set_view(self, start_frame, end_frame):
+        """
+        Set the visible window, keeping it within the audio and at least min_view_frames wide.
+
+        Parameters:
+            start_frame (float): The first frame of the window.
+            end_frame (float): The frame after the last frame of the window.
+        """
+        if self.audio_sample is None:
+            return
+        total = float(self.audio_sample.frame_count)
+        span = min(max(end_frame - start_frame, float(self.min_view_frames)), total)
+        start = min(max(start_frame, 0.0), total - span)
+        self.view_start, self.view_end = start, start + span
+        self.update()
+
+    def frame_to_x(self, frame):
+        """
+        Return the horizontal position of a frame in the visible window.
+
+        Parameters:
+            frame (float): The frame offset.
+
+        Returns:
+            float: The x coordinate in pixels.
+        """
+        return (frame - self.view_start) * self.width() / max(self.view_end - self.view_start, 1.0)
+
+    def x_to_frame(self, x):
+        """
+        Return the frame at a horizontal position in the visible window.
+
+        Parameters:
+            x (float): The x coordinate in pixels.
+
+        Returns:
+            float: The frame offset.
+        """
+        return self.view_start + x * (self.view_end - self.view_start) / max(self.width(), 1)
+
+    def paintEvent(self, event):
+        """Draw the slice regions and the waveform of the visible window."""
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND_COLOR)
+        if self.audio_sample is None:
+            return
+
+        height = self.height()
+        slices = self.audio_sample.slices
+        for i in slices.visible(self.view_start, self.view_end):
+            left = self.frame_to_x(slices.start_frames[i])
+            right = self.frame_to_x(slices.end_frames[i])
+            painter.fillRect(int(left), 0, max(int(right - left), 1), height, SLICE_COLORS[i % len(SLICE_COLORS)])
+            painter.drawText(int(left) + 3, 14, str(i + 1))
+
+        if self.audio_sample.peak_pyramid is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Building waveform...")
+            return
+        painter.setPen(QPen(WAVEFORM_COLOR, 0))
+        painter.drawLines(self.peak_lines())
+
+    def peak_lines(self):
+        """
+        Return one vertical line per pixel column spanning the peaks of the visible window.
+
+        The lines are kept until the window or the widget size changes, so repaints for slice
+        edits do not read the peaks again.
+
+        Returns:
+            list: The QLineF of every column.
+        """
+        width, height = max(self.width(), 1), self.height()
+        key = (self.view_start, self.view_end, width, height)
+        if key != self._peaks_key:
+            frames = self.audio_sample.audio_data if self.audio_sample.audio_data is not None else self.audio_sample.stream
+            peaks = self.audio_sample.peak_pyramid.peaks(self.view_start, self.view_end, width, frames)
+            middle = height / 2.0
+            ys = middle - peaks.clip(-1.0, 1.0) * (middle - 1)
+            self._peak_lines = [QLineF(x, ys[x, 0], x, ys[x, 1]) for x in range(width)]
+            self._peaks_key = key
+        return self._peak_lines
+
+    def wheelEvent(self, event):
+        """Zoom in or out around the cursor."""
+        if self.audio_sample is None:
+            return
+        steps = event.angleDelta().y() / 120.0
+        factor = 0.8 ** steps
+        anchor = self.x_to_frame(event.pos().x())
+        self.set_view(anchor - (anchor - self.view_start) * factor, anchor + (self.view_end - anchor) * factor)
+
+    def mousePressEvent(self, event):
+        """Start panning."""
+        if event.button() == Qt.LeftButton:
+            self._drag_x = event.pos().x()
+
+    def mouseMoveEvent(self, event):
+        """Pan the visible window with the cursor."""
+        if self._drag_x is None or self.audio_sample is None:
+            return
+        shift = (self._drag_x - event.pos().x()) * (self.view_end - self.view_start) / max(self.width(), 1)
+        self._drag_x = event.pos().x()
+        self.set_view(self.view_start + shift, self.view_end + shift)
+
+    def mouseReleaseEvent(self, event):
+        """Stop panning."""
+        if event.button() == Qt.LeftButton:
+            self._drag_x = None
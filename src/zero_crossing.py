@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class ZeroCrossingIndex:
+    """
+    A sorted index of the frames where audio crosses zero, for snapping slice boundaries.
+
+    The index is built once in a single pass over the audio; every lookup afterwards is a
+    binary search.
+
+    Attributes:
+        crossings (numpy.ndarray): The sorted frame offsets of the zero crossings.
+        frame_count (int): The length of the indexed audio in frames.
+    """
+
+    def __init__(self, frames, block_frames=1 << 20):
+        """
+        The constructor for ZeroCrossingIndex class.
+
+        Parameters:
+            frames (numpy.ndarray): The (frames, channels) audio, or any object sliceable like it.
+            block_frames (int): The number of frames scanned at a time.
+        """
+        self.frame_count = len(frames)
+        dtype = np.uint32 if self.frame_count < 2 ** 32 else np.int64
+        parts = []
+        previous = None
+        for start in range(0, self.frame_count, block_frames):
+            block = np.asarray(frames[start:start + block_frames])
+            mix = block.sum(axis=1, dtype=np.float32)
+            # Where the sign of the channel mix changes, the frame closer to zero is the crossing
+            if previous is not None:
+                mix = np.concatenate([previous, mix])
+                offset = start - 1
+            else:
+                offset = start
+            signs = np.signbit(mix)
+            changes = np.flatnonzero(signs[:-1] != signs[1:])
+            closer = changes + (np.abs(mix[changes + 1]) < np.abs(mix[changes]))
+            parts.append((closer + offset).astype(dtype))
+            previous = mix[-1:]
+        self.crossings = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    def nearest(self, frame, max_distance=None):
+        """
+        Find the zero crossing nearest to a frame.
+
+        Parameters:
+            frame (int): The frame offset.
+            max_distance (int): The maximum distance in frames, or None for no limit.
+
+        Returns:
+            int: The nearest zero crossing, or None if there is none within max_distance.
+        """
+        if len(self.crossings) == 0:
+            return None
+        # Search with a value of the index type, a Python int would make NumPy copy the whole index
+        position = int(np.searchsorted(self.crossings, self.crossings.dtype.type(min(max(frame, 0), np.iinfo(self.crossings.dtype).max))))
+        candidates = self.crossings[max(position - 1, 0):position + 1]
+        best = int(candidates[np.argmin(np.abs(candidates.astype(np.int64) - frame))])
+        if max_distance is not None and abs(best - frame) > max_distance:
+            return None
+        return best
+
+    def is_crossing(self, frame):
+        """
+        Tell whether a frame is a zero crossing (or the very start or end of the audio).
+
+        Parameters:
+            frame (int): The frame offset.
+
+        Returns:
+            bool: True if the frame is a clean place to cut.
+        """
+        return frame <= 0 or frame >= self.frame_count or self.nearest(frame, 0) is not None
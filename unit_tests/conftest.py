@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Run headless: Qt renders offscreen and pygame's dummy audio driver plays nothing
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def qt_application():
+    """The QApplication widgets need, created once for the whole session."""
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    yield app
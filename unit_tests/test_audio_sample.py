@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+import pcm
+from audio_sample import AudioSample
+
+SAMPLE_WAV = os.path.join(os.path.dirname(__file__), '..', 'sample2.wav')
+
+
+def test_slices_are_zero_copy_views():
+    sample = AudioSample(SAMPLE_WAV)
+    sample.create_slices(4)
+    view = sample.get_slice_view(1)
+    assert np.shares_memory(view, sample.audio_data)
+    assert view.shape == (sample.slices[1]['end_frame'] - sample.slices[1]['start_frame'], sample.channels)
+
+
+def test_adjust_slice_moves_frame_offsets():
+    sample = AudioSample(SAMPLE_WAV, snap_to_zero_crossings=False)
+    sample.create_slices(2)
+    start_frame = sample.slices[0]['start_frame']
+    sample.adjust_slice(0, start_adjust=100, pitch_shift=-3)
+    assert sample.slices[0]['start_frame'] == start_frame + sample.ms_to_frame(100)
+    assert sample.slices[0]['pitch_shift'] == -3
+    with pytest.raises(ValueError):
+        sample.adjust_slice(0, end_adjust=sample.duration_ms)
+
+
+def crossing_frames(sample):
+    """The frames next to every sign change of the channel mix, found without the index."""
+    mix = np.asarray(sample.audio_data).sum(axis=1, dtype=np.float32)
+    changes = np.flatnonzero(np.signbit(mix[:-1]) != np.signbit(mix[1:]))
+    return np.union1d(changes, changes + 1)
+
+
+def test_boundaries_snap_to_zero_crossings():
+    adjustments = [(1, 37)]
+    sample = AudioSample(SAMPLE_WAV)
+    unsnapped = AudioSample(SAMPLE_WAV, snap_to_zero_crossings=False)
+    for each in (sample, unsnapped):
+        each.create_slices(4)
+        for slice_index, start_adjust in adjustments:
+            each.adjust_slice(slice_index, start_adjust=start_adjust)
+    crossings = crossing_frames(sample)
+    tolerance = int(sample.snap_tolerance_ms * sample.frame_rate / 1000.0)
+    for slice_info, raw_info in zip(sample.slices, unsnapped.slices):
+        for key in ('start_frame', 'end_frame'):
+            frame, raw = slice_info[key], raw_info[key]
+            if raw in (0, sample.frame_count):
+                assert frame == raw
+            elif np.any(np.abs(crossings - raw) <= tolerance):
+                assert frame in crossings
+                assert abs(frame - raw) <= tolerance
+            else:
+                assert frame == raw
+
+
+def test_boundaries_without_nearby_crossing_are_faded(tmp_path):
+    # A constant level never crosses zero, so boundaries stay put and are faded instead
+    pcm.write_wav(str(tmp_path / 'dc.wav'), np.full((8000, 2), 4000, dtype=np.int16), 8000)
+    sample = AudioSample(str(tmp_path / 'dc.wav'))
+    sample.create_slices(4)
+    assert [slice_info['start_frame'] for slice_info in sample.slices] == [0, 2000, 4000, 6000]
+    fade_frames = int(sample.fade_ms * sample.frame_rate / 1000.0)
+    assert sample.edge_fades(2000, 4000) == (fade_frames, fade_frames)
+    assert sample.edge_fades(0, 2000) == (0, fade_frames)
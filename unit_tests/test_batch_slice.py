@@ -0,0 +1,38 @@
+import io
+import json
+import wave
+
+import numpy as np
+
+import pcm
+from batch_slice import find_audio_files, output_names, process_file, run_batch
+
+
+def test_process_file_writes_slices_and_manifest(tmp_path):
+    samples = (np.sin(np.arange(8000 * 2) * 0.05)[:, None] * 10000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 8000)
+
+    manifest = process_file(str(tmp_path / 'loop.wav'), str(tmp_path / 'out'), 4)
+    assert len(manifest['slices']) == 4
+    with open(tmp_path / 'out' / 'manifest.json') as f:
+        assert json.load(f)['slices'] == manifest['slices']
+    with wave.open(str(tmp_path / 'out' / 'slice_001.wav'), 'rb') as f:
+        assert f.getnframes() == manifest['slices'][0]['end_frame'] - manifest['slices'][0]['start_frame']
+
+
+def test_repeated_stems_get_distinct_output_folders(tmp_path):
+    for folder in ('a', 'b'):
+        (tmp_path / folder).mkdir()
+        pcm.write_wav(str(tmp_path / folder / 'kick.wav'), np.zeros((800, 1), dtype=np.int16), 8000)
+    pcm.write_wav(str(tmp_path / 'snare.wav'), np.zeros((800, 1), dtype=np.int16), 8000)
+
+    paths = find_audio_files([str(tmp_path)])
+    names = output_names(paths)
+    assert len(paths) == 3
+    assert len(set(names.values())) == 3
+    assert names[str(tmp_path / 'snare.wav')] == 'snare'
+
+    out = io.StringIO()
+    summary = run_batch(paths, str(tmp_path / 'out'), 2, workers=2, out=out)
+    assert summary['done'] == 3 and summary['failed'] == 0
+    assert len(out.getvalue().splitlines()) == 3
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from decode_cache import DecodeCache
+
+
+def make_decoder(calls):
+    def decode(file_path):
+        calls.append(file_path)
+        return np.arange(2000, dtype=np.int16).reshape(-1, 2), 44100, 2
+    return decode
+
+
+def test_warm_load_maps_cached_pcm(tmp_path):
+    source = tmp_path / 'a.wav'
+    source.write_bytes(b'audio')
+    cache = DecodeCache(str(tmp_path / 'cache'))
+    calls = []
+
+    cold, frame_rate, sample_width = cache.load(str(source), make_decoder(calls))
+    warm, warm_rate, warm_width = cache.load(str(source), make_decoder(calls))
+    assert len(calls) == 1
+    assert isinstance(warm, np.memmap)
+    assert np.array_equal(cold, warm)
+    assert (warm_rate, warm_width) == (frame_rate, sample_width) == (44100, 2)
+    stats = cache.stats()
+    assert stats['cold_loads'] == 1 and stats['warm_loads'] == 1
+
+
+def test_eviction_keeps_cache_within_budget(tmp_path):
+    cache = DecodeCache(str(tmp_path / 'cache'), max_bytes=6000)
+    paths = []
+    for i in range(3):
+        source = tmp_path / '{}.wav'.format(i)
+        source.write_bytes(bytes([i]))
+        cache.load(str(source), make_decoder([]))
+        paths.append(cache.path_for(cache.source_hash(str(source))))
+    assert not os.path.exists(paths[0])
+    assert os.path.exists(paths[2])
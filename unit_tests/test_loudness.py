@@ -0,0 +1,131 @@
+import threading
+import time
+
+import numpy as np
+
+import pcm
+from audio_sample import AudioSample
+from loudness import SILENCE_DB, LoudnessIndex
+
+
+def sine(frame_rate, seconds, amplitude, channels=2, frequency=997.0):
+    t = np.arange(int(frame_rate * seconds)) / frame_rate
+    wave = (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return np.repeat(wave[:, None], channels, axis=1)
+
+
+def test_levels_of_a_reference_tone():
+    # A 997 Hz tone at -20 dBFS in both channels of a stereo file reads -20 LUFS under BS.1770
+    stats = LoudnessIndex.build(sine(48000, 3, 0.1), 48000).stats(0, 3 * 48000)
+    assert abs(stats['loudness_lufs'] + 20.0) < 0.05
+    assert abs(stats['rms_db'] + 23.01) < 0.01
+    assert abs(stats['peak_db'] + 20.0) < 0.01
+
+
+def test_ranges_match_a_direct_scan():
+    rng = np.random.default_rng(0)
+    frames = (rng.standard_normal((50000, 2)) * np.linspace(0.01, 0.5, 50000)[:, None]).astype(np.float32)
+    index = LoudnessIndex.build(frames, 44100, block_frames=128, chunk_frames=4096)
+    starts, ends = np.array([0, 1280, 4097, 30000, 200, 120, 49990]), np.array([50000, 2560, 9000, 30001, 250, 140, 50000])
+    stats = index.stats(starts, ends)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        part = frames[start:end].astype(np.float64)
+        assert abs(stats['rms_db'][i] - 10 * np.log10(np.mean(part ** 2))) < 1e-4
+        assert abs(stats['peak_db'][i] - 20 * np.log10(np.abs(part).max())) < 1e-4
+    assert index.stats(10, 10)['loudness_lufs'] == SILENCE_DB
+
+
+def test_peaks_of_random_ranges_match_a_direct_scan():
+    # 391 blocks, an odd count at several levels of the pyramid
+    rng = np.random.default_rng(1)
+    frames = (rng.standard_normal((50000, 1)) * rng.uniform(0, 1, (50000, 1))).astype(np.float32)
+    index = LoudnessIndex.build(frames, 44100, block_frames=128, chunk_frames=4096)
+    assert sum(len(level) for level in index._peak_levels) < 2 * 391 + 10
+    starts = rng.integers(0, 50000, 500)
+    ends = np.minimum(starts + rng.integers(1, 50000, 500), 50000)
+    peaks = index.stats(starts, ends)['peak_db']
+    expected = [20 * np.log10(np.abs(frames[start:end]).max()) for start, end in zip(starts, ends)]
+    assert np.allclose(peaks, expected, atol=1e-4)
+
+
+class CountingReader:
+    """Stands in for a stream, counting the reads."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.reads = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return self.frames[key]
+
+
+def test_streamed_edges_are_read_once_per_boundary():
+    rng = np.random.default_rng(1)
+    frames = (rng.standard_normal((100000, 2)) * 0.1).astype(np.float32)
+    reader = CountingReader(frames)
+    index = LoudnessIndex.build(reader, 44100)
+    bounds = np.linspace(0, 100000, 101).astype(np.int64) + 7
+    bounds[-1] = 100000
+    reader.reads = 0
+    stats = index.stats(bounds[:-1], bounds[1:])
+    # Neighbouring slices share their boundary block
+    assert reader.reads <= len(bounds)
+    expected = LoudnessIndex.build(frames, 44100).stats(bounds[:-1], bounds[1:])
+    for name in stats:
+        assert np.allclose(stats[name], expected[name])
+
+
+def test_edges_between_levels_are_exact():
+    # A slice ending inside a block where the level jumps must not pick up the louder part
+    frames = np.concatenate([sine(8000, 1, 0.05), sine(8000, 1, 0.5)])
+    index = LoudnessIndex.build(frames, 8000)
+    assert abs(index.stats(0, 8000)['loudness_lufs'] - LoudnessIndex.build(frames[:8000], 8000).stats(0, 8000)['loudness_lufs']) < 0.01
+
+
+def test_normalized_render(tmp_path):
+    frames = np.concatenate([sine(8000, 1, 0.05), sine(8000, 1, 0.5)])
+    pcm.write_wav(str(tmp_path / 'levels.wav'), frames, 8000)
+    sample = AudioSample(str(tmp_path / 'levels.wav'), snap_to_zero_crossings=False)
+    sample.create_slices(2)
+    quiet, loud = sample.loudness_stats(0), sample.loudness_stats(1)
+    assert loud['loudness_lufs'] - quiet['loudness_lufs'] > 19
+
+    sample.normalize_lufs = -14.0
+    levels = [LoudnessIndex.build(sample.render_slice(i), 8000).stats(0, 8000) for i in range(2)]
+    assert abs(levels[0]['loudness_lufs'] - levels[1]['loudness_lufs']) < 0.1
+    # Raising the quiet slice to the target would clip, so it is limited to full scale
+    assert max(level['peak_db'] for level in levels) <= 0.01
+    assert np.array_equal(sample.render_slice(0, normalize=False), sample.get_slice_view(0))
+
+
+def test_renders_are_normalized_once_the_index_is_built(tmp_path, monkeypatch):
+    frames = np.concatenate([sine(8000, 1, 0.05), sine(8000, 1, 0.5)])
+    pcm.write_wav(str(tmp_path / 'levels.wav'), frames, 8000)
+    sample = AudioSample(str(tmp_path / 'levels.wav'), snap_to_zero_crossings=False)
+    sample.create_slices(2)
+    sample.normalize_lufs = -14.0
+    # A render before the index is built plays the slice as it is, instead of building the index
+    assert np.array_equal(sample.render_slice(0), sample.get_slice_view(0))
+    assert sample.loudness_index is None and sample.applied_lufs is None
+
+    builds = []
+    build = LoudnessIndex.build
+
+    def slow_build(*args, **kwargs):
+        builds.append(1)
+        time.sleep(0.05)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(LoudnessIndex, 'build', slow_build)
+    threads = [threading.Thread(target=sample.build_loudness_index) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert sample.applied_lufs == -14.0
+    assert not np.array_equal(sample.render_slice(0), sample.get_slice_view(0))
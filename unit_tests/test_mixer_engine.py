@@ -0,0 +1,36 @@
+import os
+import time
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from mixer_engine import CHOKE, RETRIGGER, MixerEngine
+
+
+def wait_for_dispatch(engine, count):
+    deadline = time.time() + 2
+    while engine.latency_stats()['count'] < count and time.time() < deadline:
+        time.sleep(0.005)
+
+
+def test_choke_and_retrigger_voices():
+    engine = MixerEngine(voices=8)
+    engine.start()
+    sound = pygame.mixer.Sound(buffer=np.zeros((engine.mixer_format[0], engine.mixer_format[2]), dtype=np.int16))
+    try:
+        engine.trigger(sound, 0, CHOKE)
+        engine.trigger(sound, 0, CHOKE)
+        engine.trigger(sound, 1, RETRIGGER)
+        engine.trigger(sound, 1, RETRIGGER)
+        wait_for_dispatch(engine, 4)
+        busy = sum(pygame.mixer.Channel(i).get_busy() for i in range(8))
+        assert busy == 3
+
+        stats = engine.latency_stats()
+        assert stats['count'] == 4
+        assert stats['p99_ms'] >= stats['buffer_ms'] > 0
+    finally:
+        engine.stop_all()
+        engine.shutdown()
@@ -0,0 +1,43 @@
+import numpy as np
+
+import onset_detection
+
+FRAME_RATE = 22050
+
+
+def click_track(bpm=120, seconds=8, first=0.3):
+    frames = np.zeros((FRAME_RATE * seconds, 1), dtype=np.float32)
+    period = int(FRAME_RATE * 60 / bpm)
+    hits = np.arange(int(first * FRAME_RATE), len(frames) - 1000, period)
+    decay = np.exp(-np.arange(1000) / 150.0).astype(np.float32)
+    noise = np.random.default_rng(0).standard_normal(1000).astype(np.float32)
+    for hit in hits:
+        frames[hit:hit + 1000, 0] += decay * noise * 0.5
+    return frames, hits, period
+
+
+def test_onsets_land_on_transients():
+    frames, hits, _ = click_track()
+    envelope = onset_detection.onset_envelope(frames, FRAME_RATE)
+    positions, _ = onset_detection.pick_onsets(envelope, FRAME_RATE)
+    assert len(positions) == len(hits)
+    assert np.abs(positions - hits).max() <= 512
+
+
+def test_tempo_and_beats():
+    frames, hits, period = click_track()
+    envelope = onset_detection.onset_envelope(frames, FRAME_RATE)
+    steps = onset_detection.estimate_tempo(envelope, FRAME_RATE)
+    assert abs(steps * 512 - period) <= 512
+    beats = onset_detection.track_beats(envelope, steps) * 512
+    assert np.abs(beats[:, None] - hits[None, :]).min(axis=1).max() <= 512
+
+
+def test_detect_boundaries_returns_requested_count():
+    frames, hits, _ = click_track()
+    for mode in (onset_detection.ONSET, onset_detection.BEAT):
+        boundaries = onset_detection.detect_boundaries(frames, FRAME_RATE, 4, mode)
+        assert len(boundaries) == 4 and boundaries[0] == 0
+        assert boundaries == sorted(boundaries)
+    silent = np.zeros((FRAME_RATE, 2), dtype=np.int16)
+    assert onset_detection.detect_boundaries(silent, FRAME_RATE, 4) == [0, FRAME_RATE // 4, FRAME_RATE // 2, 3 * FRAME_RATE // 4]
@@ -0,0 +1,27 @@
+import numpy as np
+
+import pcm
+
+
+def test_to_array_widens_8bit():
+    frames = pcm.to_array(bytes([0, 128, 255, 128]), 1, 2)
+    assert frames.dtype == np.int16
+    assert frames.tolist() == [[-32768, 0], [32512, 0]]
+
+
+def test_resample_and_mixer_conversion():
+    frames = np.zeros((1000, 1), dtype=np.int16)
+    resampled = pcm.resample(frames, 0.5)
+    assert len(resampled) == 500
+    converted = pcm.from_float(pcm.match_channels(resampled, 2), -16)
+    assert converted.dtype == np.int16 and converted.shape == (500, 2)
+    assert converted.flags['C_CONTIGUOUS']
+
+
+def test_match_channels_keeps_sample_type_and_scale():
+    mono = np.array([[3000], [-3000]], dtype=np.int16)
+    assert pcm.match_channels(mono, 2).tolist() == [[3000, 3000], [-3000, -3000]]
+    assert pcm.match_channels(mono, 2).dtype == np.int16
+    stereo = np.array([[3000, 1000]], dtype=np.int16)
+    assert pcm.match_channels(stereo, 1).tolist() == [[2000]]
+    assert pcm.match_channels(stereo, 1).dtype == np.int16
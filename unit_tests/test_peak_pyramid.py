@@ -0,0 +1,52 @@
+import numpy as np
+
+from decode_cache import DecodeCache
+from peak_pyramid import PeakPyramid
+
+
+def brute_force_peaks(samples, start, end, width):
+    mono_low, mono_high = samples.min(axis=1), samples.max(axis=1)
+    edges = np.linspace(start, end, width + 1).astype(int)
+    return np.array([[mono_low[a:b].min(), mono_high[a:b].max()] for a, b in zip(edges[:-1], edges[1:])])
+
+
+def test_levels_shrink_by_factor():
+    samples = np.zeros((100000, 2), dtype=np.float32)
+    pyramid = PeakPyramid.build(samples, base_block=100, factor=4, block_frames=3000)
+    assert [len(level) for level in pyramid.levels] == [1000, 250, 63, 16, 4, 1]
+
+
+def test_peaks_match_brute_force_at_any_zoom():
+    rng = np.random.default_rng(1)
+    samples = rng.uniform(-1, 1, (64000, 2)).astype(np.float32)
+    pyramid = PeakPyramid.build(samples, base_block=64, factor=4, block_frames=4096)
+    # Whole file: every column covers whole buckets of some level
+    assert np.allclose(pyramid.peaks(0, 64000, 250), brute_force_peaks(samples, 0, 64000, 250))
+    # Zoomed in past the finest level, peaks come from the samples
+    assert np.allclose(pyramid.peaks(1000, 1100, 50, samples), brute_force_peaks(samples, 1000, 1100, 50))
+
+
+def test_columns_past_the_end_are_empty():
+    samples = np.ones((1000, 1), dtype=np.float32)
+    pyramid = PeakPyramid.build(samples, base_block=10)
+    peaks = pyramid.peaks(500, 1500, 10)
+    assert peaks[:5].tolist() == [[1.0, 1.0]] * 5
+    assert peaks[5:].tolist() == [[0.0, 0.0]] * 5
+
+
+def test_peaks_are_cached_next_to_decoded_audio(tmp_path):
+    source = tmp_path / 'a.raw'
+    source.write_bytes(b'audio')
+    cache = DecodeCache(str(tmp_path / 'cache'))
+    samples = np.linspace(-1, 1, 5000, dtype=np.float32).reshape(-1, 1)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return PeakPyramid.build(samples, base_block=16)
+
+    first = cache.load_peaks(str(source), build)
+    second = cache.load_peaks(str(source), build)
+    assert len(builds) == 1
+    assert isinstance(second.levels[0], np.memmap)
+    assert all(np.array_equal(a, b) for a, b in zip(first.levels, second.levels))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import pitch_shift
+
+
+def sine(frequency, seconds=1.0, frame_rate=22050):
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)[:, None], frame_rate
+
+
+def dominant_frequency(frames, frame_rate):
+    spectrum = np.abs(np.fft.rfft(frames[:, 0]))
+    return np.argmax(spectrum) * frame_rate / len(frames)
+
+
+def test_resample_shift_changes_duration():
+    frames, _ = sine(440)
+    assert len(pitch_shift.shift(frames, 12)) == len(frames) // 2
+
+
+@pytest.mark.parametrize('semitones', [-12, 7, 24])
+def test_preserve_duration_shifts_pitch_only(semitones):
+    frames, frame_rate = sine(440)
+    shifted = pitch_shift.shift(frames, semitones, pitch_shift.PRESERVE_DURATION)
+    assert len(shifted) == len(frames)
+    expected = 440 * pitch_shift.semitone_ratio(semitones)
+    assert abs(dominant_frequency(shifted, frame_rate) - expected) < expected * 0.02
+    middle = shifted[len(shifted) // 4:3 * len(shifted) // 4]
+    assert 0.4 < np.abs(middle).max() < 0.6
+
+
+def test_out_of_range_shift_is_rejected():
+    frames, _ = sine(440, 0.1)
+    with pytest.raises(ValueError):
+        pitch_shift.shift(frames, 25)
@@ -0,0 +1,20 @@
+import numpy as np
+
+import pcm
+from audio_sample import AudioSample
+from play_control import PlayControl
+
+
+def test_mono_slice_at_mixer_rate_keeps_its_level(tmp_path):
+    # The whole file needs no fades and no resampling, so it reaches the mixer as int16
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 3000).astype(np.int16)
+    pcm.write_wav(str(tmp_path / 'mono.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'mono.wav'))
+    play_control = PlayControl()
+    try:
+        sound, _ = play_control.render_slice(sample, 0, len(samples), 0)
+        played = np.frombuffer(sound.get_raw(), dtype=np.int16).reshape(-1, 2)
+    finally:
+        play_control.mixer.shutdown()
+    assert 2900 <= np.abs(played).max() <= 3000
+    assert np.array_equal(played[:, 0], played[:, 1])
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+import pcm
+import project_file
+from audio_sample import AudioSample
+from project_file import ProjectFile, SaveCancelled, open_project
+from upload_store import store_upload
+
+
+@pytest.fixture
+def uploaded_sample(tmp_path):
+    samples = (np.sin(np.arange(8000 * 4) * 0.01)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 8000)
+    upload_folder = str(tmp_path / 'upload')
+    sample = AudioSample(store_upload(str(tmp_path / 'loop.wav'), upload_folder))
+    sample.create_slices(4)
+    return sample, upload_folder
+
+
+def test_project_round_trip(tmp_path, uploaded_sample):
+    sample, upload_folder = uploaded_sample
+    sample.adjust_slice(2, pitch_shift=3)
+    ProjectFile(str(tmp_path / 'a.tcp')).save(sample, include_audio=True)
+
+    opened, project = open_project(str(tmp_path / 'a.tcp'), upload_folder=upload_folder)
+    assert [s.to_dict() for s in opened.slices] == [s.to_dict() for s in sample.slices]
+    # Stored slices play from the project file without reading the source
+    stored = opened.render_slice(2)
+    assert isinstance(stored, np.memmap)
+    assert np.array_equal(stored, pcm.from_float(pcm.to_float(sample.render_slice(2)), -16))
+
+
+def test_saving_an_edit_appends_only_what_changed(tmp_path, uploaded_sample):
+    sample, _ = uploaded_sample
+    project = ProjectFile(str(tmp_path / 'a.tcp'))
+    project.save(sample, include_audio=True)
+    size = os.path.getsize(project.path)
+
+    sample.adjust_slice(1, pitch_shift=-2)
+    project.save(sample, include_audio=True)
+    # One slice's audio plus the slice table and index, not the other three slices again
+    slice_bytes = len(sample.render_slice(1)) * sample.channels * 2
+    assert os.path.getsize(project.path) - size < slice_bytes + 4096
+    old_slice_bytes = (sample.slices[1]['end_frame'] - sample.slices[1]['start_frame']) * sample.channels * 2
+    assert project.dead_bytes >= old_slice_bytes
+
+
+def test_interrupted_save_keeps_the_previous_index(tmp_path, uploaded_sample):
+    sample, _ = uploaded_sample
+    project = ProjectFile(str(tmp_path / 'a.tcp'))
+    project.save(sample)
+    with open(project.path, 'ab') as f:
+        f.write(b'SLCS' + b'\0' * 100)
+
+    reopened = ProjectFile(project.path)
+    assert reopened.slice_table()[0].tolist() == sample.slices.start_frames.tolist()
+    sample.adjust_slice(0, pitch_shift=1)
+    reopened.save(sample)
+    assert ProjectFile(project.path).slice_table()[2].tolist() == [1, 0, 0, 0]
+
+
+def test_cancelled_save_keeps_the_previous_save(tmp_path, uploaded_sample):
+    sample, _ = uploaded_sample
+    project = ProjectFile(str(tmp_path / 'a.tcp'))
+    project.save(sample, include_audio=True)
+    size = os.path.getsize(project.path)
+
+    sample.adjust_slice(1, pitch_shift=-2)
+    fractions = []
+    with pytest.raises(SaveCancelled):
+        project.save(sample, include_audio=True, progress=fractions.append, is_cancelled=lambda: len(fractions) == 2)
+    assert os.path.getsize(project.path) == size
+    assert ProjectFile(project.path).slice_table()[2].tolist() == [0, 0, 0, 0]
+
+    with pytest.raises(SaveCancelled):
+        ProjectFile(str(tmp_path / 'b.tcp')).save(sample, include_audio=True, is_cancelled=lambda: True)
+    assert not os.path.exists(str(tmp_path / 'b.tcp'))
+
+
+def test_only_large_sources_are_streamed(tmp_path, uploaded_sample, monkeypatch):
+    sample, upload_folder = uploaded_sample
+    ProjectFile(str(tmp_path / 'a.tcp')).save(sample)
+    assert open_project(str(tmp_path / 'a.tcp'), upload_folder=upload_folder)[0].stream is None
+    monkeypatch.setattr(project_file, 'STREAMING_THRESHOLD_BYTES', 1024)
+    assert open_project(str(tmp_path / 'a.tcp'), upload_folder=upload_folder)[0].stream is not None
@@ -0,0 +1,168 @@
+import time
+import wave
+
+import numpy as np
+import pytest
+
+import pcm
+from audio_sample import AudioSample
+from mixer_engine import CHOKE, RETRIGGER
+from play_control import PlayControl
+from sequencer import Pattern, PatternMixer, Sequencer, bounce, slice_renderer
+from slice_export import ExportCancelled
+
+
+def click(slice_index, length=3):
+    """A short click whose height tells the slices apart."""
+    return np.full((length, 1), (slice_index + 1) / 8, dtype=np.float32)
+
+
+def onsets(frames):
+    block = frames[:, 0]
+    return [int(i) for i in np.flatnonzero((block != 0) & (np.concatenate([[0.0], block[:-1]]) == 0))]
+
+
+def test_parse_reads_steps_rests_and_chords():
+    pattern = Pattern.parse("1 . 3+4 .")
+    assert pattern.steps == [(0,), (), (2, 3), ()]
+    assert str(pattern) == "1 . 3+4 ."
+    assert pattern.slice_indices() == [0, 2, 3]
+    with pytest.raises(ValueError):
+        Pattern.parse("1 x")
+    with pytest.raises(ValueError):
+        Pattern.parse("0 .")
+
+
+def test_steps_land_on_exact_frames_whatever_the_block_size():
+    # 7 BPM at 1000 frames per second: steps of 2142.857... frames, which must not drift
+    pattern = Pattern.parse("1 2 3 4")
+    whole = PatternMixer(pattern, 7, 1000, 1, click).mix(50000)
+    mixer = PatternMixer(pattern, 7, 1000, 1, click)
+    blocks = np.concatenate([mixer.mix(size) for size in [1, 999, 64, 3] * 1000 if mixer.position < 50000])[:50000]
+    expected = [int(np.floor(k * 60000 / 28 + 0.5)) for k in range(24)]
+    assert onsets(whole) == expected
+    assert np.array_equal(blocks, whole)
+
+
+def test_tempo_change_applies_from_next_step():
+    # Steps of 25 frames, then of 12.5 frames counted from step 2, which is still due at 50
+    mixer = PatternMixer(Pattern.parse("1"), 60, 100, 1, click)
+    first = mixer.mix(30)
+    mixer.set_tempo(120)
+    assert onsets(np.concatenate([first, mixer.mix(120)])) == [0, 25, 50, 63, 75, 88, 100, 113, 125, 138]
+
+
+def test_choke_cuts_a_slice_off_when_it_plays_again():
+    def long_click(slice_index):
+        return click(slice_index, 10)
+
+    choked = PatternMixer(Pattern.parse("1"), 60, 24, 1, long_click, CHOKE).mix(20)
+    layered = PatternMixer(Pattern.parse("1"), 60, 24, 1, long_click, RETRIGGER).mix(20)
+    assert choked.max() == pytest.approx(1 / 8)
+    assert layered.max() == pytest.approx(2 / 8)
+
+
+def test_renderer_normalizes_mono_slices_at_the_mixer_rate(tmp_path):
+    # A single slice over the whole file needs no fades or resampling, so it is read as int16
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 3000).astype(np.int16)
+    pcm.write_wav(str(tmp_path / 'mono.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'mono.wav'))
+    sample.create_slices(1)
+    rendered = slice_renderer(sample, frame_rate=44100, channels=2)(0)
+    assert rendered.dtype == np.float32 and rendered.shape == (44100, 2)
+    assert np.allclose(rendered[:, 0], samples[:, 0] / 32768.0)
+
+
+def test_sequencer_plays_the_slices_rendered_for_the_keys(tmp_path):
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(4)
+    play_control = PlayControl()
+    play_control.slice_cache.prefill(sample, [0, 1])
+    sequencer = Sequencer(play_control, block_frames=2048)
+    try:
+        for _ in range(2):
+            sequencer.start(sample, Pattern.parse("1 2 3"), 140)
+            time.sleep(0.2)
+            sequencer.stop()
+    finally:
+        play_control.mixer.shutdown()
+    # Slice 3 is rendered once by the first start and the others come from the keys' renders
+    assert play_control.slice_cache.render_count == 3
+
+
+def test_bounce_renders_loops_faster_than_real_time(tmp_path):
+    samples = (np.sin(np.arange(44100 * 4) * 0.02)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(8)
+    sample.adjust_slice(2, pitch_shift=7)
+    pattern = Pattern.parse("1 . 3 . 2+4 . 8 .")
+
+    started = time.perf_counter()
+    frames = bounce(sample, pattern, 120, str(tmp_path / 'pattern.wav'), loops=4)
+    elapsed = time.perf_counter() - started
+
+    # Four loops of eight sixteenth notes at 120 BPM last 4 seconds
+    assert frames == 4 * 44100
+    assert elapsed < 2.0
+    with wave.open(str(tmp_path / 'pattern.wav')) as f:
+        assert (f.getnframes(), f.getnchannels(), f.getframerate()) == (4 * 44100, 2, 44100)
+        written = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).reshape(-1, 2)
+    first = pcm.from_float(pcm.to_float(sample.render_slice(0))[:5512], -16)
+    assert np.array_equal(written[:len(first)], first)
+
+
+def test_cancelled_bounce_removes_its_file(tmp_path):
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 8000).astype(np.int16)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(4)
+    fractions = []
+    with pytest.raises(ExportCancelled):
+        bounce(sample, Pattern.parse("1 2 3 4"), 120, str(tmp_path / 'pattern.wav'), loops=8,
+               block_frames=4096, progress=fractions.append, is_cancelled=lambda: len(fractions) == 3)
+    assert fractions == sorted(fractions) and 0 < fractions[-1] < 1
+    assert not list(tmp_path.glob('pattern.wav*'))
+
+
+def test_sequencer_keeps_a_block_queued_until_stopped(tmp_path):
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(4)
+    play_control = PlayControl()
+    sequencer = Sequencer(play_control, block_frames=2048)
+    try:
+        sequencer.start(sample, Pattern.parse("1 2 3 4"), 140)
+        time.sleep(0.3)
+        assert sequencer.is_playing
+        assert sequencer.blocks_played >= 2
+    finally:
+        sequencer.stop()
+        play_control.mixer.shutdown()
+    assert not sequencer.is_playing
+
+
+def test_sequencer_reports_errors_and_stops(tmp_path):
+    samples = (np.sin(np.arange(44100) * 0.02)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 44100)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(4)
+    play_control = PlayControl()
+    errors = []
+    sequencer = Sequencer(play_control, block_frames=2048, on_error=errors.append)
+    try:
+        sequencer.start(sample, Pattern.parse("1 2 3 4"), 140)
+        # A pattern naming a slice that no longer exists
+        sequencer.set_pattern(Pattern.parse("9"))
+        deadline = time.perf_counter() + 5.0
+        while sequencer.is_playing and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert not sequencer.is_playing
+        assert isinstance(sequencer.error, IndexError)
+        assert len(errors) == 1
+    finally:
+        sequencer.stop()
+        play_control.mixer.shutdown()
@@ -0,0 +1,45 @@
+from slice_cache import SliceCache
+
+
+class FakeSample:
+    def __init__(self, slices):
+        self.file_path = 'fake.wav'
+        self.slices = slices
+        self.applied_lufs = None
+
+
+def fake_render(audio_sample, start, end, pitch_shift):
+    return (start, end, pitch_shift), end - start
+
+
+def test_prefill_then_hit():
+    cache = SliceCache(fake_render, max_bytes=1000)
+    sample = FakeSample([{'start_frame': 0, 'end_frame': 100, 'pitch_shift': 0}, {'start_frame': 100, 'end_frame': 200, 'pitch_shift': 2}])
+    cache.prefill(sample)
+    assert cache.get(sample, 1) == (100, 200, 2)
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 0
+    assert stats['render_count'] == 2
+    assert cache.hit_rate == 1.0
+
+
+def test_lru_eviction_respects_budget():
+    cache = SliceCache(fake_render, max_bytes=250)
+    sample = FakeSample([{'start_frame': i * 100, 'end_frame': (i + 1) * 100, 'pitch_shift': 0} for i in range(3)])
+    cache.prefill(sample, [0, 1])
+    cache.get(sample, 0)  # slice 1 is now the least recently used
+    cache.get(sample, 2)
+    assert cache.total_bytes <= 250
+    cache.get(sample, 0)
+    cache.get(sample, 1)
+    assert cache.misses == 2
+
+
+def test_invalidate_only_drops_one_slice():
+    cache = SliceCache(fake_render)
+    sample = FakeSample([{'start_frame': 0, 'end_frame': 10, 'pitch_shift': 0}, {'start_frame': 10, 'end_frame': 20, 'pitch_shift': 0}])
+    cache.prefill(sample)
+    cache.invalidate(cache.key_for(sample, sample.slices[0]))
+    cache.get(sample, 1)
+    cache.get(sample, 0)
+    assert cache.hits == 1 and cache.misses == 1
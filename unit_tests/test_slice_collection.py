@@ -0,0 +1,30 @@
+import pytest
+
+from slice_collection import SliceCollection
+
+
+def test_slices_read_like_dictionaries():
+    slices = SliceCollection(1000)
+    slices.extend([(0, 500), (500, 1250)])
+    assert len(slices) == 2
+    assert slices[1].to_dict() == {'start': 500, 'end': 1250, 'pitch_shift': 0, 'start_frame': 500, 'end_frame': 1250}
+    assert slices[-1]['end'] == 1250
+    with pytest.raises(IndexError):
+        slices[2]
+
+
+def test_edits_notify_only_the_changed_row():
+    slices = SliceCollection(1000)
+    changes, resets = [], []
+    slices.add_listener(changed=lambda first, last: changes.append((first, last)), reset=lambda: resets.append(1))
+    slices.extend([(i * 10, (i + 1) * 10) for i in range(300)])
+    slices.update(123, pitch_shift=-5)
+    assert resets == [1]
+    assert changes == [(123, 123)]
+    assert slices[123]['pitch_shift'] == -5
+
+
+def test_visible_finds_overlapping_slices():
+    slices = SliceCollection(1000)
+    slices.extend([(i * 10, (i + 1) * 10) for i in range(100)])
+    assert slices.visible(25, 41).tolist() == [2, 3, 4]
@@ -0,0 +1,118 @@
+import os
+import struct
+import wave
+
+import numpy as np
+import pytest
+from pydub.utils import which
+
+import pcm
+from audio_sample import AudioSample
+from decode_cache import DecodeCache
+from slice_export import FLAC, ExportCancelled, export_slices
+from slice_exporter import SliceExporter
+
+
+@pytest.fixture
+def sample(tmp_path):
+    samples = (np.sin(np.arange(8000 * 2) * 0.01)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 8000)
+    sample = AudioSample(str(tmp_path / 'loop.wav'))
+    sample.create_slices(4)
+    sample.adjust_slice(2, pitch_shift=12)
+    return sample
+
+
+def read_frames(path):
+    with wave.open(path) as f:
+        return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16).reshape(-1, f.getnchannels())
+
+
+def rendered_int16(sample, index):
+    return pcm.from_float(pcm.to_float(sample.render_slice(index)), -16)
+
+
+def read_cues(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    cues, labels, offset = [], [], 12
+    while offset < len(data):
+        chunk_id, size = struct.unpack_from('<4sI', data, offset)
+        body = data[offset + 8:offset + 8 + size]
+        if chunk_id == b'cue ':
+            cues = [struct.unpack_from('<II4sIII', body, 4 + 24 * i)[5] for i in range(struct.unpack_from('<I', body)[0])]
+        elif chunk_id == b'LIST' and body[:4] == b'adtl':
+            position = 4
+            while position < len(body):
+                _, label_size = struct.unpack_from('<4sI', body, position)
+                labels.append(body[position + 12:position + 8 + label_size].rstrip(b'\0').decode('utf-8'))
+                position += 8 + label_size + label_size % 2
+        offset += 8 + size + size % 2
+    return cues, labels
+
+
+def test_export_writes_every_slice_as_rendered(tmp_path, sample):
+    paths = sample.export_slices(str(tmp_path / 'out'), workers=2)
+    assert [os.path.basename(path) for path in paths] == ['slice_001.wav', 'slice_002.wav', 'slice_003.wav', 'slice_004.wav']
+    for index, path in enumerate(paths):
+        assert np.array_equal(read_frames(path), rendered_int16(sample, index))
+    assert not [name for name in os.listdir(str(tmp_path / 'out')) if name.endswith('.part')]
+
+
+@pytest.mark.parametrize('source', ['decode_cache', 'stream'])
+def test_export_renders_reopenable_sources_in_processes(tmp_path, sample, source):
+    # Sources the workers can open again are rendered in processes, from frame ranges only
+    if source == 'decode_cache':
+        reopenable = AudioSample(sample.file_path, decode_cache=DecodeCache(str(tmp_path / 'cache')))
+    else:
+        reopenable = AudioSample(sample.file_path, streaming=True)
+    reopenable.slices.extend(np.stack([sample.slices.start_frames, sample.slices.end_frames], axis=1),
+                             sample.slices.pitch_shifts)
+    reopenable.normalize_lufs = -14.0
+    paths = reopenable.export_slices(str(tmp_path / 'out'), workers=2)
+    for index, path in enumerate(paths):
+        assert np.array_equal(read_frames(path), rendered_int16(reopenable, index))
+
+
+def test_concatenated_export_marks_every_slice(tmp_path, sample):
+    path = str(tmp_path / 'all.wav')
+    export_slices(sample, path, concatenate=True, workers=3, chunk_frames=1000)
+    frames = read_frames(path)
+    rendered = [rendered_int16(sample, index) for index in range(4)]
+    assert np.array_equal(frames, np.concatenate(rendered))
+    cues, labels = read_cues(path)
+    assert cues == [0] + list(np.cumsum([len(r) for r in rendered])[:-1])
+    assert labels == ['Slice 1', 'Slice 2', 'Slice 3', 'Slice 4']
+
+
+def test_flac_export(tmp_path, sample):
+    if which('ffmpeg') is None and which('avconv') is None:
+        with pytest.raises(RuntimeError):
+            sample.export_slices(str(tmp_path / 'out'), FLAC)
+        return
+    paths = sample.export_slices(str(tmp_path / 'out'), FLAC)
+    assert all(path.endswith('.flac') and os.path.getsize(path) for path in paths)
+    with pytest.raises(ValueError):
+        sample.export_slices(str(tmp_path / 'all.flac'), FLAC, concatenate=True)
+
+
+def test_cancelled_export_leaves_no_files(tmp_path, sample):
+    written = []
+    with pytest.raises(ExportCancelled):
+        export_slices(sample, str(tmp_path / 'out'), workers=2, progress=written.append,
+                      is_cancelled=lambda: len(written) >= 2)
+    assert written == [0.25, 0.5]
+    assert os.listdir(str(tmp_path / 'out')) == []
+
+
+def test_exporter_reports_progress_in_the_background(tmp_path, sample, qt_application):
+    progress, exported = [], []
+    exporter = SliceExporter(sample, str(tmp_path / 'out'))
+    exporter.progress.connect(lambda percent, stage: progress.append(percent))
+    exporter.exported.connect(exported.append)
+    exporter.start()
+    assert exporter.wait(10000)
+    # The signals are queued to the thread that connected them
+    qt_application.processEvents()
+    assert progress == [0, 25, 50, 75, 100]
+    assert len(exported[0]) == 4
@@ -0,0 +1,98 @@
+import asyncio
+import http.client
+import io
+import json
+import os
+import wave
+
+import numpy as np
+import pytest
+
+import pcm
+import slicing_service
+from decode_cache import DecodeCache
+from onset_detection import EQUAL
+from slicing_service import SlicingService
+
+
+@pytest.fixture
+def wav_bytes(tmp_path):
+    samples = (np.sin(np.arange(8000 * 2) * 0.01)[:, None] * 8000).astype(np.int16)
+    pcm.write_wav(str(tmp_path / 'loop.wav'), samples, 8000)
+    with open(str(tmp_path / 'loop.wav'), 'rb') as f:
+        return f.read()
+
+
+def request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def run_with_service(tmp_path, client):
+    async def run():
+        service = SlicingService(str(tmp_path / 'service'), workers=1)
+        port = await service.start(port=0)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, client, port)
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+
+def test_uploads_are_deduplicated_across_users(tmp_path, wav_bytes):
+    def client(port):
+        first = request(port, 'POST', '/users/alice/samples?name=loop.wav', wav_bytes)
+        second = request(port, 'POST', '/users/bob/samples?name=drums.wav', wav_bytes)
+        listing = request(port, 'GET', '/users/bob/samples')
+        return first, second, listing
+
+    first, second, listing = run_with_service(tmp_path, client)
+    assert first[0] == 201 and second[0] == 201
+    first, second = json.loads(first[2]), json.loads(second[2])
+    assert first['sample'] == second['sample']
+    assert not first['deduplicated'] and second['deduplicated']
+    assert first['frame_count'] == 16000
+    assert json.loads(listing[2])[second['sample']]['name'] == 'drums.wav'
+    assert os.listdir(str(tmp_path / 'service' / 'uploads')) == [first['sample'] + '.wav']
+
+
+def test_slices_are_rendered_once_and_cached_by_clients(tmp_path, wav_bytes):
+    def client(port):
+        sample = json.loads(request(port, 'POST', '/users/alice/samples?name=loop.wav', wav_bytes)[2])['sample']
+        base = '/users/alice/samples/{}/slices'.format(sample)
+        created = request(port, 'POST', base, json.dumps({'num_slices': 4, 'mode': 'equal'}))
+        adjusted = request(port, 'PATCH', base + '/1', json.dumps({'pitch_shift': 12}))
+        audio = request(port, 'GET', base + '/1.wav')
+        revalidated = request(port, 'GET', base + '/1.wav', headers={'If-None-Match': audio[1]['ETag']})
+        unknown = request(port, 'GET', base + '/9.wav')
+        return created, adjusted, audio, revalidated, unknown
+
+    created, adjusted, audio, revalidated, unknown = run_with_service(tmp_path, client)
+    assert created[0] == 201 and len(json.loads(created[2])) == 4
+    assert json.loads(adjusted[2])['pitch_shift'] == 12
+    assert audio[0] == 200 and audio[1]['Content-Type'] == 'audio/wav'
+    assert 'immutable' in audio[1]['Cache-Control']
+    with wave.open(io.BytesIO(audio[2])) as rendered:
+        # An octave up by resampling halves the length
+        assert rendered.getframerate() == 8000 and rendered.getnframes() == 2000
+    assert revalidated[0] == 304 and revalidated[2] == b''
+    assert unknown[0] == 404
+
+
+def test_workers_reuse_the_samples_they_loaded(tmp_path, wav_bytes, monkeypatch):
+    with open(str(tmp_path / 'a.wav'), 'wb') as f:
+        f.write(wav_bytes)
+    monkeypatch.setattr(slicing_service, '_samples', slicing_service.OrderedDict())
+    monkeypatch.setattr(slicing_service, '_decode_cache', DecodeCache(str(tmp_path / 'cache')))
+    slices = slicing_service.slice_file(str(tmp_path / 'a.wav'), 4, EQUAL)
+    sample = slicing_service._samples[slicing_service._decode_cache.source_hash(str(tmp_path / 'a.wav'))]
+    zero_crossings = sample.zero_crossings
+    adjusted = slicing_service.adjust_file_slice(str(tmp_path / 'a.wav'), slices[:2], 1, 0, -100, 2)
+    assert len(adjusted) == 2 and adjusted[1]['pitch_shift'] == 2
+    assert list(slicing_service._samples.values()) == [sample]
+    assert sample.zero_crossings is zero_crossings
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+# Seconds from launching main.py until its window is shown, on a cold interpreter
+STARTUP_BUDGET_SECONDS = 2.0
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'main.py')
+
+
+def test_startup_time_within_budget(tmp_path):
+    # Start from another working directory, so paths relative to it would break
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', SDL_AUDIODRIVER='dummy')
+    result = subprocess.run([sys.executable, MAIN, '--startup-time'], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    seconds = float(result.stdout.split('startup ')[1].split()[0])
+    assert seconds < STARTUP_BUDGET_SECONDS
+
+
+def test_startup_defers_pydub_and_pygame():
+    code = "import sys, audio_app; print(' '.join(m for m in ('pydub', 'pygame') if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(MAIN))
+    result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
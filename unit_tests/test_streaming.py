@@ -0,0 +1,65 @@
+import wave
+
+import numpy as np
+
+from audio_sample import AudioSample
+from streaming import WavReader
+
+
+def write_wav(path, samples, sample_width=2, frame_rate=8000):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(sample_width)
+        f.setframerate(frame_rate)
+        f.writeframes(samples.tobytes())
+
+
+def test_16bit_wav_is_memory_mapped(tmp_path):
+    samples = np.arange(16000, dtype=np.int16).reshape(-1, 2)
+    write_wav(tmp_path / 'a.wav', samples)
+    reader = WavReader(str(tmp_path / 'a.wav'))
+    assert isinstance(reader.samples, np.memmap)
+    assert reader.frame_count == 8000
+    assert np.array_equal(reader.read(100, 200), samples[100:200])
+
+
+def test_8bit_wav_is_converted_per_read(tmp_path):
+    samples = np.full((1000, 1), 255, dtype=np.uint8)
+    write_wav(tmp_path / 'a.wav', samples, sample_width=1)
+    reader = WavReader(str(tmp_path / 'a.wav'))
+    assert reader.samples is None
+    assert reader.read(10, 20).tolist() == [[32512]] * 10
+
+
+def test_streaming_sample_slices_without_materializing(tmp_path):
+    samples = np.zeros((8000 * 4, 2), dtype=np.int16)
+    write_wav(tmp_path / 'a.wav', samples)
+    sample = AudioSample(str(tmp_path / 'a.wav'), streaming=True)
+    assert sample.duration_ms == 4000
+    sample.create_slices(4)
+    sample.adjust_slice(3, end_adjust=-500)
+    assert len(sample.get_slice_view(3)) == 4000
+
+
+def test_streaming_snap_reads_only_near_boundaries(tmp_path):
+    samples = (np.sin(np.arange(8000 * 60) * 0.05)[:, None] * 8000).astype(np.int16).repeat(2, axis=1)
+    write_wav(tmp_path / 'a.wav', samples)
+    sample = AudioSample(str(tmp_path / 'a.wav'), streaming=True)
+    unsnapped = AudioSample(str(tmp_path / 'a.wav'))
+    reads = []
+    get_frames = sample.get_frames
+
+    def counting_get_frames(start_frame, end_frame):
+        reads.append(end_frame - start_frame)
+        return get_frames(start_frame, end_frame)
+
+    sample.get_frames = counting_get_frames
+    sample.create_slices(8)
+    unsnapped.create_slices(8)
+    tolerance = int(sample.snap_tolerance_ms * sample.frame_rate / 1000.0)
+    # No index over the whole file, only a window around each of the 7 inner boundaries
+    assert sample._zero_crossings is None
+    assert len(reads) == 7 and max(reads) <= 2 * tolerance + 3
+    # The same crossings as a search of the decoded audio
+    assert [s['start_frame'] for s in sample.slices] == [s['start_frame'] for s in unsnapped.slices]
+    assert sample.edge_fades(*unsnapped.slices.start_frames[1:3]) == unsnapped.edge_fades(*unsnapped.slices.start_frames[1:3])
@@ -0,0 +1,32 @@
+import json
+
+from tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    assert tracer.span('a') is tracer.span('b')
+    with tracer.span('a'):
+        pass
+    tracer.record('b', tracer.now(), tracer.now())
+    assert tracer.stats() == {}
+
+
+def test_stage_percentiles_and_trace_export(tmp_path):
+    tracer = Tracer(enabled=True)
+    for duration_ms in range(1, 101):
+        tracer.record('render', 1, 1 + duration_ms * 1000000)
+    with tracer.span('sound_build'):
+        pass
+
+    stats = tracer.stats()
+    assert stats['render']['count'] == 100
+    assert 49 <= stats['render']['p50_ms'] <= 51
+    assert 98 <= stats['render']['p99_ms'] <= 100
+    assert 'sound_build' in tracer.format_stats()
+
+    tracer.export_chrome_trace(str(tmp_path / 'trace.json'))
+    with open(tmp_path / 'trace.json') as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == 101
+    assert events[0]['ph'] == 'X' and events[0]['dur'] == 1000.0
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from upload_store import LoadCancelled, content_hash, store_upload
+
+
+def test_same_content_is_stored_once(tmp_path):
+    first = tmp_path / 'a.wav'
+    second = tmp_path / 'b.WAV'
+    first.write_bytes(b'RIFF' * 1000)
+    second.write_bytes(b'RIFF' * 1000)
+    upload_folder = str(tmp_path / 'upload')
+
+    stored = store_upload(str(first), upload_folder)
+    assert os.path.basename(stored) == content_hash(str(first)) + '.wav'
+    assert store_upload(str(second), upload_folder) == stored
+    assert os.listdir(upload_folder) == [os.path.basename(stored)]
+
+
+def test_cancelled_upload_leaves_nothing_behind(tmp_path):
+    source = tmp_path / 'a.wav'
+    source.write_bytes(b'\0' * 10)
+    upload_folder = tmp_path / 'upload'
+    with pytest.raises(LoadCancelled):
+        store_upload(str(source), str(upload_folder), is_cancelled=lambda: True)
+    assert not upload_folder.exists() or not os.listdir(upload_folder)
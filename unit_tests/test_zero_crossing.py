@@ -0,0 +1,22 @@
+import numpy as np
+
+import pcm
+from zero_crossing import ZeroCrossingIndex
+
+
+def test_nearest_crossing_of_a_sine():
+    t = np.arange(1000)
+    frames = (1000 * np.sin(2 * np.pi * t / 100.0 + 0.1)).astype(np.int16)[:, None]
+    index = ZeroCrossingIndex(frames, block_frames=128)
+    # Crossings every 50 frames, just before each multiple of 50
+    assert len(index.crossings) == 20
+    assert index.nearest(148) == 148
+    assert index.nearest(160, max_distance=5) is None
+    assert index.is_crossing(0) and index.is_crossing(1000)
+
+
+def test_fades_only_where_requested():
+    frames = np.ones((100, 2), dtype=np.float32)
+    assert pcm.apply_fades(frames, 0, 0) is frames
+    faded = pcm.apply_fades(frames, 10, 0)
+    assert faded[0, 0] == 0.0 and faded[10, 0] == 1.0 and faded[-1, 0] == 1.0